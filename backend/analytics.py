@@ -0,0 +1,117 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger("yt-dlp-api.analytics")
+
+
+def usage_summary(auth_manager, days: int, top: int = 10) -> Dict:
+    """Usage over the last `days` UTC days from the daily rollups, never the raw tables.
+
+    Every query reads at most `days` rows per user or domain that was active, so the cost doesn't
+    grow with the number of files or downloads.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+
+    with auth_manager.connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """SELECT d.day, d.downloads, d.failures, d.reused, d.bytes, d.total_seconds, COALESCE(a.users, 0) AS active_users
+               FROM usage_daily d
+               LEFT JOIN (SELECT day, COUNT(*) AS users FROM usage_user_daily WHERE day >= %s GROUP BY day) a
+                      ON a.day = d.day
+               WHERE d.day >= %s
+               ORDER BY d.day""",
+            (since, since),
+        )
+        daily_rows = {row["day"]: row for row in cursor.fetchall()}
+
+        cursor.execute(
+            """SELECT r.user_id, u.username, SUM(r.downloads)::bigint AS downloads, SUM(r.failures)::bigint AS failures,
+                      SUM(r.bytes)::bigint AS bytes, COALESCE(s.file_count, 0) AS stored_files,
+                      COALESCE(s.total_bytes, 0) AS stored_bytes
+               FROM usage_user_daily r
+               JOIN users u ON u.id = r.user_id
+               LEFT JOIN storage_usage s ON s.user_id = r.user_id
+               WHERE r.day >= %s
+               GROUP BY r.user_id, u.username, s.file_count, s.total_bytes
+               ORDER BY bytes DESC, downloads DESC
+               LIMIT %s""",
+            (since, top),
+        )
+        users = cursor.fetchall()
+
+        cursor.execute(
+            """SELECT domain, SUM(downloads)::bigint AS downloads, SUM(failures)::bigint AS failures, SUM(bytes)::bigint AS bytes
+               FROM usage_domain_daily
+               WHERE day >= %s
+               GROUP BY domain
+               ORDER BY downloads DESC, bytes DESC
+               LIMIT %s""",
+            (since, top),
+        )
+        domains = cursor.fetchall()
+
+        cursor.execute(
+            """SELECT COALESCE(SUM(file_count), 0)::bigint AS file_count,
+                      COALESCE(SUM(total_bytes), 0)::bigint AS total_bytes
+               FROM storage_usage"""
+        )
+        storage = cursor.fetchone()
+
+    # Days without downloads have no row; fill them so the series is continuous
+    daily = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        row = daily_rows.get(day)
+        daily.append(
+            {
+                "day": day.isoformat(),
+                "downloads": row["downloads"] if row else 0,
+                "failures": row["failures"] if row else 0,
+                "failure_rate": _rate(row["failures"], row["downloads"]) if row else 0.0,
+                "reused": row["reused"] if row else 0,
+                "bytes": row["bytes"] if row else 0,
+                # Answers from stored copies take no time and would drag the average down
+                "avg_seconds": (
+                    round(row["total_seconds"] / (row["downloads"] - row["reused"]), 3)
+                    if row and row["downloads"] > row["reused"]
+                    else None
+                ),
+                "active_users": row["active_users"] if row else 0,
+            }
+        )
+
+    downloads = sum(entry["downloads"] for entry in daily)
+    failures = sum(entry["failures"] for entry in daily)
+    return {
+        "window_days": days,
+        "since": since.isoformat(),
+        "generated_at": datetime.utcnow().isoformat(),
+        "totals": {
+            "downloads": downloads,
+            "failures": failures,
+            "failure_rate": _rate(failures, downloads),
+            "reused": sum(entry["reused"] for entry in daily),
+            "bytes": sum(entry["bytes"] for entry in daily),
+            "stored_files": storage["file_count"],
+            "stored_bytes": storage["total_bytes"],
+        },
+        "daily": daily,
+        "top_users": [_with_rate(row, "user_id") for row in users],
+        "top_domains": [_with_rate(row) for row in domains],
+    }
+
+
+def _rate(failures: int, downloads: int) -> float:
+    return round(failures / downloads, 4) if downloads else 0.0
+
+
+def _with_rate(row: Dict, id_field: Optional[str] = None) -> Dict:
+    entry = dict(row)
+    if id_field:
+        entry[id_field] = str(entry[id_field])
+    entry["failure_rate"] = _rate(entry["failures"], entry["downloads"])
+    return entry
@@ -1,18 +1,34 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, g
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import subprocess
+from psycopg2.extras import RealDictCursor
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import uuid
+import hmac
 import json
 import time
 import logging
+import shlex
 import shutil
+import tempfile
+import threading
 from functools import wraps
 from typing import Tuple, Optional
 
-from config import API_SECRET_KEY, DOWNLOAD_DIR, SECRET_HEADER_NAME, HOST, PORT, DEBUG
+from config import (
+    API_SECRET_KEY,
+    DOWNLOAD_DIR,
+    SECRET_HEADER_NAME,
+    HOST,
+    PORT,
+    DEBUG,
+    STORAGE_RECONCILE_INTERVAL,
+    RECONCILE_INTERVAL,
+    RECONCILE_AUTO_REPAIR,
+    Config,
+)
 from utils import (
     sanitize_user_id,
     create_safe_filename,
@@ -20,9 +36,43 @@ from utils import (
     ensure_directory_exists,
     get_file_stats,
     validate_url,
+    is_valid_uuid,
+    parse_page_size,
+    encode_cursor,
+    decode_cursor,
+    uuid_id,
     MAX_FILE_SIZE,
 )
 from auth import AuthManager
+from storage import StorageAccounting
+from analytics import usage_summary
+from cache import TTLCache
+from reconcile import FileReconciler
+from deletion import DeletionQueue
+from archive import stream_zip, stream_tar
+from sessions import SessionLifecycle
+from quotas import QuotaManager, QuotaExceeded, QUOTA_FIELDS
+from idempotency import (
+    IdempotencyKeys,
+    IdempotencyConflict,
+    IdempotencyInProgress,
+    MAX_KEY_LENGTH as MAX_IDEMPOTENCY_KEY_LENGTH,
+    request_fingerprint,
+)
+from webhooks import WebhookDispatcher, validate_callback_url
+from reservations import DiskReservations, InsufficientStorage
+from blobs import BlobStore
+from urls import canonicalize, domain_of
+from outputs import OUTPUT_MODES, DEFAULT_OUTPUT_MODE, find_output_file, mime_type_for
+from transcode import ladder_command
+from tasks import PeriodicTask
+import metrics
+from traces import PhaseTimer, YtdlpPhaseTracker, record_download, summarize as summarize_downloads
+import supervisor
+from db import try_advisory_lock, advisory_lock_held
+
+# Importing ratelimit registers the postgresql+ratelimit:// storage scheme with flask-limiter
+from ratelimit import purge_expired as purge_rate_limits
 
 logging.basicConfig(
     level=logging.INFO if not DEBUG else logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -32,62 +82,297 @@ logger = logging.getLogger("yt-dlp-api")
 app = Flask(__name__)
 CORS(app)
 
+if Config.TRUSTED_PROXY_COUNT:
+    # Use the client address from X-Forwarded-For rather than the proxy's own address
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_COUNT, x_proto=Config.TRUSTED_PROXY_COUNT)
+
+
+def resolve_principal() -> Optional[dict]:
+    """Return the user behind the request's session token or API key, or None. Memoised per request."""
+    if "principal" in g:
+        return g.principal
+
+    principal = None
+    session_token = request.headers.get("X-Session-Token")
+    api_key = request.headers.get(SECRET_HEADER_NAME)
+    if session_token:
+        principal = auth_manager.validate_session(session_token)
+    if not principal and api_key:
+        if api_key == API_SECRET_KEY:
+            principal = {"id": 0, "username": "legacy", "role": "admin"}
+        else:
+            principal = auth_manager.validate_api_key(api_key)
+
+    g.principal = principal
+    return principal
+
+
+def rate_limit_key() -> str:
+    """Rate limit authenticated requests per user, and anonymous ones per client address."""
+    principal = resolve_principal()
+    if principal:
+        return f"user:{principal['id']}"
+    return f"ip:{get_remote_address()}"
+
+
+def principal_request_limit() -> str:
+    principal = resolve_principal()
+    if QuotaManager.applies_to(principal):
+        requests_per_minute = quota_manager.get_limits(principal["id"])["requests_per_minute"]
+    else:
+        requests_per_minute = Config.QUOTA_REQUESTS_PER_MINUTE
+    return f"{requests_per_minute} per minute"
+
+
+def exempt_from_request_quota() -> bool:
+    principal = resolve_principal()
+    if not principal:
+        return not Config.QUOTA_REQUESTS_PER_MINUTE
+    if not QuotaManager.applies_to(principal):
+        return True
+    return not quota_manager.get_limits(principal["id"])["requests_per_minute"]
+
+
 limiter = Limiter(
     app=app,
-    key_func=get_remote_address,
+    enabled=Config.RATELIMIT_ENABLED,
+    key_func=rate_limit_key,
     default_limits=["30 per minute"],
-    storage_uri="memory://",
-    strategy="fixed-window",
+    application_limits=[principal_request_limit],
+    application_limits_exempt_when=exempt_from_request_quota,
+    storage_uri=Config.get_ratelimit_storage_uri(),
+    storage_options={"maxconn": Config.RATELIMIT_POOL_SIZE},
+    strategy=Config.RATELIMIT_STRATEGY,
+    # Fail open: if the rate limit store is unreachable or its pool is exhausted, log and serve the
+    # request without limits rather than answering every limited route with a 500
+    swallow_errors=True,
 )
 
-DEFAULT_FORMAT = "bestvideo+bestaudio/best"
-FFMPEG_ARGS = (
-    "ffmpeg:-c:v libx264 -profile:v baseline -level 3.0 -preset ultrafast "
-    "-crf 23 -c:a aac -b:a 128k -movflags +faststart -threads 6"
-)
+MAX_BULK_DELETE = 1000
+EXPORT_PAGE_SIZE = 500
+MAX_SEARCH_QUERY_LENGTH = 200
+# Fields /list-files can return: name -> (column, formatter)
+FILE_LIST_FIELDS = {
+    "id": ("id", lambda row: str(row["id"])),
+    "name": ("original_filename", lambda row: row["original_filename"]),
+    "path": ("stored_filename", lambda row: row["stored_filename"]),
+    "size": ("file_size", lambda row: row["file_size"]),
+    "modified": ("created_at", lambda row: row["created_at"].timestamp() if row["created_at"] else 0),
+    "download_path": ("stored_filename", lambda row: f"/files/{row['stored_filename']}"),
+    "title": ("video_title", lambda row: row["video_title"]),
+    "url": ("video_url", lambda row: row["video_url"]),
+    "sha256": ("content_sha256", lambda row: row["content_sha256"]),
+    "mime_type": ("mime_type", lambda row: row["mime_type"]),
+}
+DEFAULT_FILE_LIST_FIELDS = ["id", "name", "path", "size", "modified", "download_path", "title"]
+RATELIMIT_PURGE_INTERVAL = 300
+STALE_JOB_PURGE_INTERVAL = 600
+BLOB_BACKFILL_INTERVAL = 300
+BLOB_BACKFILL_BATCH = 100
+METRICS_POOL_INTERVAL = 5
+MAX_METRICS_WINDOW_HOURS = 24 * 90
+MAX_ANALYTICS_DAYS = 366
+ANALYTICS_TOP = 10
+# Longest a download job can legitimately run: disk wait, then info, download and transcode, each
+# bounded by YTDLP_TIMEOUT, plus storing the result
+MAX_JOB_SECONDS = Config.DISK_RESERVATION_WAIT + Config.YTDLP_TIMEOUT * 3 + 60
+# Advisory lock shared by the scheduled and manual file reconciliation
+FILE_RECONCILE_LOCK = "file-reconcile"
+# The dashboard polls; within this many seconds every admin gets the same computed summary
+ANALYTICS_CACHE_TTL = 30
+analytics_cache = TTLCache(maxsize=MAX_ANALYTICS_DAYS, ttl=ANALYTICS_CACHE_TTL)
+TRANSCODE_PROFILES = Config.get_transcode_profiles()
+ARCHIVE_FORMATS = {
+    "zip": (stream_zip, "application/zip"),
+    "tar": (stream_tar, "application/x-tar"),
+}
+
+# Created per process by create_app(), so each gunicorn worker gets its own pool and threads
+auth_manager: Optional[AuthManager] = None
+storage_accounting: Optional[StorageAccounting] = None
+file_reconciler: Optional[FileReconciler] = None
+deletion_queue: Optional[DeletionQueue] = None
+session_lifecycle: Optional[SessionLifecycle] = None
+quota_manager: Optional[QuotaManager] = None
+disk_reservations: Optional[DiskReservations] = None
+blob_store: Optional[BlobStore] = None
+idempotency_keys: Optional[IdempotencyKeys] = None
+webhooks: Optional[WebhookDispatcher] = None
+background_tasks = []
+_app_lock = threading.Lock()
+
+
+def singleton(name: str, func):
+    """Run `func` in at most one process at a time, skipping the run if another worker holds it."""
+
+    def run():
+        with try_advisory_lock(auth_manager.connection_pool, name) as acquired:
+            if not acquired:
+                logger.debug(f"Skipping {name}: running in another process")
+                return None
+            return func()
+
+    return run
+
+
+def create_app() -> Flask:
+    """Set up database access and background work for this process and return the Flask app.
+
+    Safe to call more than once; only the first call in a process does anything.
+    """
+    global auth_manager, storage_accounting, file_reconciler, deletion_queue, session_lifecycle, quota_manager
+    global disk_reservations, blob_store, idempotency_keys, webhooks
+
+    with _app_lock:
+        if auth_manager is not None:
+            return app
+
+        ensure_directory_exists(DOWNLOAD_DIR)
+
+        auth_manager = AuthManager()
+        auth_manager.start_invalidation_listener()
+
+        metrics.init(DOWNLOAD_DIR)
+        auth_manager.connection_pool.on_checkout = metrics.DB_POOL_WAIT.observe
+
+        storage_accounting = StorageAccounting(auth_manager)
+        file_reconciler = FileReconciler(
+            auth_manager,
+            DOWNLOAD_DIR,
+            batch_size=Config.RECONCILE_BATCH_SIZE,
+            batch_pause=Config.RECONCILE_BATCH_PAUSE,
+            orphan_grace=Config.RECONCILE_ORPHAN_GRACE,
+        )
+        session_lifecycle = SessionLifecycle(
+            auth_manager, retention_hours=Config.SESSION_RETENTION_HOURS, batch_size=Config.SESSION_SWEEP_BATCH
+        )
 
-ensure_directory_exists(DOWNLOAD_DIR)
+        quota_manager = QuotaManager(
+            auth_manager,
+            {
+                "requests_per_minute": Config.QUOTA_REQUESTS_PER_MINUTE,
+                "max_concurrent_jobs": Config.QUOTA_MAX_CONCURRENT_JOBS,
+                "daily_jobs": Config.QUOTA_DAILY_JOBS,
+                "daily_download_bytes": Config.QUOTA_DAILY_DOWNLOAD_BYTES,
+                "daily_served_bytes": Config.QUOTA_DAILY_SERVED_BYTES,
+            },
+            cache_ttl=Config.AUTH_CACHE_TTL,
+            stale_job_seconds=MAX_JOB_SECONDS,
+        )
 
-auth_manager = AuthManager()
+        disk_reservations = DiskReservations(
+            auth_manager,
+            DOWNLOAD_DIR,
+            margin=Config.DISK_RESERVATION_MARGIN,
+            size_factor=Config.DISK_RESERVATION_FACTOR,
+            wait_timeout=Config.DISK_RESERVATION_WAIT,
+            max_waiters=Config.DISK_RESERVATION_MAX_WAITERS,
+            stale_seconds=MAX_JOB_SECONDS,
+        )
 
+        blob_store = BlobStore(auth_manager, DOWNLOAD_DIR, enabled=Config.DEDUP_ENABLED)
 
-def ensure_default_admin():
-    admin_username = os.environ.get("ADMIN_USERNAME", "").strip()
-    admin_password = os.environ.get("ADMIN_PASSWORD", "").strip()
+        idempotency_keys = IdempotencyKeys(
+            auth_manager,
+            ttl=Config.IDEMPOTENCY_KEY_TTL,
+            wait_timeout=Config.IDEMPOTENCY_WAIT,
+            max_waiters=Config.IDEMPOTENCY_MAX_WAITERS,
+            lock_timeout=MAX_JOB_SECONDS,
+        )
 
-    if not admin_username or not admin_password:
-        logger.info("ADMIN_USERNAME or ADMIN_PASSWORD not set - skipping auto-admin creation")
-        return
+        webhooks = WebhookDispatcher(
+            auth_manager,
+            timeout=Config.WEBHOOK_TIMEOUT,
+            max_attempts=Config.WEBHOOK_MAX_ATTEMPTS,
+            backoff_base=Config.WEBHOOK_BACKOFF_BASE,
+            backoff_max=Config.WEBHOOK_BACKOFF_MAX,
+            allow_private=Config.WEBHOOK_ALLOW_PRIVATE,
+        )
 
-    if len(admin_password) < 8:
-        logger.error("ADMIN_PASSWORD must be at least 8 characters long!")
-        return
+        deletion_queue = DeletionQueue(DOWNLOAD_DIR)
+        deletion_queue.start()
 
-    conn = None
-    try:
-        conn = auth_manager._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
-        admin_count = cursor.fetchone()[0]
-
-        if admin_count == 0:
-            logger.info("No admin user found. Creating default admin from environment variables...")
-            success, message = auth_manager.create_user(admin_username, admin_password, "admin")
-            if success:
-                logger.info(f"✓ Default admin user created: {admin_username}")
-                logger.info("You can now login via the web interface or API")
-            else:
-                logger.error(f"✗ Failed to create default admin: {message}")
-        else:
-            logger.info(f"Admin user(s) already exist (count: {admin_count})")
-    except Exception as e:
-        logger.error(f"Error checking/creating admin user: {e}")
-    finally:
-        if conn:
-            auth_manager._put_connection(conn)
+        background_tasks.extend(
+            [
+                PeriodicTask(
+                    "storage-reconcile",
+                    STORAGE_RECONCILE_INTERVAL,
+                    singleton("storage-reconcile", storage_accounting.reconcile),
+                    run_immediately=True,
+                ),
+                PeriodicTask(
+                    "file-reconcile",
+                    RECONCILE_INTERVAL,
+                    singleton(FILE_RECONCILE_LOCK, lambda: file_reconciler.run(repair=RECONCILE_AUTO_REPAIR)),
+                ),
+                PeriodicTask(
+                    "session-sweep", Config.SESSION_SWEEP_INTERVAL, singleton("session-sweep", session_lifecycle.sweep)
+                ),
+                PeriodicTask(
+                    "ratelimit-purge",
+                    RATELIMIT_PURGE_INTERVAL,
+                    singleton("ratelimit-purge", lambda: purge_rate_limits(auth_manager)),
+                ),
+                PeriodicTask("quota-flush", Config.QUOTA_FLUSH_INTERVAL, quota_manager.flush),
+                PeriodicTask(
+                    "metrics-db-pool",
+                    METRICS_POOL_INTERVAL,
+                    lambda: metrics.update_pool_gauges(auth_manager.connection_pool),
+                    run_immediately=True,
+                ),
+                PeriodicTask(
+                    "quota-stale-jobs",
+                    STALE_JOB_PURGE_INTERVAL,
+                    singleton("quota-stale-jobs", quota_manager.purge_stale_jobs),
+                ),
+                PeriodicTask(
+                    "disk-reservations-purge",
+                    STALE_JOB_PURGE_INTERVAL,
+                    singleton("disk-reservations-purge", disk_reservations.purge_expired),
+                ),
+                PeriodicTask(
+                    "idempotency-purge",
+                    STALE_JOB_PURGE_INTERVAL,
+                    singleton("idempotency-purge", idempotency_keys.purge_expired),
+                ),
+                # Every process sends; deliveries are claimed with SKIP LOCKED
+                PeriodicTask("webhook-dispatch", Config.WEBHOOK_POLL_INTERVAL, webhooks.dispatch),
+                PeriodicTask("blob-gc", Config.BLOB_GC_INTERVAL, singleton("blob-gc", blob_store.collect_garbage)),
+                PeriodicTask(
+                    "blob-backfill",
+                    BLOB_BACKFILL_INTERVAL,
+                    singleton("blob-backfill", lambda: blob_store.backfill(BLOB_BACKFILL_BATCH)),
+                ),
+            ]
+        )
+        for task in background_tasks:
+            task.start()
 
+        logger.info(f"Application initialised in process {os.getpid()}")
+        return app
 
-ensure_default_admin()
+
+def shutdown(timeout: float = 10.0):
+    """Stop background work and close database connections. Called when a worker exits."""
+    global auth_manager
+
+    with _app_lock:
+        if auth_manager is None:
+            return
+
+        for task in background_tasks:
+            task.stop(timeout)
+        background_tasks.clear()
+
+        try:
+            quota_manager.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush quota usage on shutdown: {e}")
+
+        deletion_queue.stop(timeout)
+        auth_manager.connection_pool.closeall()
+        auth_manager = None
+        logger.info(f"Application shut down in process {os.getpid()}")
 
 
 def require_api_key(f):
@@ -133,29 +418,13 @@ def require_auth(f):
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # Try session token first
-        session_token = request.headers.get("X-Session-Token")
-        if session_token:
-            user = auth_manager.validate_session(session_token)
-            if user:
-                request.user = user
-                return f(*args, **kwargs)
-
-        # Try API key
-        api_key = request.headers.get(SECRET_HEADER_NAME)
-
-        if api_key == API_SECRET_KEY:
-            request.user = {"id": 0, "username": "legacy", "role": "admin"}
-            return f(*args, **kwargs)
-
-        if api_key:
-            user = auth_manager.validate_api_key(api_key)
-            if user:
-                request.user = user
-                return f(*args, **kwargs)
+        user = resolve_principal()
+        if not user:
+            logger.warning(f"Unauthorized access attempt from {request.remote_addr} to {request.endpoint}")
+            return jsonify({"error": "Unauthorized access"}), 401
 
-        logger.warning(f"Unauthorized access attempt from {request.remote_addr} to {request.endpoint}")
-        return jsonify({"error": "Unauthorized access"}), 401
+        request.user = user
+        return f(*args, **kwargs)
 
     return decorated_function
 
@@ -171,30 +440,105 @@ def require_admin(f):
     return decorated_function
 
 
+def get_page_params(id_type=uuid_id) -> Tuple[int, Optional[tuple]]:
+    """Read ?limit= and ?cursor= from the query string. Raises ValueError on bad input.
+
+    `id_type` is the listed table's id type (see decode_cursor), so a cursor from another
+    endpoint is rejected rather than matching nothing or failing in the query.
+    """
+    limit = parse_page_size(request.args.get("limit"))
+    cursor = request.args.get("cursor")
+    return limit, decode_cursor(cursor, id_type) if cursor else None
+
+
 def get_user_directory(user_id: str) -> str:
     """Get the general download directory (no longer user-specific)."""
     # All files now go to a single downloads directory
     return DOWNLOAD_DIR
 
 
-def execute_ytdlp_command(cmd: list) -> Tuple[bool, str, str]:
+def execute_ytdlp_command(
+    cmd: list, label: str = "yt-dlp", on_line=None, progress_file: Optional[str] = None
+) -> Tuple[bool, str, str]:
+    started = time.perf_counter()
+    exit_code = "error"
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        success = result.returncode == 0
-        return success, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        logger.error(f"Command timed out: {' '.join(cmd)}")
-        return False, "", "Command timed out after 5 minutes"
+        result = supervisor.run(
+            cmd,
+            timeout=Config.YTDLP_TIMEOUT,
+            idle_timeout=Config.YTDLP_IDLE_TIMEOUT or None,
+            output_limit=Config.YTDLP_OUTPUT_LIMIT,
+            on_line=on_line,
+            progress_file=progress_file,
+        )
+        metrics.SUBPROCESS_CPU.labels(label, "user").inc(result.cpu_user)
+        metrics.SUBPROCESS_CPU.labels(label, "system").inc(result.cpu_system)
+        metrics.SUBPROCESS_MAX_RSS.labels(label).observe(result.max_rss)
+        logger.debug(f"{label} finished: {result.as_dict()}")
+
+        if result.timed_out == "idle":
+            exit_code = "idle_timeout"
+            logger.error(f"Command produced no output for {Config.YTDLP_IDLE_TIMEOUT}s: {' '.join(cmd)}")
+            return False, result.stdout, f"Command stalled with no output for {Config.YTDLP_IDLE_TIMEOUT} seconds"
+        if result.timed_out:
+            exit_code = "timeout"
+            logger.error(f"Command timed out: {' '.join(cmd)}")
+            return False, result.stdout, f"Command timed out after {Config.YTDLP_TIMEOUT} seconds"
+        if result.stdout_truncated:
+            logger.warning(f"{label} output exceeded {Config.YTDLP_OUTPUT_LIMIT} bytes and was truncated")
+        exit_code = str(result.returncode)
+        return result.returncode == 0, result.stdout, result.stderr
     except Exception as e:
         logger.exception(f"Error executing command: {e}")
         return False, "", str(e)
+    finally:
+        metrics.SUBPROCESS_DURATION.labels(label).observe(time.perf_counter() - started)
+        metrics.SUBPROCESS_EXITS.labels(label, exit_code).inc()
+        if cmd[0] == "ffmpeg":
+            metrics.FFMPEG_DURATION.labels(label).observe(time.perf_counter() - started)
+            metrics.FFMPEG_EXITS.labels(label, exit_code).inc()
+        if progress_file:
+            try:
+                os.remove(progress_file)
+            except FileNotFoundError:
+                pass
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_LATENCY.labels(request.method, endpoint, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+    return response
 
 
 @app.route("/health", methods=["GET"])
+@limiter.exempt
 def health_check():
     return jsonify({"status": "ok", "timestamp": time.time(), "download_dir": DOWNLOAD_DIR, "version": "1.0.0"})
 
 
+@app.route("/metrics", methods=["GET"])
+@limiter.exempt
+def prometheus_metrics():
+    # Traffic, quota and disk figures aren't for anyone who can reach the port
+    if not Config.METRICS_TOKEN:
+        return jsonify({"error": "Metrics are disabled; set METRICS_TOKEN to enable them"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {Config.METRICS_TOKEN}"):
+        return jsonify({"error": "Unauthorized access"}), 401
+
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
 @app.route("/auth/login", methods=["POST"])
 @limiter.limit("10 per minute")
 def login():
@@ -257,8 +601,13 @@ def verify_session():
 @require_session
 @require_admin
 def list_all_api_keys():
-    keys = auth_manager.list_all_api_keys_admin()
-    return jsonify({"success": True, "api_keys": keys, "count": len(keys)})
+    try:
+        limit, after = get_page_params(int)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    keys, next_cursor = auth_manager.list_all_api_keys_admin(limit, after)
+    return jsonify({"success": True, "api_keys": keys, "count": len(keys), "next_cursor": next_cursor})
 
 
 @app.route("/admin/api-keys/create", methods=["POST"])
@@ -277,20 +626,15 @@ def create_api_key_admin():
     if not username:
         return jsonify({"error": "Username is required"}), 400
 
-    conn = None
-    try:
-        conn = auth_manager._get_connection()
+    with auth_manager.connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
         user = cursor.fetchone()
 
-        if not user:
-            return jsonify({"error": f"User {username} not found"}), 404
+    if not user:
+        return jsonify({"error": f"User {username} not found"}), 404
 
-        user_id = user[0]
-    finally:
-        if conn:
-            auth_manager._put_connection(conn)
+    user_id = user[0]
 
     success, result = auth_manager.generate_api_key(user_id, description, expires_days)
 
@@ -306,26 +650,46 @@ def create_api_key_admin():
 @require_session
 @require_admin
 def revoke_api_key_admin(key_id):
-    conn = None
     try:
-        conn = auth_manager._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE api_keys SET is_active = FALSE WHERE id = %s", (key_id,))
-        conn.commit()
-
-        if cursor.rowcount > 0:
+        if auth_manager.revoke_api_key_admin(key_id):
             logger.info(f"Admin {request.user['username']} revoked API key {key_id}")
             return jsonify({"success": True, "message": "API key revoked successfully"})
 
         return jsonify({"error": "API key not found"}), 404
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error revoking API key: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if conn:
-            auth_manager._put_connection(conn)
+
+
+@app.route("/admin/auth-cache", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def get_auth_cache_stats():
+    # Each worker has its own cache; this is the one that answered
+    return jsonify({"success": True, "worker_pid": os.getpid(), "auth_cache": auth_manager.principal_cache.stats()})
+
+
+@app.route("/admin/db-pool", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def get_db_pool_stats():
+    # Each worker has its own pool; this is the one that answered
+    return jsonify({"success": True, "worker_pid": os.getpid(), "db_pool": auth_manager.connection_pool.stats()})
+
+
+@app.route("/admin/sessions/stats", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def get_session_stats():
+    try:
+        # Table figures are global; last_sweep is only known to the worker that answered
+        return jsonify({"success": True, "worker_pid": os.getpid(), "sessions": session_lifecycle.stats()})
+    except Exception as e:
+        logger.error(f"Error getting session stats: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route("/admin/users", methods=["GET"])
@@ -333,14 +697,33 @@ def revoke_api_key_admin(key_id):
 @require_session
 @require_admin
 def list_users():
-    conn = None
     try:
-        conn = auth_manager._get_connection()
-        from psycopg2.extras import RealDictCursor
+        limit, after = get_page_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT id, username, role, created_at, is_active FROM users ORDER BY created_at DESC")
-        users = cursor.fetchall()
+    try:
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if after:
+                cursor.execute(
+                    """SELECT id, username, role, created_at, is_active FROM users
+                       WHERE (created_at, id) < (%s, %s)
+                       ORDER BY created_at DESC, id DESC LIMIT %s""",
+                    (*after, limit + 1),
+                )
+            else:
+                cursor.execute(
+                    """SELECT id, username, role, created_at, is_active FROM users
+                       ORDER BY created_at DESC, id DESC LIMIT %s""",
+                    (limit + 1,),
+                )
+            users = cursor.fetchall()
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1]["created_at"], users[-1]["id"])
 
         users_list = []
         for user in users:
@@ -349,13 +732,10 @@ def list_users():
                 user_dict["created_at"] = user_dict["created_at"].isoformat()
             users_list.append(user_dict)
 
-        return jsonify({"success": True, "users": users_list, "count": len(users_list)})
+        return jsonify({"success": True, "users": users_list, "count": len(users_list), "next_cursor": next_cursor})
     except Exception as e:
         logger.error(f"Error listing users: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if conn:
-            auth_manager._put_connection(conn)
 
 
 @app.route("/admin/users/create", methods=["POST"])
@@ -383,12 +763,198 @@ def create_user_admin():
     return jsonify({"success": False, "error": message}), 400
 
 
+@app.route("/admin/users/<user_id>/quota", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def get_user_quota_admin(user_id):
+    if not is_valid_uuid(user_id):
+        return jsonify({"error": "Invalid user id"}), 400
+
+    try:
+        return jsonify(
+            {
+                "success": True,
+                "user_id": user_id,
+                "limits": quota_manager.get_limits(user_id),
+                "overrides": quota_manager.get_overrides(user_id),
+                "usage": quota_manager.get_usage(user_id),
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error reading quota for user {user_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/admin/users/<user_id>/quota", methods=["PUT"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def set_user_quota_admin(user_id):
+    if not is_valid_uuid(user_id):
+        return jsonify({"error": "Invalid user id"}), 400
+
+    data = request.json
+    if not isinstance(data, dict) or not data:
+        return jsonify({"error": f"Request body must set one or more of: {', '.join(QUOTA_FIELDS)}"}), 400
+
+    unknown = set(data) - set(QUOTA_FIELDS)
+    if unknown:
+        return jsonify({"error": f"Unknown quota fields: {', '.join(sorted(unknown))}"}), 400
+
+    for field, value in data.items():
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            return jsonify({"error": f"{field} must be a non-negative integer or null"}), 400
+
+    try:
+        if not auth_manager.get_user_by_id(user_id):
+            return jsonify({"error": "User not found"}), 404
+        quota_manager.set_limits(user_id, data)
+    except Exception as e:
+        logger.error(f"Error updating quota for user {user_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    logger.info(f"Admin {request.user['username']} updated quota for user {user_id}: {data}")
+    return jsonify({"success": True, "user_id": user_id, "limits": quota_manager.get_limits(user_id)})
+
+
+@app.route("/admin/download-metrics", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def download_metrics_admin():
+    try:
+        hours = int(request.args.get("hours", 24))
+    except ValueError:
+        return jsonify({"error": "hours must be an integer"}), 400
+    if not 1 <= hours <= MAX_METRICS_WINDOW_HOURS:
+        return jsonify({"error": f"hours must be between 1 and {MAX_METRICS_WINDOW_HOURS}"}), 400
+
+    try:
+        return jsonify({"success": True, **summarize_downloads(auth_manager, hours)})
+    except Exception as e:
+        logger.error(f"Error summarizing download metrics: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/admin/analytics", methods=["GET"])
+@limiter.limit("60 per minute")
+@require_session
+@require_admin
+def analytics_admin():
+    try:
+        days = int(request.args.get("days", 30))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    if not 1 <= days <= MAX_ANALYTICS_DAYS:
+        return jsonify({"error": f"days must be between 1 and {MAX_ANALYTICS_DAYS}"}), 400
+
+    summary = analytics_cache.get(str(days))
+    if summary is None:
+        try:
+            summary = usage_summary(auth_manager, days, top=ANALYTICS_TOP)
+        except Exception as e:
+            logger.error(f"Error reading usage analytics: {e}")
+            return jsonify({"error": str(e)}), 500
+        analytics_cache.set(str(days), summary)
+    return jsonify({"success": True, **summary})
+
+
+@app.route("/admin/dedup", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def dedup_stats_admin():
+    try:
+        return jsonify({"success": True, **blob_store.stats()})
+    except Exception as e:
+        logger.error(f"Error getting deduplication stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/admin/reconcile", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def get_reconcile_report():
+    try:
+        running = advisory_lock_held(auth_manager.connection_pool, FILE_RECONCILE_LOCK)
+    except Exception as e:
+        logger.error(f"Error checking reconciliation lock: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    # `running` covers every worker; the report is the last scan run by the worker that answered
+    return jsonify(
+        {"success": True, "running": running, "worker_pid": os.getpid(), "report": file_reconciler.last_report}
+    )
+
+
+@app.route("/admin/reconcile", methods=["POST"])
+@limiter.limit("5 per minute")
+@require_session
+@require_admin
+def run_reconcile():
+    data = request.json or {}
+    repair = bool(data.get("repair", False))
+
+    try:
+        running = advisory_lock_held(auth_manager.connection_pool, FILE_RECONCILE_LOCK)
+    except Exception as e:
+        logger.error(f"Error checking reconciliation lock: {e}")
+        return jsonify({"error": str(e)}), 500
+    if running or file_reconciler.is_running:
+        return jsonify({"success": False, "error": "Reconciliation already in progress"}), 409
+
+    # Takes the same lock as the scheduled run, so a scan that starts in between is not doubled
+    threading.Thread(
+        target=singleton(FILE_RECONCILE_LOCK, lambda: file_reconciler.run(repair=repair)),
+        name="file-reconcile-manual",
+        daemon=True,
+    ).start()
+    logger.info(f"Admin {request.user['username']} started reconciliation (repair={repair})")
+    return jsonify({"success": True, "message": "Reconciliation started", "repair": repair}), 202
+
+
+@app.route("/admin/webhooks", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def get_webhook_status():
+    try:
+        return jsonify({"success": True, **webhooks.stats(), "dead_letter_list": webhooks.list_dead_letters()})
+    except Exception as e:
+        logger.error(f"Error reading webhook status: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/admin/webhooks/dead-letters/<int:dead_letter_id>/retry", methods=["POST"])
+@limiter.limit("30 per minute")
+@require_session
+@require_admin
+def retry_dead_letter(dead_letter_id):
+    try:
+        requeued = webhooks.requeue_dead_letter(dead_letter_id)
+    except Exception as e:
+        logger.error(f"Error requeueing webhook: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    if not requeued:
+        return jsonify({"success": False, "error": "Dead letter not found"}), 404
+    logger.info(f"Admin {request.user['username']} requeued webhook dead letter {dead_letter_id}")
+    return jsonify({"success": True})
+
+
 @app.route("/user/api-keys", methods=["GET"])
 @limiter.limit("30 per minute")
 @require_session
 def list_my_api_keys():
-    keys = auth_manager.list_api_keys(request.user["id"])
-    return jsonify({"success": True, "api_keys": keys, "count": len(keys)})
+    try:
+        limit, after = get_page_params(int)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    keys, next_cursor = auth_manager.list_api_keys(request.user["id"], limit, after)
+    return jsonify({"success": True, "api_keys": keys, "count": len(keys), "next_cursor": next_cursor})
 
 
 @app.route("/user/api-keys/create", methods=["POST"])
@@ -398,8 +964,14 @@ def create_my_api_key():
     data = request.json or {}
     description = data.get("description", "")
     expires_days = data.get("expires_days")
+    webhook_url = data.get("webhook_url")
+
+    if webhook_url:
+        is_valid, error_msg = validate_callback_url(webhook_url, Config.WEBHOOK_ALLOW_PRIVATE)
+        if not is_valid:
+            return jsonify({"error": error_msg}), 400
 
-    success, result = auth_manager.generate_api_key(request.user["id"], description, expires_days)
+    success, result = auth_manager.generate_api_key(request.user["id"], description, expires_days, webhook_url)
 
     if success:
         logger.info(f"User {request.user['username']} created API key")
@@ -421,6 +993,75 @@ def revoke_my_api_key(key_id):
     return jsonify({"success": False, "error": message}), 400
 
 
+@app.route("/user/api-keys/<int:key_id>/webhook", methods=["PUT"])
+@limiter.limit("30 per minute")
+@require_session
+def set_my_api_key_webhook(key_id):
+    data = request.json or {}
+    webhook_url = data.get("webhook_url")
+
+    if webhook_url:
+        is_valid, error_msg = validate_callback_url(webhook_url, Config.WEBHOOK_ALLOW_PRIVATE)
+        if not is_valid:
+            return jsonify({"error": error_msg}), 400
+
+    try:
+        updated = auth_manager.set_api_key_webhook(key_id, request.user["id"], webhook_url or None)
+    except Exception as e:
+        logger.error(f"Error setting API key webhook: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    if not updated:
+        return jsonify({"success": False, "error": "API key not found or unauthorized"}), 404
+    logger.info(f"User {request.user['username']} set webhook for API key {key_id}")
+    return jsonify({"success": True, "webhook_url": webhook_url or None})
+
+
+@app.route("/user/webhook-secret", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_session
+def get_my_webhook_secret():
+    try:
+        return jsonify({"success": True, "secret": webhooks.get_secret(request.user["id"])})
+    except Exception as e:
+        logger.error(f"Error reading webhook secret: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/user/webhook-secret/rotate", methods=["POST"])
+@limiter.limit("10 per minute")
+@require_session
+def rotate_my_webhook_secret():
+    try:
+        secret = webhooks.get_secret(request.user["id"], rotate=True)
+    except Exception as e:
+        logger.error(f"Error rotating webhook secret: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    logger.info(f"User {request.user['username']} rotated their webhook secret")
+    return jsonify({"success": True, "secret": secret})
+
+
+@app.route("/user/quota", methods=["GET"])
+@limiter.limit("60 per minute")
+@require_auth
+def get_user_quota():
+    if not QuotaManager.applies_to(request.user):
+        return jsonify({"success": True, "unlimited": True})
+
+    try:
+        return jsonify(
+            {
+                "success": True,
+                "unlimited": False,
+                "limits": quota_manager.get_limits(request.user["id"]),
+                "usage": quota_manager.get_usage(request.user["id"]),
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error reading quota: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/user/api-key-status", methods=["GET"])
 @limiter.limit("60 per minute")
 @require_session
@@ -428,18 +1069,16 @@ def check_api_key_status():
     """Check if the current user has an active API key."""
     user_id = request.user["id"]
 
-    conn = None
     try:
-        conn = auth_manager._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """SELECT COUNT(*) FROM api_keys 
-               WHERE user_id = %s AND is_active = TRUE 
-               AND (expires_at IS NULL OR expires_at > NOW())""",
-            (user_id,),
-        )
-        active_key_count = cursor.fetchone()[0]
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT COUNT(*) FROM api_keys 
+                   WHERE user_id = %s AND is_active = TRUE 
+                   AND (expires_at IS NULL OR expires_at > NOW())""",
+                (user_id,),
+            )
+            active_key_count = cursor.fetchone()[0]
 
         has_api_key = active_key_count > 0
 
@@ -453,15 +1092,321 @@ def check_api_key_status():
     except Exception as e:
         logger.error(f"Error checking API key status: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
-    finally:
-        if conn:
-            auth_manager._put_connection(conn)
+
+
+def insert_file_record(
+    cursor,
+    user_id,
+    original_filename: str,
+    stored_filename: str,
+    file_path: str,
+    file_size: int,
+    mime_type: str,
+    title: str,
+    video_url: str,
+    content_sha256: Optional[str],
+    extractor_key: Optional[str],
+    video_id: Optional[str],
+    output_mode: str,
+    profile: Optional[str],
+    format_selector: str,
+):
+    cursor.execute(
+        """INSERT INTO downloaded_files
+           (user_id, original_filename, stored_filename, file_path, file_size, mime_type, video_title,
+            video_url, content_sha256, extractor_key, video_id, output_mode, profile, format_selector)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+           RETURNING id""",
+        (
+            user_id,
+            original_filename,
+            stored_filename,
+            file_path,
+            file_size,
+            mime_type,
+            title,
+            video_url,
+            content_sha256,
+            extractor_key,
+            video_id,
+            output_mode,
+            profile,
+            format_selector,
+        ),
+    )
+    return cursor.fetchone()[0]
+
+
+def reuse_existing_download(
+    canonical, output_mode: str, profile: Optional[str], output_format: str, user_id
+) -> Optional[dict]:
+    """Answer a download from a stored copy of the same video, mode, profile and format, without running yt-dlp.
+
+    The user's own copy is returned as is. Another user's copy is hardlinked from its blob into a
+    new file record. Returns None when there is no usable copy.
+    """
+    try:
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(
+                """SELECT id, user_id, original_filename, stored_filename, file_path, file_size,
+                          mime_type, video_title, content_sha256
+                   FROM downloaded_files
+                   WHERE extractor_key = %s AND video_id = %s AND format_selector = %s AND output_mode = %s
+                     AND profile IS NOT DISTINCT FROM %s
+                   ORDER BY (user_id::text = %s) DESC, created_at DESC
+                   LIMIT 1""",
+                (canonical.extractor_key, canonical.video_id, output_format, output_mode, profile, str(user_id)),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            if str(row["user_id"]) == str(user_id):
+                if not os.path.exists(row["file_path"]):
+                    return None
+                scope = "own"
+                file_record_id, stored_filename = row["id"], row["stored_filename"]
+            else:
+                blob_path = blob_store.blob_path(row["content_sha256"]) if row["content_sha256"] else None
+                if not is_valid_uuid(str(user_id)) or blob_path is None:
+                    return None
+
+                scope = "linked"
+                stored_filename = f"{uuid.uuid4()}{os.path.splitext(row['stored_filename'])[1]}"
+                file_path = os.path.join(get_user_directory(user_id), stored_filename)
+                try:
+                    os.link(blob_path, file_path)
+                except OSError:
+                    # Blob collected or hard links unsupported: download normally
+                    return None
+                try:
+                    file_record_id = insert_file_record(
+                        cursor,
+                        user_id,
+                        row["original_filename"],
+                        stored_filename,
+                        file_path,
+                        row["file_size"],
+                        row["mime_type"],
+                        row["video_title"],
+                        canonical.url,
+                        row["content_sha256"],
+                        canonical.extractor_key,
+                        canonical.video_id,
+                        output_mode,
+                        profile,
+                        output_format,
+                    )
+                    conn.commit()
+                except Exception:
+                    os.remove(file_path)
+                    raise
+    except Exception as e:
+        logger.error(f"Error looking up stored copies of {canonical.url}: {e}")
+        return None
+
+    metrics.DOWNLOAD_REUSE.labels(scope).inc()
+    logger.info(f"Served {canonical.url} from a stored copy ({scope}): {stored_filename}")
+    return {
+        "success": True,
+        "request_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "video_id": canonical.video_id,
+        "title": row["video_title"],
+        "file_path": stored_filename,
+        "duration": None,
+        "download_path": f"/files/{stored_filename}",
+        "content_sha256": row["content_sha256"],
+        "mime_type": row["mime_type"],
+        "mode": output_mode,
+        "profile": profile,
+        "file_id": str(file_record_id),
+        "reused": scope,
+    }
+
+
+def record_ytdlp_ffmpeg_metrics(timer: PhaseTimer, failed_phase: Optional[str]):
+    """ffmpeg time and outcome for the post-processing yt-dlp ran, from the phases its output marked.
+
+    yt-dlp doesn't report ffmpeg's exit code, so a download that failed during a post-processing
+    phase (`failed_phase`) counts as an ffmpeg failure ("error"), and every other run as "0".
+    """
+    for phase in ("merge", "postprocess"):
+        if phase in timer.phases:
+            metrics.FFMPEG_DURATION.labels(phase).observe(timer.phases[phase])
+            metrics.FFMPEG_EXITS.labels(phase, "error" if phase == failed_phase else "0").inc()
+
+
+def transcode_ladder(source_path: str, directory: str, ladder: list) -> Optional[list]:
+    """Encode every profile in `ladder` (one or more) from `source_path` in one ffmpeg pass, then remove the source.
+
+    Returns [(profile name, output path)], or None if ffmpeg failed.
+    """
+    outputs = [(profile, os.path.join(directory, f"{uuid.uuid4()}.{profile.extension}")) for profile in ladder]
+    # ffmpeg reports progress here, so a long encode isn't taken for a stalled one (see supervisor.run)
+    progress_file = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}.progress")
+    cmd = ladder_command(source_path, outputs, threads=Config.TRANSCODE_THREADS, progress_file=progress_file)
+
+    logger.info(f"Transcoding {len(outputs)} rendition(s): {' '.join(cmd)}")
+    success, _, stderr = execute_ytdlp_command(cmd, "transcode", progress_file=progress_file)
+    paths = [source_path] if success else [source_path] + [path for _, path in outputs]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove {path}: {e}")
+
+    if not success:
+        logger.error(f"Transcoding failed: {stderr}")
+        return None
+    return [(profile.name, path) for profile, path in outputs]
+
+
+def store_output_file(
+    path: str,
+    user_id,
+    base_filename: str,
+    title: str,
+    video_url: str,
+    extractor_key: Optional[str],
+    video_id: Optional[str],
+    output_mode: str,
+    profile: Optional[str],
+    format_selector: str,
+    timer: PhaseTimer,
+) -> dict:
+    """Hash a finished output into the blob store and record it. Removes the file if recording fails."""
+    stored_filename = os.path.basename(path)
+    mime_type = mime_type_for(path)
+    file_size = os.path.getsize(path)
+
+    with timer.phase("hash"):
+        content_sha256, deduplicated = blob_store.ingest(path)
+    if deduplicated:
+        logger.info(f"{stored_filename} has the same content as an existing file; linked to blob {content_sha256}")
+
+    try:
+        with timer.phase("db_insert"):
+            with auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                blob_store.register(cursor, content_sha256, file_size)
+                file_record_id = insert_file_record(
+                    cursor,
+                    user_id,
+                    f"{base_filename}{os.path.splitext(path)[1]}",
+                    stored_filename,
+                    path,
+                    file_size,
+                    mime_type,
+                    title,
+                    video_url,
+                    content_sha256,
+                    extractor_key,
+                    video_id,
+                    output_mode,
+                    profile,
+                    format_selector,
+                )
+                conn.commit()
+    except Exception:
+        try:
+            os.remove(path)
+        except OSError as remove_error:
+            logger.warning(f"Failed to remove unrecorded file {path}: {remove_error}")
+        raise
+
+    logger.info(f"Saved file record to database: {file_record_id}")
+    return {
+        "file_id": str(file_record_id),
+        "profile": profile,
+        "file_path": stored_filename,
+        "download_path": f"/files/{stored_filename}",
+        "mime_type": mime_type,
+        "size": file_size,
+        "content_sha256": content_sha256,
+        "deduplicated": deduplicated,
+    }
 
 
 @app.route("/download", methods=["POST"])
 @limiter.limit("30 per minute")
 @require_auth
 def download_video():
+    """Run a download, or answer a retry carrying the same Idempotency-Key with the first response."""
+    key = request.headers.get("Idempotency-Key")
+    user_id = request.user["id"]
+
+    callback_url = (request.get_json(silent=True) or {}).get("callback_url") or request.user.get("webhook_url")
+    if callback_url:
+        if not is_valid_uuid(str(user_id)):
+            return jsonify({"error": "callback_url needs a user account"}), 400
+        is_valid, error_msg = validate_callback_url(callback_url, Config.WEBHOOK_ALLOW_PRIVATE)
+        if not is_valid:
+            return jsonify({"error": error_msg}), 400
+
+    # Keys are stored per user account, which the legacy shared key doesn't have
+    if not key or not is_valid_uuid(str(user_id)):
+        return run_download_and_notify(callback_url)
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({"error": f"Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters"}), 400
+
+    try:
+        stored = idempotency_keys.claim(user_id, key, request_fingerprint(request.get_json(silent=True)))
+    except IdempotencyConflict as e:
+        return jsonify({"error": str(e)}), 422
+    except IdempotencyInProgress as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": "5"}
+
+    if stored is not None:
+        body, status_code = stored
+        metrics.IDEMPOTENT_REPLAYS.inc()
+        logger.info(f"Replaying stored response for Idempotency-Key {key} of user {user_id}")
+        return jsonify(body), status_code, {"Idempotent-Replayed": "true"}
+
+    completed = False
+    try:
+        response = run_download_and_notify(callback_url)
+        # Server errors may be transient, so their retries run again instead of replaying the error
+        if response.status_code < 500 and response.is_json:
+            idempotency_keys.complete(user_id, key, response.get_json(), response.status_code)
+            completed = True
+        return response
+    finally:
+        if not completed:
+            idempotency_keys.release(user_id, key)
+
+
+def run_download_and_notify(callback_url: Optional[str]) -> Response:
+    """Run the download and queue a completion webhook for it if the caller asked for one."""
+    response = app.make_response(run_download())
+    body = response.get_json(silent=True) or {}
+    # Requests rejected before a job started (bad input) have no "success" and get no callback
+    if callback_url and "success" in body:
+        event = "download.completed" if body["success"] else "download.failed"
+        started = g.get("request_started")
+        try:
+            webhooks.enqueue(
+                request.user["id"],
+                callback_url,
+                event,
+                {
+                    "url": (request.get_json(silent=True) or {}).get("url"),
+                    "status_code": response.status_code,
+                    "result": body,
+                    "phases": g.get("download_phases"),
+                    "duration": round(time.perf_counter() - started, 3) if started else None,
+                },
+            )
+        except Exception as e:
+            # The download itself succeeded or failed on its own; the client still gets its response
+            logger.error(f"Failed to queue {event} webhook to {callback_url}: {e}")
+    return response
+
+
+def run_download():
     data = request.json
     if not data:
         return jsonify({"error": "Request body is required"}), 400
@@ -478,20 +1423,82 @@ def download_video():
     user_id = request.user["id"]
     user_dir = get_user_directory(user_id)
 
-    output_format = data.get("format", DEFAULT_FORMAT)
+    mode_name = data.get("mode", DEFAULT_OUTPUT_MODE)
+    if mode_name not in OUTPUT_MODES:
+        return jsonify({"error": f"mode must be one of: {', '.join(OUTPUT_MODES)}"}), 400
+    mode = OUTPUT_MODES[mode_name]
+    output_format = data.get("format", mode.format_selector)
+
+    profile = None
+    ladder = []
+    if mode.transcodes:
+        ladder_names = data.get("ladder") or []
+        if not isinstance(ladder_names, list) or len(ladder_names) > Config.MAX_LADDER_RENDITIONS:
+            return jsonify({"error": f"ladder must be a list of at most {Config.MAX_LADDER_RENDITIONS} profiles"}), 400
+        if ladder_names and data.get("profile"):
+            return jsonify({"error": "Use either profile or ladder, not both"}), 400
+        requested = ladder_names or [data.get("profile") or Config.TRANSCODE_DEFAULT_PROFILE]
+        unknown = [name for name in requested if name not in TRANSCODE_PROFILES]
+        if unknown:
+            return jsonify({"error": f"Unknown profile(s): {', '.join(map(str, unknown))}"}), 400
+        if ladder_names:
+            ladder = [TRANSCODE_PROFILES[name] for name in dict.fromkeys(ladder_names)]
+        else:
+            profile = TRANSCODE_PROFILES[requested[0]]
+    elif data.get("profile") or data.get("ladder"):
+        return jsonify({"error": "profile and ladder apply only to the video mode"}), 400
+
+    # The canonical form is only for matching stored copies; yt-dlp always gets the URL as given
+    canonical = canonicalize(video_url)
+
+    job_id = None
+    reservation_id = None
+    if QuotaManager.applies_to(request.user):
+        quota_manager.check_bytes(user_id, "daily_download_bytes")
+        job_id = quota_manager.start_job(user_id)
+
+    timer = PhaseTimer()
+    tracker = YtdlpPhaseTracker(timer)
+    trace = {
+        "success": False,
+        "extractor": None,
+        "format_id": None,
+        "file_id": None,
+        "file_bytes": None,
+        "error": None,
+        "domain": domain_of(video_url),
+        "reused": None,
+    }
+
     request_id = str(uuid.uuid4())
 
     logger.info(
-        f"Download request - URL: {video_url}, Format: {output_format}, "
+        f"Download request - URL: {video_url}, Mode: {mode.name}, Format: {output_format}, "
+        f"Profile: {', '.join(p.name for p in ladder) if ladder else profile and profile.name}, "
         f"User: {request.user['username']} (ID: {user_id}), RequestID: {request_id}"
     )
 
     try:
-        info_cmd = ["yt-dlp", "--dump-json", "--no-playlist", video_url]
-        success, stdout, stderr = execute_ytdlp_command(info_cmd)
+        # Answered from a stored copy, it still counts as a job and is recorded. Ladders produce
+        # several files, so they always run
+        if canonical.is_known and not ladder and not data.get("force"):
+            with timer.phase("reuse"):
+                reused = reuse_existing_download(canonical, mode.name, profile and profile.name, output_format, user_id)
+            if reused is not None:
+                trace["success"] = True
+                trace["reused"] = reused["reused"]
+                trace["extractor"] = canonical.extractor_key
+                trace["file_id"] = reused["file_id"]
+                return jsonify(reused)
+
+        # Resolve the same format selection the download will use, so the size check and trace describe it
+        info_cmd = ["yt-dlp", "--dump-json", "--no-playlist", "-f", output_format, video_url]
+        with timer.phase("info"):
+            success, stdout, stderr = execute_ytdlp_command(info_cmd, "info")
 
         if not success:
             logger.error(f"Error getting video info: {stderr}")
+            trace["error"] = stderr
             return jsonify({"success": False, "error": f"Failed to get video info: {stderr}"}), 500
 
         try:
@@ -500,12 +1507,24 @@ def download_video():
             logger.error(f"Failed to parse video info JSON: {e}")
             return jsonify({"success": False, "error": "Invalid video metadata"}), 500
 
+        trace["extractor"] = video_info.get("extractor_key") or video_info.get("extractor")
+        trace["format_id"] = video_info.get("format_id")
+
         file_size = video_info.get("filesize") or video_info.get("filesize_approx")
         is_valid, error_msg = validate_file_size(file_size)
         if not is_valid:
             logger.warning(f"File size validation failed: {error_msg}")
+            trace["error"] = error_msg
             return jsonify({"success": False, "error": error_msg}), 400
 
+        # Queue behind running downloads until the volume can hold this one
+        with timer.phase("disk_wait"):
+            # Each rendition is assumed to be at most the size of the source
+            reservation_id = disk_reservations.reserve(
+                user_id if is_valid_uuid(str(user_id)) else None,
+                disk_reservations.estimate(file_size, MAX_FILE_SIZE) + len(ladder) * (file_size or MAX_FILE_SIZE),
+            )
+
         original_title = video_info.get("title", "video")
         video_id = video_info.get("id", "unknown")
 
@@ -513,6 +1532,20 @@ def download_video():
         stored_filename = str(uuid.uuid4())
         filename_template = f"{user_dir}/{stored_filename}.%(ext)s"
 
+        # A profile or ladder is encoded by a separate ffmpeg pass after the download. yt-dlp's
+        # post-processors only run when it merges or converts, so a single progressive format would
+        # otherwise be stored untouched under the profile's name
+        renditions = ladder or ([profile] if profile is not None else [])
+
+        # yt-dlp captures ffmpeg's output while post-processing, so a long merge would look stalled;
+        # ffmpeg's progress file stands in for it
+        progress_file = os.path.join(tempfile.gettempdir(), f"{stored_filename}.progress")
+        ytdlp_args = list(mode.ytdlp_args)
+        if renditions:
+            # Merge without re-encoding; the encode reads this file
+            ytdlp_args += ["--merge-output-format", "mkv"]
+        ytdlp_args += ["--postprocessor-args", "ffmpeg:" + shlex.join(["-progress", progress_file])]
+
         download_cmd = [
             "yt-dlp",
             "-f",
@@ -520,83 +1553,120 @@ def download_video():
             "-o",
             filename_template,
             "--no-playlist",
-            "--merge-output-format",
-            "mp4",
-            "--postprocessor-args",
-            FFMPEG_ARGS,
+            "--newline",
+            *ytdlp_args,
             video_url,
         ]
 
         logger.info(f"Executing download: {' '.join(download_cmd)}")
-        success, stdout, stderr = execute_ytdlp_command(download_cmd)
+        tracker.begin()
+        success, stdout, stderr = execute_ytdlp_command(
+            download_cmd, "download", on_line=tracker.feed, progress_file=progress_file
+        )
+        failed_phase = None if success else timer.current
+        timer.stop()
+        record_ytdlp_ffmpeg_metrics(timer, failed_phase)
 
         if not success:
             logger.error(f"Download failed: {stderr}")
+            trace["error"] = stderr
             return jsonify({"success": False, "error": f"Download failed: {stderr}"}), 500
 
-        # Get actual downloaded file path
-        actual_file_path = f"{user_dir}/{stored_filename}.mp4"
-
-        # Get file size
-        file_size = 0
-        if os.path.exists(actual_file_path):
-            file_size = os.path.getsize(actual_file_path)
+        # The extension depends on the mode and, for "original", on the source
+        actual_file_path = find_output_file(user_dir, stored_filename)
+        if actual_file_path is None:
+            logger.error(f"Download reported success but no {user_dir}/{stored_filename}.* was created")
+            return jsonify({"success": False, "error": "Download failed: output file was not created"}), 500
+
+        if renditions:
+            with timer.phase("transcode"):
+                outputs = transcode_ladder(actual_file_path, user_dir, renditions)
+            if outputs is None:
+                trace["error"] = "Transcoding failed"
+                return jsonify({"success": False, "error": "Download failed: transcoding failed"}), 500
+        else:
+            outputs = [(None, actual_file_path)]
 
-        # Create original filename from title
         safe_title = create_safe_filename(original_title, video_id)
-        original_filename = f"{safe_title}.mp4"
-
-        # Insert into database
-        conn = None
-        try:
-            conn = auth_manager._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                """INSERT INTO downloaded_files 
-                   (user_id, original_filename, stored_filename, file_path, file_size, 
-                    mime_type, video_title, video_url)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                   RETURNING id""",
-                (
-                    user_id,
-                    original_filename,
-                    f"{stored_filename}.mp4",
-                    actual_file_path,
-                    file_size,
-                    "video/mp4",
-                    original_title,
-                    video_url,
-                ),
-            )
-            file_record_id = cursor.fetchone()[0]
-            conn.commit()
-            logger.info(f"Saved file record to database: {file_record_id}")
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            logger.error(f"Error saving file to database: {e}")
-        finally:
-            if conn:
-                auth_manager._put_connection(conn)
-
-        logger.info(f"Video downloaded successfully: {stored_filename}.mp4")
-
-        return jsonify(
-            {
-                "success": True,
-                "request_id": request_id,
-                "user_id": user_id,
-                "video_id": video_info.get("id"),
-                "title": original_title,
-                "file_path": f"{stored_filename}.mp4",
-                "duration": video_info.get("duration"),
-                "download_path": f"/files/{stored_filename}.mp4",
-            }
-        )
-
+        stored = []
+        for profile_name, output_path in outputs:
+            try:
+                stored.append(
+                    store_output_file(
+                        output_path,
+                        user_id,
+                        f"{safe_title}.{profile_name}" if ladder else safe_title,
+                        original_title,
+                        canonical.url,
+                        canonical.extractor_key or trace["extractor"],
+                        canonical.video_id or video_info.get("id"),
+                        mode.name,
+                        profile_name,
+                        output_format,
+                        timer,
+                    )
+                )
+            except Exception as e:
+                timer.stop()
+                logger.error(f"Error saving file to database: {e}")
+                trace["error"] = f"Failed to save file record: {e}"
+                for _, unsaved_path in outputs[len(stored) :]:
+                    try:
+                        os.remove(unsaved_path)
+                    except OSError as remove_error:
+                        logger.warning(f"Failed to remove unrecorded file {unsaved_path}: {remove_error}")
+                return jsonify({"success": False, "error": "Failed to save file record"}), 500
+
+        total_bytes = sum(entry["size"] for entry in stored)
+        trace["file_id"] = stored[0]["file_id"]
+        trace["file_bytes"] = total_bytes
+        metrics.BYTES_DOWNLOADED.inc(total_bytes)
+        if job_id is not None:
+            quota_manager.record_bytes(user_id, downloaded=total_bytes)
+
+        logger.info(f"Video downloaded successfully: {', '.join(entry['file_path'] for entry in stored)}")
+        trace["success"] = True
+
+        primary = stored[0]
+        response = {
+            "success": True,
+            "request_id": request_id,
+            "user_id": user_id,
+            "video_id": video_info.get("id"),
+            "title": original_title,
+            "file_path": primary["file_path"],
+            "duration": video_info.get("duration"),
+            "download_path": primary["download_path"],
+            "mime_type": primary["mime_type"],
+            "mode": mode.name,
+            "profile": primary["profile"],
+            "content_sha256": primary["content_sha256"],
+            "deduplicated": primary["deduplicated"],
+        }
+        if ladder:
+            response["renditions"] = stored
+        return jsonify(response)
+
+    except InsufficientStorage as e:
+        logger.warning(f"Download rejected for lack of disk space: {e}")
+        trace["error"] = str(e)
+        response = jsonify({"success": False, "error": str(e)})
+        if e.retry_after:
+            response.headers["Retry-After"] = str(e.retry_after)
+        return response, 507
     except Exception as e:
         logger.exception(f"Exception during download: {str(e)}")
+        trace["error"] = str(e)
         return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        timer.stop()
+        g.download_phases = timer.as_dict()
+        traced_user = user_id if is_valid_uuid(str(user_id)) else None
+        record_download(auth_manager, traced_user, timer, postprocessors=tracker.postprocessors, **trace)
+        if reservation_id is not None:
+            disk_reservations.release(reservation_id)
+        if job_id is not None:
+            quota_manager.finish_job(job_id)
 
 
 @app.route("/files/<path:file_path>", methods=["GET"])
@@ -615,7 +1685,19 @@ def get_file(file_path):
     if not os.path.exists(full_path):
         return jsonify({"error": "File not found"}), 404
 
-    return send_file(full_path, as_attachment=True)
+    if QuotaManager.applies_to(request.user):
+        quota_manager.check_bytes(request.user["id"], "daily_served_bytes")
+
+    response = send_file(full_path, as_attachment=True)
+    # Players seek with Range requests, so charge what this response sends, not the whole file
+    served = response.content_length or 0
+    if request.method == "HEAD" or response.status_code not in (200, 206):
+        served = 0
+    if served:
+        if QuotaManager.applies_to(request.user):
+            quota_manager.record_bytes(request.user["id"], served=served)
+        metrics.BYTES_SERVED.labels("files").inc(served)
+    return response
 
 
 @app.route("/list-files", methods=["GET"])
@@ -625,46 +1707,124 @@ def list_user_files():
     # Use authenticated user's ID
     user_id = request.user["id"]
 
-    conn = None
     try:
-        conn = auth_manager._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT id, original_filename, stored_filename, file_path, file_size, 
-                      created_at, video_title, video_url
-               FROM downloaded_files 
-               WHERE user_id = %s 
-               ORDER BY created_at DESC""",
-            (user_id,),
+        limit, after = get_page_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fields = DEFAULT_FILE_LIST_FIELDS
+    if request.args.get("fields"):
+        fields = [field.strip() for field in request.args["fields"].split(",") if field.strip()]
+        unknown = [field for field in fields if field not in FILE_LIST_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    # id and created_at are always needed to build the next cursor
+    columns = ["id", "created_at"]
+    for field in fields:
+        column = FILE_LIST_FIELDS[field][0]
+        if column not in columns:
+            columns.append(column)
+
+    try:
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            if after:
+                cursor.execute(
+                    f"""SELECT {', '.join(columns)}
+                        FROM downloaded_files
+                        WHERE user_id = %s AND (created_at, id) < (%s, %s)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s""",
+                    (user_id, *after, limit + 1),
+                )
+            else:
+                cursor.execute(
+                    f"""SELECT {', '.join(columns)}
+                        FROM downloaded_files
+                        WHERE user_id = %s
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s""",
+                    (user_id, limit + 1),
+                )
+            files = cursor.fetchall()
+
+        next_cursor = None
+        if len(files) > limit:
+            files = files[:limit]
+            next_cursor = encode_cursor(files[-1]["created_at"], files[-1]["id"])
+
+        result = [{field: FILE_LIST_FIELDS[field][1](file) for field in fields} for file in files]
+
+        return jsonify(
+            {
+                "success": True,
+                "user_id": str(user_id),
+                "files": result,
+                "count": len(result),
+                "next_cursor": next_cursor,
+            }
         )
-        files = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Error listing files for user {user_id}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        result = []
-        for file in files:
-            file_id, original_filename, stored_filename, file_path, file_size, created_at, video_title, video_url = file
 
-            # Convert created_at to timestamp
-            modified_timestamp = created_at.timestamp() if created_at else 0
+@app.route("/search-files", methods=["GET"])
+@limiter.limit("60 per minute")
+@require_auth
+def search_user_files():
+    user_id = request.user["id"]
+    query = request.args.get("q", "").strip()
 
-            result.append(
-                {
-                    "id": str(file_id),
-                    "name": original_filename,
-                    "path": stored_filename,
-                    "size": file_size,
-                    "modified": modified_timestamp,
-                    "download_path": f"/files/{stored_filename}",
-                    "title": video_title,
-                }
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    if len(query) > MAX_SEARCH_QUERY_LENGTH:
+        return jsonify({"error": f"q must be at most {MAX_SEARCH_QUERY_LENGTH} characters"}), 400
+
+    try:
+        limit = parse_page_size(request.args.get("limit"), default=20, maximum=100)
+        offset = int(request.args.get("offset", 0))
+        if offset < 0:
+            raise ValueError("offset must be non-negative")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            # Full-text matches rank by ts_rank_cd; trigram similarity on the title catches typos
+            cursor.execute(
+                """SELECT id, original_filename, stored_filename, file_size, created_at, video_title,
+                          GREATEST(ts_rank_cd(search_vector, query), similarity(video_title, %(q)s)) AS score
+                   FROM downloaded_files, websearch_to_tsquery('simple', %(q)s) AS query
+                   WHERE user_id = %(user_id)s
+                   AND (search_vector @@ query OR video_title %% %(q)s)
+                   ORDER BY score DESC, created_at DESC, id DESC
+                   LIMIT %(limit)s OFFSET %(offset)s""",
+                {"q": query, "user_id": user_id, "limit": limit + 1, "offset": offset},
             )
+            files = cursor.fetchall()
+
+        has_more = len(files) > limit
+        files = files[:limit]
+
+        result = [{field: FILE_LIST_FIELDS[field][1](file) for field in DEFAULT_FILE_LIST_FIELDS} for file in files]
+        for item, file in zip(result, files):
+            item["score"] = round(float(file["score"]), 4)
 
-        return jsonify({"success": True, "user_id": str(user_id), "files": result, "count": len(result)})
+        return jsonify(
+            {
+                "success": True,
+                "query": query,
+                "files": result,
+                "count": len(result),
+                "next_offset": offset + limit if has_more else None,
+            }
+        )
     except Exception as e:
-        logger.error(f"Error listing files for user {user_id}: {e}")
+        logger.error(f"Error searching files for user {user_id}: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
-    finally:
-        if conn:
-            auth_manager._put_connection(conn)
 
 
 @app.route("/delete-file", methods=["DELETE"])
@@ -678,28 +1838,27 @@ def delete_file():
     file_path = data["file_path"]
     user_id = request.user["id"]
 
-    conn = None
     try:
-        conn = auth_manager._get_connection()
-        cursor = conn.cursor()
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor()
 
-        # Get file record from database
-        cursor.execute(
-            """SELECT id, stored_filename, file_path 
-               FROM downloaded_files 
-               WHERE user_id = %s AND stored_filename = %s""",
-            (user_id, file_path),
-        )
-        file_record = cursor.fetchone()
+            # Get file record from database
+            cursor.execute(
+                """SELECT id, stored_filename, file_path 
+                   FROM downloaded_files 
+                   WHERE user_id = %s AND stored_filename = %s""",
+                (user_id, file_path),
+            )
+            file_record = cursor.fetchone()
 
-        if not file_record:
-            return jsonify({"error": "File not found or unauthorized"}), 404
+            if not file_record:
+                return jsonify({"error": "File not found or unauthorized"}), 404
 
-        file_id, stored_filename, actual_file_path = file_record
+            file_id, stored_filename, actual_file_path = file_record
 
-        # Delete from database
-        cursor.execute("DELETE FROM downloaded_files WHERE id = %s", (file_id,))
-        conn.commit()
+            # Delete from database
+            cursor.execute("DELETE FROM downloaded_files WHERE id = %s", (file_id,))
+            conn.commit()
 
         # Delete physical file
         if os.path.exists(actual_file_path):
@@ -711,13 +1870,158 @@ def delete_file():
 
         return jsonify({"success": True, "message": "File deleted successfully"})
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.exception(f"Error deleting file: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/delete-files", methods=["DELETE"])
+@limiter.limit("10 per minute")
+@require_auth
+def delete_files_bulk():
+    data = request.json
+    if not data:
+        return jsonify({"error": "Request body is required"}), 400
+
+    file_ids = data.get("ids")
+    older_than_days = data.get("older_than_days")
+
+    if file_ids is None and older_than_days is None:
+        return jsonify({"error": "ids or older_than_days is required"}), 400
+
+    if file_ids is not None:
+        if not isinstance(file_ids, list) or not file_ids:
+            return jsonify({"error": "ids must be a non-empty list"}), 400
+        if len(file_ids) > MAX_BULK_DELETE:
+            return jsonify({"error": f"At most {MAX_BULK_DELETE} ids can be deleted per request"}), 400
+        if not all(is_valid_uuid(file_id) for file_id in file_ids):
+            return jsonify({"error": "ids must be file ids returned by /list-files"}), 400
+
+    if older_than_days is not None:
+        if not isinstance(older_than_days, (int, float)) or older_than_days < 0:
+            return jsonify({"error": "older_than_days must be a non-negative number"}), 400
+
+    user_id = request.user["id"]
+
+    conditions = ["user_id = %s"]
+    params = [user_id]
+    if file_ids is not None:
+        conditions.append("id = ANY(%s::uuid[])")
+        params.append([str(file_id) for file_id in file_ids])
+    if older_than_days is not None:
+        conditions.append("created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'")
+        params.append(older_than_days)
+
+    try:
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DELETE FROM downloaded_files WHERE {' AND '.join(conditions)} RETURNING file_path, file_size",
+                params,
+            )
+            deleted = cursor.fetchall()
+            conn.commit()
+    except Exception as e:
+        logger.exception(f"Error bulk deleting files: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    queued = deletion_queue.enqueue(file_path for file_path, _ in deleted)
+    logger.info(f"User {request.user['username']} bulk deleted {len(deleted)} file(s)")
+
+    return jsonify(
+        {
+            "success": True,
+            "deleted": len(deleted),
+            "bytes_freed": sum(file_size for _, file_size in deleted),
+            "queued_unlinks": queued,
+        }
+    )
+
+
+def iter_export_entries(user_id, file_ids: Optional[list] = None):
+    """Yield (archive name, path) for a user's files, fetching rows a page at a time."""
+    last_key = None
+
+    while True:
+        conditions = ["user_id = %s"]
+        params = [user_id]
+        if file_ids is not None:
+            conditions.append("id = ANY(%s::uuid[])")
+            params.append(file_ids)
+        if last_key is not None:
+            conditions.append("(created_at, id) < (%s, %s)")
+            params.extend(last_key)
+        params.append(EXPORT_PAGE_SIZE)
+
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""SELECT id, created_at, original_filename, file_path
+                    FROM downloaded_files
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s""",
+                params,
+            )
+            rows = cursor.fetchall()
+
+        for _, _, original_filename, file_path in rows:
+            yield original_filename, file_path
+
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        last_key = (rows[-1][1], rows[-1][0])
+
+
+def count_served_bytes(chunks, user_id: Optional[str] = None):
+    """Pass through a streamed export, counting the bytes actually sent and charging them to the user's quota."""
+    served = 0
+    try:
+        for chunk in chunks:
+            served += len(chunk)
+            yield chunk
     finally:
-        if conn:
-            auth_manager._put_connection(conn)
+        metrics.BYTES_SERVED.labels("export").inc(served)
+        if user_id is not None:
+            quota_manager.record_bytes(user_id, served=served)
+
+
+@app.route("/export-files", methods=["POST"])
+@limiter.limit("5 per minute")
+@require_auth
+def export_files():
+    data = request.json or {}
+    archive_format = data.get("format", "zip")
+    file_ids = data.get("ids")
+
+    if archive_format not in ARCHIVE_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(ARCHIVE_FORMATS)}"}), 400
+
+    if file_ids is not None:
+        if not isinstance(file_ids, list) or not file_ids:
+            return jsonify({"error": "ids must be a non-empty list"}), 400
+        if not all(is_valid_uuid(file_id) for file_id in file_ids):
+            return jsonify({"error": "ids must be file ids returned by /list-files"}), 400
+        file_ids = [str(file_id) for file_id in file_ids]
+
+    streamer, mimetype = ARCHIVE_FORMATS[archive_format]
+    charged_user = None
+    if QuotaManager.applies_to(request.user):
+        quota_manager.check_bytes(request.user["id"], "daily_served_bytes")
+        charged_user = request.user["id"]
+    chunks = count_served_bytes(streamer(iter_export_entries(request.user["id"], file_ids)), charged_user)
+
+    archive_name = f"downloads-{time.strftime('%Y%m%d-%H%M%S')}.{archive_format}"
+
+    logger.info(f"User {request.user['username']} exporting files as {archive_format}")
+
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{archive_name}"',
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 
 @app.route("/formats", methods=["POST"])
@@ -736,7 +2040,7 @@ def list_formats():
 
     try:
         cmd = ["yt-dlp", "-F", "--no-playlist", video_url]
-        success, stdout, stderr = execute_ytdlp_command(cmd)
+        success, stdout, stderr = execute_ytdlp_command(cmd, "formats")
 
         if not success:
             logger.error(f"Error fetching formats: {stderr}")
@@ -758,22 +2062,26 @@ def list_formats():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route("/transcode-profiles", methods=["GET"])
+@limiter.limit("30 per minute")
+@require_auth
+def list_transcode_profiles():
+    return jsonify(
+        {
+            "profiles": {name: profile.as_dict() for name, profile in TRANSCODE_PROFILES.items()},
+            "default": Config.TRANSCODE_DEFAULT_PROFILE,
+            "max_ladder_renditions": Config.MAX_LADDER_RENDITIONS,
+        }
+    )
+
+
 @app.route("/disk-usage", methods=["GET"])
 @limiter.limit("30 per minute")
 @require_auth
 def get_disk_usage():
     try:
         usage = shutil.disk_usage(DOWNLOAD_DIR)
-
-        dir_size = 0
-        try:
-            for root, _, files in os.walk(DOWNLOAD_DIR):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if os.path.exists(file_path):
-                        dir_size += os.path.getsize(file_path)
-        except Exception as e:
-            logger.warning(f"Error calculating directory size: {e}")
+        accounted = storage_accounting.get_usage(request.user["id"])
 
         return jsonify(
             {
@@ -782,7 +2090,10 @@ def get_disk_usage():
                 "used_space": usage.used,
                 "free_space": usage.free,
                 "usage_percent": round(usage.used / usage.total * 100, 2),
-                "download_dir_size": dir_size,
+                "download_dir_size": accounted["global"]["total_bytes"],
+                "file_count": accounted["global"]["file_count"],
+                "user_usage": accounted["user"],
+                "reservations": disk_reservations.stats(),
             }
         )
     except Exception as e:
@@ -797,6 +2108,7 @@ def not_found(error):
 
 @app.errorhandler(429)
 def ratelimit_handler(e):
+    metrics.RATELIMIT_REJECTIONS.labels(request.url_rule.rule if request.url_rule else "unmatched").inc()
     logger.warning(f"Rate limit exceeded from {request.remote_addr} - {e.description}")
     return (
         jsonify(
@@ -810,6 +2122,24 @@ def ratelimit_handler(e):
     )
 
 
+@app.errorhandler(QuotaExceeded)
+def quota_exceeded_handler(e):
+    metrics.QUOTA_REJECTIONS.labels(e.quota).inc()
+    logger.warning(f"Quota exceeded for user {request.user.get('username', 'unknown')}: {e}")
+    return (
+        jsonify(
+            {
+                "error": "Quota exceeded",
+                "message": str(e),
+                "quota": e.quota,
+                "limit": e.limit,
+                "used": e.used,
+            }
+        ),
+        429,
+    )
+
+
 @app.errorhandler(500)
 def internal_error(error):
     logger.exception("Internal server error")
@@ -817,10 +2147,13 @@ def internal_error(error):
 
 
 if __name__ == "__main__":
-    from config import Config
-
     Config.log_config()
-    logger.info(f"Starting yt-dlp API server on {HOST}:{PORT}")
+    logger.info(f"Starting yt-dlp API development server on {HOST}:{PORT}")
     logger.info(f"Debug mode: {DEBUG}")
+    logger.info("For production, run: gunicorn -c gunicorn.conf.py wsgi:app")
 
-    app.run(host=HOST, port=PORT, debug=DEBUG)
+    create_app()
+    try:
+        app.run(host=HOST, port=PORT, debug=DEBUG, use_reloader=False)
+    finally:
+        shutdown()
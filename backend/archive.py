@@ -0,0 +1,119 @@
+import os
+import time
+import tarfile
+import zipfile
+import logging
+from typing import Iterable, Iterator, Tuple
+
+logger = logging.getLogger("yt-dlp-api.archive")
+
+CHUNK_SIZE = 1024 * 1024
+
+# Earliest timestamp a ZIP local header can represent (1980-01-01)
+MIN_ZIP_TIMESTAMP = 315532800
+
+# (archive name, path on disk)
+ArchiveEntry = Tuple[str, str]
+
+
+class _StreamSink:
+    """Write-only file object that collects what zipfile writes until the generator drains it."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """Yield a stored (uncompressed) ZIP archive of `entries`, one chunk at a time."""
+    sink = _StreamSink()
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path in _unique_names(entries):
+            try:
+                source = open(path, "rb")
+            except OSError as e:
+                logger.warning(f"Skipping {path} in archive: {e}")
+                continue
+
+            with source:
+                stat = os.fstat(source.fileno())
+                zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(max(stat.st_mtime, MIN_ZIP_TIMESTAMP))[:6])
+                zinfo.compress_type = zipfile.ZIP_STORED
+                zinfo.file_size = stat.st_size
+
+                with archive.open(zinfo, mode="w") as dest:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield sink.drain()
+
+            yield sink.drain()
+
+    yield sink.drain()
+
+
+def stream_tar(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """Yield an uncompressed POSIX tar archive of `entries`, one chunk at a time."""
+    written = 0
+
+    for arcname, path in _unique_names(entries):
+        try:
+            source = open(path, "rb")
+        except OSError as e:
+            logger.warning(f"Skipping {path} in archive: {e}")
+            continue
+
+        with source:
+            stat = os.fstat(source.fileno())
+            tarinfo = tarfile.TarInfo(arcname)
+            tarinfo.size = stat.st_size
+            tarinfo.mtime = int(stat.st_mtime)
+            tarinfo.mode = 0o644
+
+            header = tarinfo.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+            yield header
+            written += len(header)
+
+            # The header promised st_size bytes, so emit exactly that many even if the file changes underneath us
+            remaining = tarinfo.size
+            while remaining > 0:
+                chunk = source.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    chunk = b"\0" * min(CHUNK_SIZE, remaining)
+                remaining -= len(chunk)
+                yield chunk
+
+            padding = -tarinfo.size % tarfile.BLOCKSIZE
+            yield b"\0" * padding
+            written += tarinfo.size + padding
+
+    end = b"\0" * (2 * tarfile.BLOCKSIZE)
+    written += len(end)
+    yield end + b"\0" * (-written % tarfile.RECORDSIZE)
+
+
+def _unique_names(entries: Iterable[ArchiveEntry]) -> Iterator[ArchiveEntry]:
+    seen = set()
+    for arcname, path in entries:
+        candidate = arcname
+        stem, ext = os.path.splitext(arcname)
+        counter = 2
+        while candidate in seen:
+            candidate = f"{stem} ({counter}){ext}"
+            counter += 1
+        seen.add(candidate)
+        yield candidate, path
@@ -1,21 +1,36 @@
 import psycopg2
-from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
 import secrets
 import hashlib
-import os
+import select
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Tuple
 import logging
 
+from cache import TTLCache
+from config import Config
+from db import ConnectionPool
+from migrate import current_version, latest_version
+from utils import DEFAULT_PAGE_SIZE, encode_cursor
+
 logger = logging.getLogger("yt-dlp-api.auth")
 
-DB_HOST = os.environ.get("DB_HOST", "localhost")
-DB_PORT = int(os.environ.get("DB_PORT", 5432))
-DB_NAME = os.environ.get("DB_NAME", "social_video_db")
-DB_USER = os.environ.get("DB_USER", "videouser")
-DB_PASSWORD = os.environ.get("DB_PASSWORD", "changeme123")
+# Postgres channel used to evict cached principals in every process
+AUTH_INVALIDATE_CHANNEL = "auth_cache_invalidate"
+
+# First key of the per-token advisory lock taken while creating a session (see create_session)
+SESSION_TOKEN_LOCK = 7240116
+# New tokens to try if one is already taken, which 256 random bits make all but impossible
+SESSION_TOKEN_ATTEMPTS = 3
+
+DB_HOST = Config.DB_HOST
+DB_PORT = Config.DB_PORT
+DB_NAME = Config.DB_NAME
+DB_USER = Config.DB_USER
+DB_PASSWORD = Config.DB_PASSWORD
 
 
 class AuthManager:
@@ -27,9 +42,11 @@ class AuthManager:
         self.db_password = DB_PASSWORD
 
         try:
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                1,
-                20,
+            self.connection_pool = ConnectionPool(
+                Config.DB_MIN_CONN,
+                Config.DB_MAX_CONN,
+                timeout=Config.DB_POOL_TIMEOUT,
+                healthcheck_interval=Config.DB_HEALTHCHECK_INTERVAL,
                 host=self.db_host,
                 port=self.db_port,
                 database=self.db_name,
@@ -41,7 +58,10 @@ class AuthManager:
             logger.error(f"Failed to create connection pool: {e}")
             raise
 
-        self._init_db()
+        self.principal_cache = TTLCache(maxsize=Config.AUTH_CACHE_SIZE, ttl=Config.AUTH_CACHE_TTL)
+        self._listener_thread = None
+
+        self._verify_schema()
 
     def _get_connection(self):
         try:
@@ -55,92 +75,21 @@ class AuthManager:
         if conn:
             self.connection_pool.putconn(conn)
 
-    def _init_db(self):
-        conn = None
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+    def connection(self):
+        """Context manager that borrows a pooled connection and always returns it."""
+        return self.connection_pool.connection()
 
-            # Enable uuid extension
-            cursor.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
+    def _verify_schema(self):
+        with self.connection() as conn:
+            version = current_version(conn)
 
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                    username VARCHAR(255) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL,
-                    role VARCHAR(50) NOT NULL DEFAULT 'user',
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN NOT NULL DEFAULT TRUE
-                )
-            """
+        expected = latest_version()
+        if version is None or version < expected:
+            raise RuntimeError(
+                f"Database schema is at version {version or 0}, expected {expected}. "
+                "Run `python migrate.py` before starting the API."
             )
-
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS api_keys (
-                    id SERIAL PRIMARY KEY,
-                    user_id UUID NOT NULL,
-                    api_key VARCHAR(255) UNIQUE NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMP,
-                    is_active BOOLEAN NOT NULL DEFAULT TRUE,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-                )
-            """
-            )
-
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id SERIAL PRIMARY KEY,
-                    user_id UUID NOT NULL,
-                    session_token VARCHAR(255) UNIQUE NOT NULL,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMP NOT NULL,
-                    is_active BOOLEAN NOT NULL DEFAULT TRUE,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-                )
-            """
-            )
-
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS downloaded_files (
-                    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                    user_id UUID NOT NULL,
-                    original_filename VARCHAR(500) NOT NULL,
-                    stored_filename VARCHAR(255) NOT NULL,
-                    file_path TEXT NOT NULL,
-                    file_size BIGINT NOT NULL DEFAULT 0,
-                    mime_type VARCHAR(100),
-                    video_title TEXT,
-                    video_url TEXT,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-                )
-            """
-            )
-
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_user_id ON api_keys(user_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_api_key ON api_keys(api_key)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(session_token)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_downloaded_files_user_id ON downloaded_files(user_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_downloaded_files_created_at ON downloaded_files(created_at)")
-
-            conn.commit()
-            logger.info("Database initialized successfully")
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            logger.error(f"Error initializing database: {e}")
-            raise
-        finally:
-            if conn:
-                self._put_connection(conn)
+        logger.info(f"Database schema is at version {version}")
 
     def _hash_password(self, password: str) -> str:
         salt = secrets.token_hex(16)
@@ -155,6 +104,66 @@ class AuthManager:
         except Exception:
             return False
 
+    @staticmethod
+    def _principal_cache_key(kind: str, token: str) -> str:
+        return f"{kind}:{hashlib.sha256(token.encode()).hexdigest()}"
+
+    def _cache_principal(self, cache_key: str, principal: Dict, expires_at: Optional[datetime]):
+        ttl = None
+        if expires_at:
+            ttl = (expires_at - datetime.utcnow()).total_seconds()
+        self.principal_cache.set(cache_key, dict(principal), ttl)
+
+    def _invalidate_principal(self, cursor, cache_key: str) -> str:
+        """Notify every process, this one included, to evict `cache_key` once the surrounding transaction commits.
+
+        Callers also evict locally after committing: evicting before would let a concurrent
+        validation re-cache the still-active row.
+        """
+        cursor.execute("SELECT pg_notify(%s, %s)", (AUTH_INVALIDATE_CHANNEL, cache_key))
+        return cache_key
+
+    def start_invalidation_listener(self):
+        if self._listener_thread and self._listener_thread.is_alive():
+            return
+        self._listener_thread = threading.Thread(
+            target=self._listen_for_invalidations, name="auth-cache-listener", daemon=True
+        )
+        self._listener_thread.start()
+
+    def _listen_for_invalidations(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(
+                    host=self.db_host,
+                    port=self.db_port,
+                    database=self.db_name,
+                    user=self.db_user,
+                    password=self.db_password,
+                )
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {AUTH_INVALIDATE_CHANNEL}")
+
+                # Anything cached before LISTEN took effect may have missed an invalidation
+                self.principal_cache.clear()
+                logger.info("Listening for auth cache invalidations")
+
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.principal_cache.delete(notify.payload)
+            except Exception as e:
+                logger.error(f"Auth cache listener error, clearing cache and reconnecting: {e}")
+                self.principal_cache.clear()
+                time.sleep(5)
+            finally:
+                if conn:
+                    conn.close()
+
     def create_user(self, username: str, password: str, role: str = "user") -> Tuple[bool, str]:
         if role not in ["admin", "user"]:
             return False, "Invalid role. Must be 'admin' or 'user'"
@@ -216,14 +225,24 @@ class AuthManager:
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            session_token = secrets.token_urlsafe(32)
             expires_at = datetime.utcnow() + timedelta(hours=duration_hours)
 
-            cursor.execute(
-                """INSERT INTO sessions (user_id, session_token, expires_at)
-                   VALUES (%s, %s, %s)""",
-                (user_id, session_token, expires_at),
-            )
+            # A partitioned sessions table can only be unique on (session_token, expires_at), so
+            # token uniqueness is checked here, serialised per token by an advisory lock
+            for _ in range(SESSION_TOKEN_ATTEMPTS):
+                session_token = secrets.token_urlsafe(32)
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (SESSION_TOKEN_LOCK, session_token))
+                cursor.execute(
+                    """INSERT INTO sessions (user_id, session_token, expires_at)
+                       SELECT %s, %s, %s
+                       WHERE NOT EXISTS (SELECT 1 FROM sessions WHERE session_token = %s)""",
+                    (user_id, session_token, expires_at, session_token),
+                )
+                if cursor.rowcount:
+                    break
+                conn.rollback()
+            else:
+                raise RuntimeError("Could not generate an unused session token")
             conn.commit()
             logger.info(f"Created session for user_id: {user_id}")
             return session_token
@@ -237,6 +256,11 @@ class AuthManager:
                 self._put_connection(conn)
 
     def validate_session(self, session_token: str) -> Optional[Dict]:
+        cache_key = self._principal_cache_key("session", session_token)
+        cached = self.principal_cache.get(cache_key)
+        if cached:
+            return dict(cached)
+
         conn = None
         try:
             conn = self._get_connection()
@@ -258,7 +282,9 @@ class AuthManager:
                 conn.commit()
                 return None
 
-            return {"id": session["user_id"], "username": session["username"], "role": session["role"]}
+            principal = {"id": session["user_id"], "username": session["username"], "role": session["role"]}
+            self._cache_principal(cache_key, principal, session["expires_at"])
+            return principal
         except Exception as e:
             if conn:
                 conn.rollback()
@@ -274,8 +300,11 @@ class AuthManager:
             conn = self._get_connection()
             cursor = conn.cursor()
             cursor.execute("UPDATE sessions SET is_active = FALSE WHERE session_token = %s", (session_token,))
+            updated = cursor.rowcount > 0
+            cache_key = self._invalidate_principal(cursor, self._principal_cache_key("session", session_token))
             conn.commit()
-            return cursor.rowcount > 0
+            self.principal_cache.delete(cache_key)
+            return updated
         except Exception as e:
             if conn:
                 conn.rollback()
@@ -286,7 +315,11 @@ class AuthManager:
                 self._put_connection(conn)
 
     def generate_api_key(
-        self, user_id: int, description: str = "", expires_days: Optional[int] = None
+        self,
+        user_id: int,
+        description: str = "",
+        expires_days: Optional[int] = None,
+        webhook_url: Optional[str] = None,
     ) -> Tuple[bool, str]:
         conn = None
         try:
@@ -299,9 +332,9 @@ class AuthManager:
                 expires_at = datetime.utcnow() + timedelta(days=expires_days)
 
             cursor.execute(
-                """INSERT INTO api_keys (user_id, api_key, description, expires_at)
-                   VALUES (%s, %s, %s, %s)""",
-                (user_id, api_key, description, expires_at),
+                """INSERT INTO api_keys (user_id, api_key, description, expires_at, webhook_url)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (user_id, api_key, description, expires_at, webhook_url),
             )
             conn.commit()
             logger.info(f"Generated API key for user_id: {user_id}")
@@ -316,6 +349,11 @@ class AuthManager:
                 self._put_connection(conn)
 
     def validate_api_key(self, api_key: str) -> Optional[Dict]:
+        cache_key = self._principal_cache_key("api_key", api_key)
+        cached = self.principal_cache.get(cache_key)
+        if cached:
+            return dict(cached)
+
         conn = None
         try:
             conn = self._get_connection()
@@ -336,7 +374,14 @@ class AuthManager:
                 if datetime.utcnow() > key_record["expires_at"]:
                     return None
 
-            return {"id": key_record["user_id"], "username": key_record["username"], "role": key_record["role"]}
+            principal = {
+                "id": key_record["user_id"],
+                "username": key_record["username"],
+                "role": key_record["role"],
+                "webhook_url": key_record["webhook_url"],
+            }
+            self._cache_principal(cache_key, principal, key_record["expires_at"])
+            return principal
         except Exception as e:
             logger.error(f"Error validating API key: {e}")
             return None
@@ -344,18 +389,24 @@ class AuthManager:
             if conn:
                 self._put_connection(conn)
 
-    def list_api_keys(self, user_id: int) -> List[Dict]:
+    def list_api_keys(
+        self, user_id: int, limit: int = DEFAULT_PAGE_SIZE, after: Optional[Tuple] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Return one page of a user's keys, newest first, and the cursor for the next page."""
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute(
-                """SELECT id, api_key, description, created_at, expires_at, is_active
+                """SELECT id, api_key, description, created_at, expires_at, is_active, webhook_url
                    FROM api_keys WHERE user_id = %s
-                   ORDER BY created_at DESC""",
-                (user_id,),
+                   AND (%s::timestamp IS NULL OR (created_at, id) < (%s::timestamp, %s::integer))
+                   ORDER BY created_at DESC, id DESC
+                   LIMIT %s""",
+                (user_id, *_keyset_params(after), limit + 1),
             )
             keys = cursor.fetchall()
+            next_cursor = _next_cursor(keys, limit)
 
             result = []
             for key in keys:
@@ -370,13 +421,14 @@ class AuthManager:
                         "expires_at": key["expires_at"].isoformat() if key["expires_at"] else None,
                         "is_active": key["is_active"],
                         "is_expired": (key["expires_at"] < datetime.utcnow() if key["expires_at"] else False),
+                        "webhook_url": key["webhook_url"],
                     }
                 )
 
-            return result
+            return result, next_cursor
         except Exception as e:
             logger.error(f"Error listing API keys: {e}")
-            return []
+            return [], None
         finally:
             if conn:
                 self._put_connection(conn)
@@ -386,10 +438,17 @@ class AuthManager:
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            cursor.execute("UPDATE api_keys SET is_active = FALSE WHERE id = %s AND user_id = %s", (key_id, user_id))
+            cursor.execute(
+                "UPDATE api_keys SET is_active = FALSE WHERE id = %s AND user_id = %s RETURNING api_key",
+                (key_id, user_id),
+            )
+            revoked = cursor.fetchone()
+            if revoked:
+                cache_key = self._invalidate_principal(cursor, self._principal_cache_key("api_key", revoked[0]))
             conn.commit()
 
-            if cursor.rowcount > 0:
+            if revoked:
+                self.principal_cache.delete(cache_key)
                 logger.info(f"Revoked API key {key_id} for user {user_id}")
                 return True, "API key revoked successfully"
             return False, "API key not found or unauthorized"
@@ -402,18 +461,71 @@ class AuthManager:
             if conn:
                 self._put_connection(conn)
 
-    def list_all_api_keys_admin(self) -> List[Dict]:
+    def set_api_key_webhook(self, key_id: int, user_id: int, webhook_url: Optional[str]) -> bool:
+        """Set or clear (None) the default callback URL for downloads made with one of the user's keys."""
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE api_keys SET webhook_url = %s WHERE id = %s AND user_id = %s RETURNING api_key",
+                (webhook_url, key_id, user_id),
+            )
+            updated = cursor.fetchone()
+            if updated:
+                # The cached principal carries the old URL
+                cache_key = self._invalidate_principal(cursor, self._principal_cache_key("api_key", updated[0]))
+            conn.commit()
+            if updated:
+                self.principal_cache.delete(cache_key)
+            return updated is not None
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self._put_connection(conn)
+
+    def revoke_api_key_admin(self, key_id: int) -> bool:
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute("UPDATE api_keys SET is_active = FALSE WHERE id = %s RETURNING api_key", (key_id,))
+            revoked = cursor.fetchone()
+            if revoked:
+                cache_key = self._invalidate_principal(cursor, self._principal_cache_key("api_key", revoked[0]))
+            conn.commit()
+            if revoked:
+                self.principal_cache.delete(cache_key)
+            return revoked is not None
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                self._put_connection(conn)
+
+    def list_all_api_keys_admin(
+        self, limit: int = DEFAULT_PAGE_SIZE, after: Optional[Tuple] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute(
-                """SELECT k.*, u.username 
+                """SELECT k.id, k.api_key, k.description, k.created_at, k.expires_at, k.is_active, u.username
                    FROM api_keys k 
                    JOIN users u ON k.user_id = u.id
-                   ORDER BY k.created_at DESC"""
+                   WHERE (%s::timestamp IS NULL OR (k.created_at, k.id) < (%s::timestamp, %s::integer))
+                   ORDER BY k.created_at DESC, k.id DESC
+                   LIMIT %s""",
+                (*_keyset_params(after), limit + 1),
             )
             keys = cursor.fetchall()
+            next_cursor = _next_cursor(keys, limit)
 
             result = []
             for key in keys:
@@ -432,10 +544,10 @@ class AuthManager:
                     }
                 )
 
-            return result
+            return result, next_cursor
         except Exception as e:
             logger.error(f"Error listing all API keys: {e}")
-            return []
+            return [], None
         finally:
             if conn:
                 self._put_connection(conn)
@@ -457,3 +569,16 @@ class AuthManager:
         finally:
             if conn:
                 self._put_connection(conn)
+
+
+def _keyset_params(after: Optional[Tuple]) -> Tuple:
+    created_at, row_id = after if after else (None, None)
+    return created_at, created_at, row_id
+
+
+def _next_cursor(rows: List, limit: int) -> Optional[str]:
+    """Trim the look-ahead row fetched past `limit` and return the cursor for the next page, if any."""
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    return encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
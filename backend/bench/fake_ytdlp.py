@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Stand-in for the yt-dlp executable, used by the benchmark harness.
+
+Understands the subset of the command line the API uses (--dump-json, -F, and downloads with
+-f/-o, including -x for audio) and prints output shaped like yt-dlp's. URLs pointing at the bench media server are
+fetched over HTTP; any other URL produces a file of FAKE_YTDLP_SIZE zero bytes.
+
+Environment:
+    FAKE_YTDLP_LATENCY       seconds of simulated extraction per invocation (default 0.05)
+    FAKE_YTDLP_MERGE_LATENCY seconds of simulated merging per download (default 0.02)
+    FAKE_YTDLP_SIZE          bytes written for non-fixture URLs (default 1048576)
+    FAKE_YTDLP_FAILURE_RATE  fraction of invocations that fail (default 0)
+    FAKE_YTDLP_SEED          seed for the failure draw, for repeatable runs
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import urllib.request
+
+CHUNK_SIZE = 256 * 1024
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+def video_id(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:11]
+
+
+def remote_size(url: str) -> int:
+    request = urllib.request.Request(url, method="HEAD")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return int(response.headers.get("Content-Length", 0))
+
+
+def is_fixture(url: str) -> bool:
+    return url.startswith(("http://127.0.0.1", "http://localhost"))
+
+
+def dump_json(url: str, format_selector: str):
+    size = remote_size(url) if is_fixture(url) else int(env_float("FAKE_YTDLP_SIZE", 1024 * 1024))
+    info = {
+        "id": video_id(url),
+        "title": f"Benchmark fixture {video_id(url)}",
+        "extractor": "generic",
+        "extractor_key": "Generic",
+        "format_id": "fixture" if format_selector else "best",
+        "ext": "mp4",
+        "filesize": size,
+        "duration": 10,
+        "webpage_url": url,
+    }
+    print(json.dumps(info))
+
+
+def list_formats(url: str):
+    print(f"[info] Available formats for {video_id(url)}:")
+    print("ID  EXT  RESOLUTION FPS |   FILESIZE  TBR PROTO | VCODEC  ACODEC")
+    print("-" * 68)
+    print("140 m4a  audio only      |   1.00MiB  128k https | audio only mp4a.40.2")
+    print("18  mp4  640x360     30  |   3.00MiB  500k https | avc1.42001E mp4a.40.2")
+    print("137 mp4  1920x1080   30  |  20.00MiB 4000k https | avc1.640028 video only")
+
+
+def download(url: str, template: str, extract_audio: bool = False, audio_format: str = "m4a"):
+    path = template.replace("%(ext)s", audio_format if extract_audio else "mp4")
+    print(f"[download] Destination: {path}", flush=True)
+
+    written = 0
+    with open(path, "wb") as f:
+        if is_fixture(url):
+            with urllib.request.urlopen(url, timeout=60) as response:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+        else:
+            remaining = int(env_float("FAKE_YTDLP_SIZE", 1024 * 1024))
+            while remaining > 0:
+                chunk = b"\0" * min(CHUNK_SIZE, remaining)
+                f.write(chunk)
+                remaining -= len(chunk)
+                written += len(chunk)
+
+    print(f"[download] 100% of {written / 1024 / 1024:.2f}MiB", flush=True)
+    if extract_audio:
+        print(f'[ExtractAudio] Destination: "{path}"', flush=True)
+    else:
+        print(f'[Merger] Merging formats into "{path}"', flush=True)
+    time.sleep(env_float("FAKE_YTDLP_MERGE_LATENCY", 0.02))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--dump-json", action="store_true")
+    parser.add_argument("-F", "--list-formats", action="store_true")
+    parser.add_argument("-f", "--format", default="")
+    parser.add_argument("-o", "--output", default="%(id)s.%(ext)s")
+    parser.add_argument("--no-playlist", action="store_true")
+    parser.add_argument("--newline", action="store_true")
+    parser.add_argument("--merge-output-format")
+    parser.add_argument("--postprocessor-args")
+    parser.add_argument("-x", "--extract-audio", action="store_true")
+    parser.add_argument("--audio-format", default="m4a")
+    parser.add_argument("--audio-quality")
+    parser.add_argument("--remux-video")
+    parser.add_argument("url")
+    args = parser.parse_args(argv)
+
+    if "FAKE_YTDLP_SEED" in os.environ:
+        random.seed(f"{os.environ['FAKE_YTDLP_SEED']}:{args.url}:{os.getpid()}")
+
+    time.sleep(env_float("FAKE_YTDLP_LATENCY", 0.05))
+    # --dump-json output must be the JSON document alone
+    if not args.dump_json:
+        print(f"[generic] {video_id(args.url)}: Extracting information", flush=True)
+
+    if random.random() < env_float("FAKE_YTDLP_FAILURE_RATE", 0):
+        print(f"ERROR: [generic] {video_id(args.url)}: Simulated failure", file=sys.stderr)
+        return 1
+
+    if args.dump_json:
+        dump_json(args.url, args.format)
+    elif args.list_formats:
+        list_formats(args.url)
+    else:
+        download(args.url, args.output, args.extract_audio, args.audio_format)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
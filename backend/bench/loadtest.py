@@ -0,0 +1,123 @@
+"""Simple HTTP load generator for comparing serving modes.
+
+Sends a fixed number of GET requests from a pool of threads and reports throughput and latency
+percentiles. Only uses the standard library so it can run from any machine.
+
+    python bench/loadtest.py http://localhost:5000/health -n 5000 -c 50
+    python bench/loadtest.py http://localhost:5000/list-files -H "X-API-Key: ..." --json
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Union
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run(
+    url: Union[str, Sequence[str]],
+    requests: int,
+    concurrency: int,
+    headers: Dict[str, str],
+    timeout: float,
+    method: str = "GET",
+    body: Optional[dict] = None,
+) -> Dict:
+    """Send `requests` requests from `concurrency` threads. A list of URLs is used round-robin."""
+    urls = [url] if isinstance(url, str) else list(url)
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    if data is not None:
+        headers = {**headers, "Content-Type": "application/json"}
+
+    latencies = []
+    statuses = Counter()
+    received = [0]
+    lock = threading.Lock()
+
+    def fetch(index):
+        request = urllib.request.Request(urls[index % len(urls)], data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        size = 0
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                size = len(response.read())
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] += 1
+            received[0] += size
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fetch, range(requests)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "url": urls[0] if len(urls) == 1 else f"{urls[0]} (+{len(urls) - 1} more)",
+        "method": method,
+        "requests": requests,
+        "concurrency": concurrency,
+        "duration_seconds": round(duration, 3),
+        "requests_per_second": round(requests / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "statuses": dict(statuses),
+        "bytes_received": received[0],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure throughput and latency of an HTTP endpoint")
+    parser.add_argument("url")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("-H", "--header", action="append", default=[], help="Extra header, e.g. 'X-API-Key: ...'")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    headers = {}
+    for header in args.header:
+        name, _, value = header.partition(":")
+        headers[name.strip()] = value.strip()
+
+    result = run(args.url, args.requests, args.concurrency, headers, args.timeout)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        latency = result["latency_ms"]
+        print(f"{result['requests']} requests, concurrency {result['concurrency']}: {result['duration_seconds']}s")
+        print(f"  throughput: {result['requests_per_second']} req/s")
+        print(
+            f"  latency:    p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  max {latency['max']}ms"
+        )
+        print(f"  statuses:   {result['statuses']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
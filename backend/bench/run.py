@@ -0,0 +1,454 @@
+"""Offline end-to-end benchmark of the API.
+
+Starts everything the API needs on this machine and load-tests it:
+- a throwaway PostgreSQL cluster (initdb/pg_ctl on PATH), unless --dsn points at an existing database
+- a local HTTP server serving generated media fixtures, with Range support
+- a fake yt-dlp (bench/fake_ytdlp.py) placed first on the API's PATH
+- the API itself, under the development server or gunicorn
+
+Each scenario reports throughput, latency percentiles, status codes and the peak RSS of the
+server's process tree. Results are written as JSON (with the git commit) so runs can be compared:
+
+    python bench/run.py --output bench-results.json
+    python bench/run.py --server dev --requests 500 --scenarios list_files,files_range
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import secrets
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import loadtest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+FIXTURES = {"small.mp4": 256 * 1024, "medium.mp4": 4 * 1024 * 1024, "large.mp4": 32 * 1024 * 1024}
+SCENARIOS = [
+    "auth_login",
+    "auth_verify",
+    "download",
+    "formats",
+    "list_files",
+    "files_full",
+    "files_range",
+]
+ADMIN_USERNAME = "bench-admin"
+BENCH_USERNAME = "bench-user"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler that also answers single-range requests, like a media CDN."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        range_header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not range_header or not range_header.startswith("bytes=") or not os.path.isfile(path):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start, _, end = range_header[len("bytes=") :].partition("-")
+        start = int(start) if start else 0
+        end = min(int(end), size - 1) if end else size - 1
+        if start > end:
+            self.send_error(416)
+            return None
+
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, "_remaining", None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+def start_media_server(root: str) -> ThreadingHTTPServer:
+    os.makedirs(root, exist_ok=True)
+    for name, size in FIXTURES.items():
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(os.urandom(size))
+
+    handler = lambda *args, **kwargs: RangeRequestHandler(*args, directory=root, **kwargs)  # noqa: E731
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ThrowawayPostgres:
+    def __init__(self, workdir: str):
+        self.datadir = os.path.join(workdir, "pgdata")
+        self.port = free_port()
+
+    def start(self) -> Dict[str, str]:
+        for tool in ("initdb", "pg_ctl"):
+            if not shutil.which(tool):
+                raise RuntimeError(f"{tool} not found on PATH; install PostgreSQL or pass --dsn")
+
+        subprocess.run(
+            ["initdb", "-D", self.datadir, "-U", "bench", "--auth=trust", "-E", "UTF8"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        subprocess.run(
+            [
+                "pg_ctl",
+                "-D",
+                self.datadir,
+                "-w",
+                "-l",
+                os.path.join(self.datadir, "server.log"),
+                "-o",
+                f"-p {self.port} -k {self.datadir} -c listen_addresses=127.0.0.1 -c fsync=off",
+                "start",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return {
+            "DB_HOST": "127.0.0.1",
+            "DB_PORT": str(self.port),
+            "DB_NAME": "postgres",
+            "DB_USER": "bench",
+            "DB_PASSWORD": "bench",
+        }
+
+    def stop(self):
+        subprocess.run(["pg_ctl", "-D", self.datadir, "-m", "fast", "stop"], stdout=subprocess.DEVNULL)
+
+
+def dsn_env(dsn: str) -> Dict[str, str]:
+    parsed = urllib.parse.urlparse(dsn)
+    return {
+        "DB_HOST": parsed.hostname or "localhost",
+        "DB_PORT": str(parsed.port or 5432),
+        "DB_NAME": parsed.path.lstrip("/") or "postgres",
+        "DB_USER": urllib.parse.unquote(parsed.username or ""),
+        "DB_PASSWORD": urllib.parse.unquote(parsed.password or ""),
+    }
+
+
+def fake_ytdlp_dir(workdir: str) -> str:
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    shim = os.path.join(bin_dir, "yt-dlp")
+    with open(shim, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(BENCH_DIR, "fake_ytdlp.py")}" "$@"\n')
+    os.chmod(shim, 0o755)
+    return bin_dir
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident set size of `pid` and all its descendants, in bytes (Linux /proc)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        stack.extend(children.get(current, []))
+    return total
+
+
+class RssSampler:
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = process_tree_rss(self.pid)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+
+
+def call(base_url: str, method: str, path: str, headers: Optional[dict] = None, body: Optional[dict] = None) -> dict:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(
+        base_url + path, data=data, method=method, headers={"Content-Type": "application/json", **(headers or {})}
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def wait_for_health(base_url: str, server: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"API server exited with code {server.returncode} during startup")
+        try:
+            with urllib.request.urlopen(base_url + "/health", timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError("API server did not become healthy in time")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenarios(args, base_url: str, media_url: str, server_pid: int, admin_password: str) -> Dict:
+    admin_session = call(base_url, "POST", "/auth/login", body={"username": ADMIN_USERNAME, "password": admin_password})
+    admin_headers = {"X-Session-Token": admin_session["session_token"]}
+
+    user_password = secrets.token_urlsafe(16)
+    call(
+        base_url,
+        "POST",
+        "/admin/users/create",
+        admin_headers,
+        {"username": BENCH_USERNAME, "password": user_password, "role": "user"},
+    )
+    api_key = call(base_url, "POST", "/admin/api-keys/create", admin_headers, {"username": BENCH_USERNAME})["api_key"]
+    user_session = call(base_url, "POST", "/auth/login", body={"username": BENCH_USERNAME, "password": user_password})
+    key_headers = {"X-API-Key": api_key}
+
+    # Seed the library so file scenarios have something to serve. Downloads use the "original" mode:
+    # video mode encodes with ffmpeg after downloading, and the harness has no stand-in for it
+    for index in range(args.seed_files):
+        fixture = list(FIXTURES)[index % len(FIXTURES)]
+        call(
+            base_url,
+            "POST",
+            "/download",
+            key_headers,
+            {"url": f"{media_url}/{fixture}?seed={index}", "mode": "original"},
+        )
+    files = call(base_url, "GET", "/list-files?limit=500", key_headers)["files"]
+    file_urls = [f"{base_url}/files/{item['path']}" for item in files] or [f"{base_url}/files/missing"]
+
+    n, c, timeout = args.requests, args.concurrency, args.timeout
+    download_urls = [f"{media_url}/{name}" for name in FIXTURES]
+    scenarios = {
+        "auth_login": lambda: loadtest.run(
+            f"{base_url}/auth/login",
+            n,
+            c,
+            {},
+            timeout,
+            "POST",
+            {"username": BENCH_USERNAME, "password": user_password},
+        ),
+        "auth_verify": lambda: loadtest.run(
+            f"{base_url}/auth/verify", n, c, {"X-Session-Token": user_session["session_token"]}, timeout
+        ),
+        "download": lambda: loadtest.run(
+            f"{base_url}/download",
+            max(1, n // 10),
+            c,
+            key_headers,
+            timeout,
+            "POST",
+            {"url": download_urls[0], "mode": "original"},
+        ),
+        "formats": lambda: loadtest.run(
+            f"{base_url}/formats", n, c, key_headers, timeout, "POST", {"url": download_urls[0]}
+        ),
+        "list_files": lambda: loadtest.run(f"{base_url}/list-files", n, c, key_headers, timeout),
+        "files_full": lambda: loadtest.run(file_urls, n, c, key_headers, timeout),
+        "files_range": lambda: loadtest.run(file_urls, n, c, {**key_headers, "Range": "bytes=0-65535"}, timeout),
+    }
+
+    results = {}
+    for name in args.scenarios:
+        print(f"Running {name}...", file=sys.stderr)
+        with RssSampler(server_pid) as sampler:
+            result = scenarios[name]()
+        result["peak_rss_bytes"] = sampler.peak
+        results[name] = result
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the API")
+    parser.add_argument("--server", choices=["gunicorn", "dev"], default="gunicorn")
+    parser.add_argument("--dsn", help="Use this PostgreSQL database instead of a throwaway cluster (it is modified)")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario (download uses a tenth)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed-files", type=int, default=30)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of scenarios")
+    parser.add_argument("--ytdlp-latency", type=float, default=0.05)
+    parser.add_argument("--ytdlp-failure-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary directory")
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="yt-dlp-api-bench-")
+    postgres = None
+    media_server = None
+    server = None
+    try:
+        if args.dsn:
+            db_env = dsn_env(args.dsn)
+        else:
+            postgres = ThrowawayPostgres(workdir)
+            db_env = postgres.start()
+
+        media_server = start_media_server(os.path.join(workdir, "media"))
+        media_url = f"http://127.0.0.1:{media_server.server_address[1]}"
+
+        port = free_port()
+        admin_password = secrets.token_urlsafe(16)
+        download_dir = os.path.join(workdir, "downloads")
+        os.makedirs(download_dir)
+        env = {
+            **os.environ,
+            **db_env,
+            "PATH": f"{fake_ytdlp_dir(workdir)}{os.pathsep}{os.environ.get('PATH', '')}",
+            "API_SECRET_KEY": secrets.token_urlsafe(32),
+            "ADMIN_USERNAME": ADMIN_USERNAME,
+            "ADMIN_PASSWORD": admin_password,
+            "DOWNLOAD_DIR": download_dir,
+            "HOST": "127.0.0.1",
+            "PORT": str(port),
+            "DEBUG": "False",
+            "RATELIMIT_ENABLED": "False",
+            "QUOTA_REQUESTS_PER_MINUTE": "0",
+            "QUOTA_MAX_CONCURRENT_JOBS": "0",
+            "QUOTA_DAILY_JOBS": "0",
+            "QUOTA_DAILY_DOWNLOAD_BYTES": "0",
+            "QUOTA_DAILY_SERVED_BYTES": "0",
+            "WEB_WORKERS": str(args.workers),
+            "WEB_THREADS": str(args.threads),
+            "PROMETHEUS_MULTIPROC_DIR": os.path.join(workdir, "metrics"),
+            "FAKE_YTDLP_LATENCY": str(args.ytdlp_latency),
+            "FAKE_YTDLP_FAILURE_RATE": str(args.ytdlp_failure_rate),
+        }
+        os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+
+        subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, check=True)
+
+        if args.server == "gunicorn":
+            cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"]
+        else:
+            cmd = [sys.executable, "api.py"]
+        log = open(os.path.join(workdir, "server.log"), "w")
+        server = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for_health(base_url, server)
+
+        started = datetime.now(timezone.utc)
+        scenarios = run_scenarios(args, base_url, media_url, server.pid, admin_password)
+        report = {
+            "commit": git_commit(),
+            "started_at": started.isoformat(),
+            "config": {
+                "server": args.server,
+                "workers": args.workers if args.server == "gunicorn" else 1,
+                "threads": args.threads if args.server == "gunicorn" else None,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "seed_files": args.seed_files,
+                "ytdlp_latency": args.ytdlp_latency,
+                "ytdlp_failure_rate": args.ytdlp_failure_rate,
+                "fixtures": FIXTURES,
+            },
+            "scenarios": scenarios,
+        }
+
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output + "\n")
+            print(f"Wrote {args.output}", file=sys.stderr)
+        else:
+            print(output)
+        return 0
+    finally:
+        if server is not None and server.poll() is None:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if media_server is not None:
+            media_server.shutdown()
+        if postgres is not None:
+            postgres.stop()
+        if args.keep:
+            print(f"Kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
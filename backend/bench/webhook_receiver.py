@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Local stand-in for a webhook receiver, for trying completion callbacks end to end.
+
+Verifies each delivery's signature against the user's webhook secret and prints it. It can also
+fail the first deliveries or answer slowly, so the dispatcher's retries, backoff and dead-letter
+handling can be watched without an external service. Run the API with WEBHOOK_ALLOW_PRIVATE=True
+so it will call a local address.
+
+    python bench/webhook_receiver.py --secret whsec_... --fail-first 2
+    curl -X POST localhost:5001/download -H "X-API-Key: ..." \\
+         -d '{"url": "...", "callback_url": "http://127.0.0.1:8099/hook"}'
+"""
+
+import sys
+import json
+import hmac
+import time
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+# Deliveries older than this are rejected, as a real receiver should to limit replays
+MAX_SKEW = 300
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    """What a receiver computes to check a delivery; must match webhooks.sign."""
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+class ReceiverState:
+    def __init__(self, secret: str, fail_first: int, status: int, delay: float):
+        self.secret = secret
+        self.fail_first = fail_first
+        self.status = status
+        self.delay = delay
+        self.received = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state: ReceiverState):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with state.lock:
+                state.received += 1
+                attempt = state.received
+
+            timestamp = self.headers.get("X-Webhook-Timestamp", "")
+            problem = None
+            if state.secret:
+                expected = sign(state.secret, int(timestamp) if timestamp.isdigit() else 0, body)
+                if not hmac.compare_digest(expected, self.headers.get(SIGNATURE_HEADER, "")):
+                    problem = "bad signature"
+                elif abs(time.time() - int(timestamp)) > MAX_SKEW:
+                    problem = "stale timestamp"
+
+            if state.delay:
+                time.sleep(state.delay)
+
+            if problem:
+                status = 401
+            elif attempt <= state.fail_first:
+                status = state.status
+                problem = f"failing on purpose ({attempt}/{state.fail_first})"
+            else:
+                status = 204
+
+            try:
+                event = json.loads(body)
+            except ValueError:
+                event = {"raw": body.decode("utf-8", "replace")}
+            print(
+                json.dumps(
+                    {
+                        "attempt": attempt,
+                        "status": status,
+                        "problem": problem,
+                        "webhook_id": self.headers.get("X-Webhook-Id"),
+                        "event": self.headers.get("X-Webhook-Event"),
+                        "body": event,
+                    },
+                    indent=2,
+                ),
+                flush=True,
+            )
+
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local webhook receiver that checks signatures")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--secret", default="", help="webhook secret from GET /user/webhook-secret")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer this many deliveries with --status")
+    parser.add_argument("--status", type=int, default=503, help="status code for failed deliveries")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args(argv)
+
+    state = ReceiverState(args.secret, args.fail_first, args.status, args.delay)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Listening on http://{args.host}:{args.port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import os
+import time
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger("yt-dlp-api.blobs")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+BLOB_DIR_NAME = ".blobs"
+
+
+def sha256_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Content-addressed storage that collapses byte-identical downloads into one physical file.
+
+    Every hashed file is hardlinked from DOWNLOAD_DIR/.blobs/<ab>/<sha256>. When a new download
+    hashes to an existing blob, its own file is replaced by another link to that blob, so each
+    downloaded_files row keeps its path and deleting a file only drops one link. A blob whose link
+    count falls to 1 is referenced by no file any more and is removed by `collect_garbage`.
+    """
+
+    def __init__(self, auth_manager, download_dir: str, enabled: bool = True, gc_grace: int = 3600):
+        self.auth_manager = auth_manager
+        self.download_dir = download_dir
+        self.blob_dir = os.path.join(download_dir, BLOB_DIR_NAME)
+        self.enabled = enabled
+        self.gc_grace = gc_grace
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def ingest(self, path: str) -> Tuple[str, bool]:
+        """Hash `path` and link it into the store. Returns (sha256, whether it duplicated an existing blob).
+
+        Linking failures leave the file as it is; the hash is still returned.
+        """
+        sha256 = sha256_file(path)
+        if not self.enabled:
+            return sha256, False
+
+        blob_path = self.blob_path(sha256)
+        size = os.path.getsize(path)
+        try:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # Two attempts: garbage collection may remove the existing blob between the checks
+            for _ in range(2):
+                try:
+                    os.link(path, blob_path)
+                    return sha256, False
+                except FileExistsError:
+                    pass
+
+                if os.path.getsize(blob_path) != size:
+                    logger.error(f"Blob {sha256} size differs from {path}; leaving the file unlinked")
+                    return sha256, False
+
+                temp_path = f"{path}.link"
+                try:
+                    os.link(blob_path, temp_path)
+                except FileNotFoundError:
+                    continue
+                # Atomic, so readers see either copy of the same bytes
+                os.replace(temp_path, path)
+                return sha256, True
+        except OSError as e:
+            logger.warning(f"Cannot link {path} into the blob store: {e}")
+        return sha256, False
+
+    def register(self, cursor, sha256: str, size: int):
+        """Record the blob in file_blobs, using the caller's transaction."""
+        if self.enabled:
+            cursor.execute(
+                "INSERT INTO file_blobs (sha256, size) VALUES (%s, %s) ON CONFLICT (sha256) DO NOTHING",
+                (sha256, size),
+            )
+
+    def backfill(self, batch_size: int = 100) -> int:
+        """Hash and link up to `batch_size` files stored before hashing was introduced.
+
+        Files that can't be hashed are stamped and retried only after every other file, so a pile of
+        missing files never stops the backfill from moving on.
+        """
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT id, file_path FROM downloaded_files WHERE content_sha256 IS NULL
+                   ORDER BY hash_attempted_at NULLS FIRST, created_at LIMIT %s""",
+                (batch_size,),
+            )
+            rows = cursor.fetchall()
+            conn.commit()
+
+        hashed = 0
+        failed = []
+        for file_id, file_path in rows:
+            try:
+                sha256, _ = self.ingest(file_path)
+                size = os.path.getsize(file_path)
+            except FileNotFoundError:
+                # Missing files are the reconciler's business
+                failed.append(file_id)
+                continue
+            except OSError as e:
+                logger.warning(f"Cannot hash {file_path}: {e}")
+                failed.append(file_id)
+                continue
+
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                self.register(cursor, sha256, size)
+                cursor.execute("UPDATE downloaded_files SET content_sha256 = %s WHERE id = %s", (sha256, file_id))
+                conn.commit()
+            hashed += 1
+
+        if failed:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE downloaded_files SET hash_attempted_at = %s WHERE id = ANY(%s::uuid[])",
+                    (datetime.utcnow(), [str(file_id) for file_id in failed]),
+                )
+                conn.commit()
+        if hashed:
+            logger.info(f"Hashed {hashed} existing file(s)")
+        return hashed
+
+    def collect_garbage(self) -> int:
+        """Remove blobs no downloaded file links to any more. Returns the number removed."""
+        if not os.path.isdir(self.blob_dir):
+            return 0
+
+        cutoff = time.time() - self.gc_grace
+        removed: List[str] = []
+        for shard in os.scandir(self.blob_dir):
+            if not shard.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                    # ctime moves whenever a link is added or dropped, so a blob that just lost
+                    # or gained a file is left for the next run
+                    if stat.st_nlink == 1 and stat.st_ctime < cutoff:
+                        os.remove(entry.path)
+                        removed.append(entry.name)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logger.warning(f"Cannot collect blob {entry.path}: {e}")
+
+        if removed:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM file_blobs WHERE sha256 = ANY(%s)", (removed,))
+                conn.commit()
+            logger.info(f"Removed {len(removed)} unreferenced blob(s)")
+        return len(removed)
+
+    def stats(self) -> Dict:
+        """Logical bytes of hashed files against the physical bytes of their blobs."""
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(
+                """SELECT COUNT(*) AS blobs,
+                          COALESCE(SUM(b.size), 0) AS physical_bytes,
+                          COALESCE(SUM(r.refs), 0) AS linked_files,
+                          COALESCE(SUM(r.refs * b.size), 0) AS logical_bytes,
+                          COUNT(*) FILTER (WHERE r.refs > 1) AS shared_blobs
+                   FROM file_blobs b
+                   JOIN (SELECT content_sha256, COUNT(*) AS refs
+                         FROM downloaded_files WHERE content_sha256 IS NOT NULL
+                         GROUP BY content_sha256) r ON r.content_sha256 = b.sha256"""
+            )
+            row = dict(cursor.fetchone())
+            cursor.execute(
+                """SELECT COUNT(*) FILTER (WHERE hash_attempted_at IS NULL) AS unhashed,
+                          COUNT(*) FILTER (WHERE hash_attempted_at IS NOT NULL) AS unhashable
+                   FROM downloaded_files WHERE content_sha256 IS NULL"""
+            )
+            counts = cursor.fetchone()
+            row["unhashed_files"] = counts["unhashed"]
+            row["unhashable_files"] = counts["unhashable"]
+
+        row["reclaimed_bytes"] = row["logical_bytes"] - row["physical_bytes"]
+        row["enabled"] = self.enabled
+        return row
@@ -1,6 +1,10 @@
 import os
+import json
 import secrets
 import sys
+from urllib.parse import quote
+
+from transcode import load_profiles
 
 
 class Config:
@@ -15,20 +19,113 @@ class Config:
 
     DB_MIN_CONN = int(os.environ.get("DB_MIN_CONN", 1))
     DB_MAX_CONN = int(os.environ.get("DB_MAX_CONN", 10))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+    DB_HEALTHCHECK_INTERVAL = float(os.environ.get("DB_HEALTHCHECK_INTERVAL", 30))
+
+    SESSION_SWEEP_INTERVAL = int(os.environ.get("SESSION_SWEEP_INTERVAL", 900))
+    SESSION_SWEEP_BATCH = int(os.environ.get("SESSION_SWEEP_BATCH", 1000))
+    SESSION_RETENTION_HOURS = int(os.environ.get("SESSION_RETENTION_HOURS", 24))
+    SESSION_PARTITIONING = os.environ.get("SESSION_PARTITIONING", "False").lower() in ("true", "1", "yes")
+
+    # False switches off the per-route rate limits; meant for benchmarks only
+    RATELIMIT_ENABLED = os.environ.get("RATELIMIT_ENABLED", "True").lower() in ("true", "1", "yes")
+    # Empty means the shared PostgreSQL store; set to memory:// for per-process counters
+    RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", "")
+    RATELIMIT_STRATEGY = os.environ.get("RATELIMIT_STRATEGY", "moving-window")
+    RATELIMIT_POOL_SIZE = int(os.environ.get("RATELIMIT_POOL_SIZE", 5))
+
+    # Number of reverse proxies in front of the API whose X-Forwarded-For can be trusted
+    TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", 0))
+
+    # Per-user quota defaults, overridable per user by admins; 0 means unlimited
+    QUOTA_REQUESTS_PER_MINUTE = int(os.environ.get("QUOTA_REQUESTS_PER_MINUTE", 120))
+    QUOTA_MAX_CONCURRENT_JOBS = int(os.environ.get("QUOTA_MAX_CONCURRENT_JOBS", 2))
+    QUOTA_DAILY_JOBS = int(os.environ.get("QUOTA_DAILY_JOBS", 200))
+    QUOTA_DAILY_DOWNLOAD_BYTES = int(os.environ.get("QUOTA_DAILY_DOWNLOAD_BYTES", 10 * 1024**3))
+    QUOTA_DAILY_SERVED_BYTES = int(os.environ.get("QUOTA_DAILY_SERVED_BYTES", 50 * 1024**3))
+    QUOTA_FLUSH_INTERVAL = float(os.environ.get("QUOTA_FLUSH_INTERVAL", 5))
+
+    # Bearer token required to scrape /metrics; while empty the endpoint is switched off
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+    AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 60))
+    AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 10000))
 
     HOST = os.environ.get("HOST", "0.0.0.0")
     PORT = int(os.environ.get("PORT", 5000))
     DEBUG = os.environ.get("DEBUG", "False").lower() in ("true", "1", "yes")
 
+    WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 2))
+    WEB_THREADS = int(os.environ.get("WEB_THREADS", 8))
+
     DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", "/downloads")
     MAX_FILE_SIZE = int(os.environ.get("MAX_FILE_SIZE", 300 * 1024 * 1024))
 
     YTDLP_TIMEOUT = int(os.environ.get("YTDLP_TIMEOUT", 300))
+    # A yt-dlp process that prints nothing for this long is treated as hung (0 disables)
+    YTDLP_IDLE_TIMEOUT = int(os.environ.get("YTDLP_IDLE_TIMEOUT", 120))
+    # Most recent output kept per stream; --dump-json output must fit
+    YTDLP_OUTPUT_LIMIT = int(os.environ.get("YTDLP_OUTPUT_LIMIT", 8 * 1024 * 1024))
+    # JSON object of profile name -> fields, merged over the built-in profiles in transcode.py
+    TRANSCODE_PROFILES = os.environ.get("TRANSCODE_PROFILES", "")
+    TRANSCODE_DEFAULT_PROFILE = os.environ.get("TRANSCODE_DEFAULT_PROFILE", "compat")
+    TRANSCODE_THREADS = int(os.environ.get("TRANSCODE_THREADS", 6))
+    MAX_LADDER_RENDITIONS = int(os.environ.get("MAX_LADDER_RENDITIONS", 4))
+    # How long a stopping worker waits for in-flight requests; long enough for a download to finish
+    GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", YTDLP_TIMEOUT + 30))
+
+    # Free space downloads never claim, and how much a probed size is scaled by for streams + merged output
+    DISK_RESERVATION_MARGIN = int(os.environ.get("DISK_RESERVATION_MARGIN", 1024 * 1024 * 1024))
+    DISK_RESERVATION_FACTOR = float(os.environ.get("DISK_RESERVATION_FACTOR", 2.0))
+    # How long a download waits for disk space before giving up, and how many may wait at once per
+    # worker; each waiter holds a request thread, so the default leaves most threads for other requests
+    DISK_RESERVATION_WAIT = int(os.environ.get("DISK_RESERVATION_WAIT", 300))
+    DISK_RESERVATION_MAX_WAITERS = int(os.environ.get("DISK_RESERVATION_MAX_WAITERS", max(1, WEB_THREADS // 4)))
+
+    # How long a completed download's response is replayed for retries with the same Idempotency-Key,
+    # and how long a retry waits for the first request to finish
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+    IDEMPOTENCY_WAIT = int(os.environ.get("IDEMPOTENCY_WAIT", YTDLP_TIMEOUT))
+    # Retries per worker that may wait at once; each holds a request thread, so later ones get 409
+    IDEMPOTENCY_MAX_WAITERS = int(os.environ.get("IDEMPOTENCY_MAX_WAITERS", max(1, WEB_THREADS // 4)))
+
+    # Completion webhooks: per-attempt timeout, attempts before dead-lettering, and retry backoff
+    WEBHOOK_TIMEOUT = float(os.environ.get("WEBHOOK_TIMEOUT", 10))
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", 8))
+    WEBHOOK_BACKOFF_BASE = float(os.environ.get("WEBHOOK_BACKOFF_BASE", 10))
+    WEBHOOK_BACKOFF_MAX = float(os.environ.get("WEBHOOK_BACKOFF_MAX", 3600))
+    WEBHOOK_POLL_INTERVAL = float(os.environ.get("WEBHOOK_POLL_INTERVAL", 2))
+    # Lets callbacks reach loopback and private addresses (local receivers in development)
+    WEBHOOK_ALLOW_PRIVATE = os.environ.get("WEBHOOK_ALLOW_PRIVATE", "False").lower() in ("true", "1", "yes")
+
+    # Hardlink byte-identical downloads to one blob (needs a filesystem with hard links)
+    DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "True").lower() in ("true", "1", "yes")
+    BLOB_GC_INTERVAL = int(os.environ.get("BLOB_GC_INTERVAL", 3600))
+
+    STORAGE_RECONCILE_INTERVAL = int(os.environ.get("STORAGE_RECONCILE_INTERVAL", 3600))
+
+    RECONCILE_INTERVAL = int(os.environ.get("RECONCILE_INTERVAL", 6 * 3600))
+    RECONCILE_AUTO_REPAIR = os.environ.get("RECONCILE_AUTO_REPAIR", "False").lower() in ("true", "1", "yes")
+    RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", 500))
+    RECONCILE_BATCH_PAUSE = float(os.environ.get("RECONCILE_BATCH_PAUSE", 0.1))
+    RECONCILE_ORPHAN_GRACE = int(os.environ.get("RECONCILE_ORPHAN_GRACE", 3600))
 
     @classmethod
     def get_database_url(cls):
         return f"postgresql://{cls.DB_USER}:{cls.DB_PASSWORD}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_NAME}"
 
+    @classmethod
+    def get_ratelimit_storage_uri(cls):
+        if cls.RATELIMIT_STORAGE_URI:
+            return cls.RATELIMIT_STORAGE_URI
+        user = quote(cls.DB_USER, safe="")
+        password = quote(cls.DB_PASSWORD, safe="")
+        return f"postgresql+ratelimit://{user}:{password}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_NAME}"
+
+    @classmethod
+    def get_transcode_profiles(cls):
+        return load_profiles(json.loads(cls.TRANSCODE_PROFILES) if cls.TRANSCODE_PROFILES else None)
+
     @classmethod
     def validate(cls):
         errors = []
@@ -55,6 +152,22 @@ class Config:
         if not cls.DB_PASSWORD:
             errors.append("DB_PASSWORD must be set")
 
+        if cls.RATELIMIT_STRATEGY not in ("fixed-window", "moving-window"):
+            errors.append(f"RATELIMIT_STRATEGY must be fixed-window or moving-window, got {cls.RATELIMIT_STRATEGY}")
+
+        try:
+            profiles = cls.get_transcode_profiles()
+            if cls.TRANSCODE_DEFAULT_PROFILE not in profiles:
+                errors.append(f"TRANSCODE_DEFAULT_PROFILE {cls.TRANSCODE_DEFAULT_PROFILE} is not a defined profile")
+        except (ValueError, TypeError) as e:
+            errors.append(f"TRANSCODE_PROFILES is invalid: {e}")
+
+        if cls.WEBHOOK_MAX_ATTEMPTS < 1:
+            errors.append(f"WEBHOOK_MAX_ATTEMPTS must be at least 1, got {cls.WEBHOOK_MAX_ATTEMPTS}")
+
+        if cls.DISK_RESERVATION_FACTOR < 1:
+            errors.append(f"DISK_RESERVATION_FACTOR must be at least 1, got {cls.DISK_RESERVATION_FACTOR}")
+
         if errors:
             print("Configuration errors:", file=sys.stderr)
             for error in errors:
@@ -67,14 +180,52 @@ class Config:
         print(f"  HOST: {cls.HOST}")
         print(f"  PORT: {cls.PORT}")
         print(f"  DEBUG: {cls.DEBUG}")
+        print(f"  WEB_WORKERS: {cls.WEB_WORKERS} x {cls.WEB_THREADS} threads")
+        print(f"  GRACEFUL_TIMEOUT: {cls.GRACEFUL_TIMEOUT}s")
         print(f"  DOWNLOAD_DIR: {cls.DOWNLOAD_DIR}")
         print(f"  MAX_FILE_SIZE: {cls.MAX_FILE_SIZE // 1024 // 1024}MB")
-        print(f"  YTDLP_TIMEOUT: {cls.YTDLP_TIMEOUT}s")
+        print(f"  YTDLP_TIMEOUT: {cls.YTDLP_TIMEOUT}s (idle {cls.YTDLP_IDLE_TIMEOUT}s)")
+        print(
+            f"  TRANSCODE: default profile {cls.TRANSCODE_DEFAULT_PROFILE}, {cls.TRANSCODE_THREADS} threads, "
+            f"up to {cls.MAX_LADDER_RENDITIONS} renditions"
+        )
+        print(f"  YTDLP_OUTPUT_LIMIT: {cls.YTDLP_OUTPUT_LIMIT // 1024}KB")
+        print(
+            f"  DISK_RESERVATION: {cls.DISK_RESERVATION_MARGIN // 1024 // 1024}MB margin, "
+            f"x{cls.DISK_RESERVATION_FACTOR} estimate, {cls.DISK_RESERVATION_WAIT}s wait "
+            f"({cls.DISK_RESERVATION_MAX_WAITERS} waiters per worker)"
+        )
+        print(
+            f"  IDEMPOTENCY: keys kept {cls.IDEMPOTENCY_KEY_TTL}s, retries wait {cls.IDEMPOTENCY_WAIT}s "
+            f"({cls.IDEMPOTENCY_MAX_WAITERS} waiters per worker)"
+        )
+        print(
+            f"  WEBHOOKS: {cls.WEBHOOK_MAX_ATTEMPTS} attempts, {cls.WEBHOOK_TIMEOUT}s timeout, "
+            f"backoff {cls.WEBHOOK_BACKOFF_BASE}-{cls.WEBHOOK_BACKOFF_MAX}s, private addresses "
+            f"{'allowed' if cls.WEBHOOK_ALLOW_PRIVATE else 'blocked'}"
+        )
+        print(f"  DEDUP_ENABLED: {cls.DEDUP_ENABLED} (blob GC every {cls.BLOB_GC_INTERVAL}s)")
+        print(f"  STORAGE_RECONCILE_INTERVAL: {cls.STORAGE_RECONCILE_INTERVAL}s")
+        print(f"  RECONCILE_INTERVAL: {cls.RECONCILE_INTERVAL}s")
+        print(f"  RECONCILE_AUTO_REPAIR: {cls.RECONCILE_AUTO_REPAIR}")
+        print(f"  RATELIMIT_ENABLED: {cls.RATELIMIT_ENABLED}")
+        print(f"  RATELIMIT_STORAGE: {cls.RATELIMIT_STORAGE_URI.split(':', 1)[0] or 'postgresql'}")
+        print(f"  RATELIMIT_STRATEGY: {cls.RATELIMIT_STRATEGY}")
+        print(f"  TRUSTED_PROXY_COUNT: {cls.TRUSTED_PROXY_COUNT}")
+        print(
+            f"  QUOTAS: {cls.QUOTA_REQUESTS_PER_MINUTE}/min, {cls.QUOTA_MAX_CONCURRENT_JOBS} concurrent, "
+            f"{cls.QUOTA_DAILY_JOBS} jobs/day, {cls.QUOTA_DAILY_DOWNLOAD_BYTES // 1024 // 1024}MB downloaded/day, "
+            f"{cls.QUOTA_DAILY_SERVED_BYTES // 1024 // 1024}MB served/day"
+        )
+        print(f"  AUTH_CACHE_TTL: {cls.AUTH_CACHE_TTL}s")
+        print(f"  SESSION_SWEEP_INTERVAL: {cls.SESSION_SWEEP_INTERVAL}s")
+        print(f"  SESSION_PARTITIONING: {cls.SESSION_PARTITIONING}")
         print(f"  API_SECRET_KEY: {'*' * 8} (hidden)")
         print(f"  DB_HOST: {cls.DB_HOST}")
         print(f"  DB_PORT: {cls.DB_PORT}")
         print(f"  DB_NAME: {cls.DB_NAME}")
         print(f"  DB_USER: {cls.DB_USER}")
+        print(f"  DB_POOL: {cls.DB_MIN_CONN}-{cls.DB_MAX_CONN} connections, {cls.DB_POOL_TIMEOUT}s checkout timeout")
         print(f"  DB_PASSWORD: {'*' * 8} (hidden)")
 
 
@@ -91,3 +242,6 @@ DB_PORT = Config.DB_PORT
 DB_NAME = Config.DB_NAME
 DB_USER = Config.DB_USER
 DB_PASSWORD = Config.DB_PASSWORD
+STORAGE_RECONCILE_INTERVAL = Config.STORAGE_RECONCILE_INTERVAL
+RECONCILE_INTERVAL = Config.RECONCILE_INTERVAL
+RECONCILE_AUTO_REPAIR = Config.RECONCILE_AUTO_REPAIR
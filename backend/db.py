@@ -0,0 +1,261 @@
+import time
+import zlib
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger("yt-dlp-api.db")
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe PostgreSQL connection pool with blocking checkout and health checks on borrow.
+
+    Connections idle for longer than `healthcheck_interval` seconds are probed with SELECT 1
+    before being handed out, so a database restart doesn't leave dead connections in the pool.
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        timeout: float = 30.0,
+        healthcheck_interval: float = 30.0,
+        autocommit: bool = False,
+        on_checkout: Optional[Callable[[float], None]] = None,
+        **connect_kwargs,
+    ):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.autocommit = autocommit
+        # Called with the seconds each checkout waited, e.g. to feed a metrics histogram
+        self.on_checkout = on_checkout
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        conn.autocommit = self.autocommit
+        return conn
+
+    def getconn(self, timeout: Optional[float] = None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn = None
+            last_used = None
+            create = False
+
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        create = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"Timed out after {timeout}s waiting for a database connection")
+
+                    self._waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, last_used):
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._in_use += 1
+                self._checkouts += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+            if self.on_checkout is not None:
+                self.on_checkout(waited)
+            return conn
+
+    def putconn(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        with self._cond:
+            self._in_use -= 1
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None and not conn.closed:
+            conn.close()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Borrow a connection for the duration of a with block.
+
+        Uncommitted work is rolled back when the connection is returned, so callers only
+        need to commit writes.
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            raise
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _ in idle:
+            if not conn.closed:
+                conn.close()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "avg_wait_ms": round(self._total_wait / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+            }
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding dead database connection: {e}")
+            return False
+
+    def _discard(self, conn):
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _advisory_key(name: str) -> int:
+    return zlib.crc32(name.encode("utf-8"))
+
+
+@contextmanager
+def try_advisory_lock(pool: ConnectionPool, name: str):
+    """Try to take a session-level advisory lock named `name` without waiting.
+
+    Yields whether the lock was acquired. The connection stays checked out while the lock is held,
+    and the lock is released (or dies with the connection) when the block exits.
+    """
+    key = _advisory_key(name)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+        acquired = cursor.fetchone()[0]
+        conn.commit()
+
+        try:
+            yield acquired
+        finally:
+            if acquired and not conn.closed:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (key,))
+                conn.commit()
+
+
+def advisory_lock_held(pool: ConnectionPool, name: str) -> bool:
+    """Whether any session, in any process, currently holds the advisory lock named `name`."""
+    # A bigint key is stored split across classid (high 32 bits) and objid (low 32 bits)
+    key = _advisory_key(name)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT EXISTS (SELECT 1 FROM pg_locks
+                              WHERE locktype = 'advisory' AND granted
+                              AND classid = %s AND objid = %s AND objsubid = 1)""",
+            (key >> 32, key & 0xFFFFFFFF),
+        )
+        held = cursor.fetchone()[0]
+        conn.commit()
+    return held
@@ -0,0 +1,63 @@
+import os
+import queue
+import threading
+import logging
+from typing import Iterable
+
+logger = logging.getLogger("yt-dlp-api.deletion")
+
+
+class DeletionQueue:
+    """Unlinks files on a background thread so request handlers don't wait on disk I/O.
+
+    Paths still queued when the process exits are left on disk; the file reconciler
+    picks them up later as orphans.
+    """
+
+    def __init__(self, download_dir: str):
+        self.download_dir = os.path.realpath(download_dir)
+        self._queue = queue.Queue()
+        self._thread = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="deletion-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enqueue(self, paths: Iterable[str]) -> int:
+        count = 0
+        for path in paths:
+            self._queue.put(path)
+            count += 1
+        return count
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            self._unlink(path)
+
+    def _unlink(self, path: str):
+        real_path = os.path.realpath(path)
+        if not real_path.startswith(self.download_dir + os.sep):
+            logger.warning(f"Refusing to delete file outside download directory: {path}")
+            return
+
+        try:
+            os.remove(real_path)
+            logger.info(f"Deleted file: {real_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to delete physical file {real_path}: {e}")
@@ -0,0 +1,50 @@
+"""Gunicorn settings for serving the API in production.
+
+Each worker imports wsgi.py itself (no preload), so database pools, the auth cache listener and
+background threads are created per worker after fork. On SIGTERM gunicorn stops accepting
+connections and gives in-flight requests up to GRACEFUL_TIMEOUT seconds to finish.
+"""
+
+import os
+import shutil
+
+from config import Config
+
+# Workers write metrics to files here so /metrics can aggregate all of them. Must be set before
+# the workers import prometheus_client.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-metrics")
+
+bind = f"{Config.HOST}:{Config.PORT}"
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+worker_class = "gthread"
+
+# gthread workers heartbeat from their main loop, so this only catches hung workers, not slow downloads
+timeout = 120
+graceful_timeout = Config.GRACEFUL_TIMEOUT
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = "debug" if Config.DEBUG else "info"
+
+
+def on_starting(server):
+    Config.log_config()
+
+    # Drop metric files left by a previous run so counters start from zero
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    from api import shutdown
+
+    shutdown()
@@ -0,0 +1,166 @@
+import time
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+logger = logging.getLogger("yt-dlp-api.idempotency")
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request body."""
+
+
+class IdempotencyInProgress(Exception):
+    """The first request with this key is still running."""
+
+
+def request_fingerprint(body) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class IdempotencyKeys:
+    """Client-supplied Idempotency-Key handling, shared by all workers through PostgreSQL.
+
+    The first request with a key claims it (status 'pending') and stores its response when it
+    finishes. A retry with the same key and body gets that response back instead of doing the work
+    again; one that arrives while the first is still running waits for it. Each waiter holds a
+    request thread, so at most `max_waiters` per process wait at once and later retries are told to
+    come back straight away. Keys expire `ttl` seconds after completing. A pending claim older than
+    `lock_timeout` belongs to a worker that died and can be taken over.
+    """
+
+    def __init__(
+        self,
+        auth_manager,
+        ttl: int = 86400,
+        wait_timeout: float = 300.0,
+        lock_timeout: int = 1800,
+        poll_interval=0.5,
+        max_waiters: int = 2,
+    ):
+        self.auth_manager = auth_manager
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.max_waiters = max_waiters
+        self._waiters = 0
+        self._waiters_lock = threading.Lock()
+
+    def claim(self, user_id, key: str, fingerprint: str) -> Optional[Tuple[dict, int]]:
+        """Claim `key` for this request. Returns None if the caller should do the work, or the
+        stored (body, status code) of the request that already did.
+
+        Raises IdempotencyConflict if the key belongs to a different request, and
+        IdempotencyInProgress if the first request hasn't finished within `wait_timeout` or too many
+        requests are already waiting in this process.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waiting = False
+        try:
+            while True:
+                claimed, row = self._try_claim(user_id, key, fingerprint)
+                if claimed:
+                    return None
+                if row is not None:
+                    request_hash, status, status_code, response = row
+                    if request_hash != fingerprint:
+                        raise IdempotencyConflict(f"Idempotency-Key {key} was already used for a different request")
+                    if status == "completed":
+                        return response, status_code
+
+                # Still pending (or released between the two statements): wait for the first request
+                if not waiting:
+                    with self._waiters_lock:
+                        if self._waiters >= self.max_waiters:
+                            raise IdempotencyInProgress(f"A request with Idempotency-Key {key} is still in progress")
+                        self._waiters += 1
+                    waiting = True
+                if time.monotonic() >= deadline:
+                    raise IdempotencyInProgress(f"A request with Idempotency-Key {key} is still in progress")
+                time.sleep(self.poll_interval)
+        finally:
+            if waiting:
+                with self._waiters_lock:
+                    self._waiters -= 1
+
+    def _try_claim(self, user_id, key: str, fingerprint: str) -> Tuple[bool, Optional[tuple]]:
+        """One claim attempt. Returns (claimed, existing row if not claimed)."""
+        now = datetime.utcnow()
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            # Takes over keys that expired or whose owner died; a live claim is left alone
+            cursor.execute(
+                """INSERT INTO idempotency_keys (user_id, key, request_hash, status, locked_until, expires_at)
+                   VALUES (%s, %s, %s, 'pending', %s, %s)
+                   ON CONFLICT (user_id, key) DO UPDATE
+                   SET request_hash = EXCLUDED.request_hash, status = 'pending', status_code = NULL,
+                       response = NULL, created_at = %s, locked_until = EXCLUDED.locked_until,
+                       expires_at = EXCLUDED.expires_at
+                   WHERE idempotency_keys.expires_at <= %s
+                      OR (idempotency_keys.status = 'pending' AND idempotency_keys.locked_until <= %s)
+                   RETURNING 1""",
+                (
+                    user_id,
+                    key,
+                    fingerprint,
+                    now + timedelta(seconds=self.lock_timeout),
+                    now + timedelta(seconds=self.lock_timeout + self.ttl),
+                    now,
+                    now,
+                    now,
+                ),
+            )
+            claimed = cursor.fetchone() is not None
+            row = None
+            if not claimed:
+                cursor.execute(
+                    "SELECT request_hash, status, status_code, response FROM idempotency_keys "
+                    "WHERE user_id = %s AND key = %s",
+                    (user_id, key),
+                )
+                row = cursor.fetchone()
+            conn.commit()
+
+        return claimed, row
+
+    def complete(self, user_id, key: str, body: dict, status_code: int):
+        """Store the response for replay until the key expires."""
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE idempotency_keys
+                   SET status = 'completed', status_code = %s, response = %s, expires_at = %s
+                   WHERE user_id = %s AND key = %s""",
+                (status_code, json.dumps(body), datetime.utcnow() + timedelta(seconds=self.ttl), user_id, key),
+            )
+            conn.commit()
+
+    def release(self, user_id, key: str):
+        """Drop a claim whose request failed in a way a retry might not, so the retry runs again."""
+        try:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "DELETE FROM idempotency_keys WHERE user_id = %s AND key = %s AND status = 'pending'",
+                    (user_id, key),
+                )
+                conn.commit()
+        except Exception as e:
+            # The claim is taken over once its lock times out
+            logger.error(f"Failed to release idempotency key {key}: {e}")
+
+    def purge_expired(self) -> int:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM idempotency_keys WHERE expires_at <= %s", (datetime.utcnow(),))
+            removed = cursor.rowcount
+            conn.commit()
+        if removed:
+            logger.info(f"Removed {removed} expired idempotency key(s)")
+        return removed
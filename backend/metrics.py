@@ -0,0 +1,146 @@
+"""Prometheus metrics.
+
+Under gunicorn every worker keeps its own counters. When PROMETHEUS_MULTIPROC_DIR is set (see
+gunicorn.conf.py) they are written to memory-mapped files in that directory and /metrics
+aggregates all workers on each scrape.
+"""
+
+import os
+import shutil
+import logging
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    REGISTRY,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger("yt-dlp-api.metrics")
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Tuned for fast API calls at the low end and multi-minute downloads at the high end
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response, by route and status",
+    ["method", "endpoint", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+SUBPROCESS_DURATION = Histogram(
+    "subprocess_duration_seconds",
+    "Wall time of yt-dlp invocations, by purpose",
+    ["command"],
+    buckets=LATENCY_BUCKETS,
+)
+SUBPROCESS_EXITS = Counter(
+    "subprocess_exits_total",
+    "yt-dlp invocations by purpose and exit code ('timeout' or 'idle_timeout' when killed)",
+    ["command", "exit_code"],
+)
+FFMPEG_DURATION = Histogram(
+    "ffmpeg_duration_seconds",
+    "Wall time of ffmpeg work by step: merge and postprocess run inside yt-dlp, transcode is the ladder",
+    ["step"],
+    buckets=LATENCY_BUCKETS,
+)
+FFMPEG_EXITS = Counter(
+    "ffmpeg_exits_total",
+    "ffmpeg runs by step and exit code ('error' when yt-dlp reports a post-processing failure without one)",
+    ["step", "exit_code"],
+)
+SUBPROCESS_CPU = Counter(
+    "subprocess_cpu_seconds_total",
+    "CPU time of yt-dlp invocations and the processes they started, by purpose and mode",
+    ["command", "mode"],
+)
+SUBPROCESS_MAX_RSS = Histogram(
+    "subprocess_max_rss_bytes",
+    "Peak resident memory of the largest process in each yt-dlp invocation's tree",
+    ["command"],
+    buckets=tuple(mb * 1024 * 1024 for mb in (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)),
+)
+DOWNLOAD_REUSE = Counter(
+    "download_reuse_total",
+    "Downloads answered from a stored copy without running yt-dlp ('own' or 'linked' from another user)",
+    ["scope"],
+)
+IDEMPOTENT_REPLAYS = Counter(
+    "download_idempotent_replays_total",
+    "Downloads answered from the stored response of an earlier request with the same Idempotency-Key",
+)
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_delivery_attempts_total",
+    "Completion webhook send attempts by outcome (delivered, retry, dead_letter)",
+    ["outcome"],
+)
+BYTES_DOWNLOADED = Counter("downloaded_bytes_total", "Bytes of media fetched and stored by downloads")
+BYTES_SERVED = Counter("served_bytes_total", "Bytes of media sent to clients", ["route"])
+RATELIMIT_REJECTIONS = Counter("ratelimit_rejections_total", "Requests rejected by the rate limiter", ["endpoint"])
+QUOTA_REJECTIONS = Counter("quota_rejections_total", "Requests rejected by a per-user quota", ["quota"])
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection", buckets=WAIT_BUCKETS
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Database connections per state, summed over live workers",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+
+_disk_collector = None
+
+
+class DiskUsageCollector:
+    """Reports free and used space on the download volume when scraped."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def collect(self):
+        gauge = GaugeMetricFamily("download_volume_bytes", "Download volume space", labels=["state"])
+        try:
+            usage = shutil.disk_usage(self.path)
+        except OSError as e:
+            logger.warning(f"Cannot read disk usage of {self.path}: {e}")
+            return
+        gauge.add_metric(["total"], usage.total)
+        gauge.add_metric(["used"], usage.used)
+        gauge.add_metric(["free"], usage.free)
+        yield gauge
+
+
+def update_pool_gauges(pool):
+    stats = pool.stats()
+    DB_POOL_CONNECTIONS.labels("in_use").set(stats["in_use"])
+    DB_POOL_CONNECTIONS.labels("idle").set(stats["idle"])
+    DB_POOL_CONNECTIONS.labels("waiters").set(stats["waiters"])
+
+
+def init(download_dir: str):
+    """Register scrape-time collectors. Call once per process."""
+    global _disk_collector
+    if _disk_collector is not None:
+        return
+    _disk_collector = DiskUsageCollector(download_dir)
+    if not MULTIPROCESS:
+        REGISTRY.register(_disk_collector)
+
+
+def render():
+    """Return (body, content type) for a /metrics response."""
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        if _disk_collector is not None:
+            registry.register(_disk_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,282 @@
+"""Forward-only schema migrations.
+
+Migrations are the numbered SQL files in migrations/ and are applied in order, each recorded in
+schema_version. A file whose first line is `-- migrate: no-transaction` is run statement by
+statement in autocommit mode, which CREATE INDEX CONCURRENTLY requires. Such a file is re-run from
+the start if a statement fails part-way, so each statement must be idempotent. IF NOT EXISTS alone
+is not enough for concurrent index builds: a failed build leaves an INVALID index behind, which the
+migrator drops before building it again.
+
+Usage:
+    python migrate.py            # apply pending migrations, then create the default admin
+    python migrate.py status     # show applied and pending migrations
+"""
+
+import os
+import re
+import sys
+import argparse
+import logging
+from typing import List, Tuple, Optional
+
+import psycopg2
+
+from config import Config
+
+logger = logging.getLogger("yt-dlp-api.migrate")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+CONCURRENT_INDEX_RE = re.compile(
+    r"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+
+# Arbitrary key for the advisory lock that keeps concurrent runners from racing
+MIGRATION_LOCK_KEY = 7240115
+
+
+def list_migrations() -> List[Tuple[int, str, str]]:
+    """Return (version, name, path) for every migration file, ordered by version."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers in migrations/")
+    return migrations
+
+
+def latest_version() -> int:
+    migrations = list_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(conn) -> Optional[int]:
+    """Return the applied schema version, or None if migrations have never run."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return None
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split SQL on top-level semicolons, ignoring those inside quotes, dollar quotes and comments."""
+    statements = []
+    current = []
+    i = 0
+    length = len(sql)
+
+    while i < length:
+        char = sql[i]
+
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = length if end == -1 else end
+            current.append(sql[i:end])
+            i = end
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            end = length if end == -1 else end + 2
+            current.append(sql[i:end])
+            i = end
+        elif char in ("'", '"'):
+            end = i + 1
+            while end < length:
+                if sql[end] == char:
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i : end + 1])
+            i = end + 1
+        elif char == "$":
+            match = re.match(r"\$[A-Za-z_]*\$", sql[i:])
+            if match:
+                tag = match.group(0)
+                end = sql.find(tag, i + len(tag))
+                end = length if end == -1 else end + len(tag)
+                current.append(sql[i:end])
+                i = end
+            else:
+                current.append(char)
+                i += 1
+        elif char == ";":
+            statements.append("".join(current))
+            current = []
+            i += 1
+        else:
+            current.append(char)
+            i += 1
+
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if _has_code(statement)]
+
+
+def _strip_comments(statement: str) -> str:
+    return re.sub(r"--[^\n]*|/\*.*?\*/", "", statement, flags=re.DOTALL)
+
+
+def _has_code(statement: str) -> bool:
+    return bool(_strip_comments(statement).strip())
+
+
+def drop_invalid_index(cursor, statement: str):
+    """Drop the index `statement` builds if an earlier failed concurrent build left it INVALID."""
+    match = CONCURRENT_INDEX_RE.match(_strip_comments(statement).strip())
+    if not match:
+        return
+    index = match.group(1)
+    cursor.execute(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+        (index,),
+    )
+    row = cursor.fetchone()
+    if row and row[0]:
+        logger.warning(f"Dropping invalid index {index} left by an interrupted build")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+
+
+def connect():
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        database=Config.DB_NAME,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+    )
+
+
+def apply_migrations() -> int:
+    """Apply every pending migration. Returns the number applied."""
+    conn = connect()
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS schema_version (
+                   version INTEGER PRIMARY KEY,
+                   name VARCHAR(255) NOT NULL,
+                   applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+               )"""
+        )
+
+        applied = current_version(conn) or 0
+        count = 0
+        for version, name, path in list_migrations():
+            if version <= applied:
+                continue
+
+            with open(path) as f:
+                sql = f.read()
+
+            logger.info(f"Applying migration {version:04d}_{name}")
+            if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                for statement in split_statements(sql):
+                    drop_invalid_index(cursor, statement)
+                    cursor.execute(statement)
+                cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+            else:
+                conn.autocommit = False
+                try:
+                    cursor.execute(sql)
+                    cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+            count += 1
+
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        return count
+    finally:
+        conn.close()
+
+
+def print_status():
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        applied = {}
+        if current_version(conn) is not None:
+            cursor.execute("SELECT version, applied_at FROM schema_version")
+            applied = dict(cursor.fetchall())
+    finally:
+        conn.close()
+
+    for version, name, _ in list_migrations():
+        state = f"applied {applied[version].isoformat()}" if version in applied else "pending"
+        print(f"{version:04d}_{name}: {state}")
+
+
+def ensure_default_admin(auth_manager):
+    admin_username = os.environ.get("ADMIN_USERNAME", "").strip()
+    admin_password = os.environ.get("ADMIN_PASSWORD", "").strip()
+
+    if not admin_username or not admin_password:
+        logger.info("ADMIN_USERNAME or ADMIN_PASSWORD not set - skipping auto-admin creation")
+        return
+
+    if len(admin_password) < 8:
+        logger.error("ADMIN_PASSWORD must be at least 8 characters long!")
+        return
+
+    try:
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
+            admin_count = cursor.fetchone()[0]
+
+        if admin_count == 0:
+            logger.info("No admin user found. Creating default admin from environment variables...")
+            success, message = auth_manager.create_user(admin_username, admin_password, "admin")
+            if success:
+                logger.info(f"✓ Default admin user created: {admin_username}")
+                logger.info("You can now login via the web interface or API")
+            else:
+                logger.error(f"✗ Failed to create default admin: {message}")
+        else:
+            logger.info(f"Admin user(s) already exist (count: {admin_count})")
+    except Exception as e:
+        logger.error(f"Error checking/creating admin user: {e}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("command", nargs="?", default="up", choices=["up", "status"])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.command == "status":
+        print_status()
+        return 0
+
+    count = apply_migrations()
+    logger.info(f"Applied {count} migration(s); schema is at version {latest_version()}")
+
+    from auth import AuthManager
+    from sessions import SessionLifecycle
+
+    auth_manager = AuthManager()
+    try:
+        ensure_default_admin(auth_manager)
+        if Config.SESSION_PARTITIONING:
+            SessionLifecycle(auth_manager).partition_table()
+    finally:
+        auth_manager.connection_pool.closeall()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
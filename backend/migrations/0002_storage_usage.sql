@@ -0,0 +1,36 @@
+-- Per-user and global usage counters kept in step with downloaded_files.
+-- The all-zero UUID row holds the global totals.
+CREATE TABLE IF NOT EXISTS storage_usage (
+    user_id UUID PRIMARY KEY,
+    file_count BIGINT NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION downloaded_files_usage() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO storage_usage (user_id, file_count, total_bytes)
+        VALUES (NEW.user_id, 1, NEW.file_size),
+               ('00000000-0000-0000-0000-000000000000', 1, NEW.file_size)
+        ON CONFLICT (user_id) DO UPDATE
+        SET file_count = storage_usage.file_count + 1,
+            total_bytes = storage_usage.total_bytes + EXCLUDED.total_bytes,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE storage_usage
+        SET file_count = file_count - 1,
+            total_bytes = total_bytes - OLD.file_size,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id IN (OLD.user_id, '00000000-0000-0000-0000-000000000000');
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_downloaded_files_usage
+AFTER INSERT OR DELETE OR UPDATE OF user_id, file_size ON downloaded_files
+FOR EACH ROW EXECUTE FUNCTION downloaded_files_usage();
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Keyset pagination and reconciler lookups; built concurrently so large tables stay writable
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_downloaded_files_stored_filename ON downloaded_files(stored_filename);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_downloaded_files_user_created ON downloaded_files(user_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_api_keys_user_created ON api_keys(user_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_api_keys_created ON api_keys(created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created ON users(created_at DESC, id DESC);
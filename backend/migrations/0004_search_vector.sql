@@ -0,0 +1,52 @@
+-- migrate: no-transaction
+-- Weighted full-text document over the fields users search by. A plain column kept up to date by a
+-- trigger rather than a generated one: adding a stored generated column rewrites the whole table
+-- under an exclusive lock, while this only adds the column and fills existing rows in batches.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION downloaded_files_search_document(title TEXT, filename TEXT, url TEXT) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+           setweight(to_tsvector('simple', coalesce(filename, '')), 'B') ||
+           setweight(to_tsvector('simple', coalesce(url, '')), 'C')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION downloaded_files_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := downloaded_files_search_document(NEW.video_title, NEW.original_filename, NEW.video_url);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_downloaded_files_search_vector
+BEFORE INSERT OR UPDATE OF video_title, original_filename, video_url ON downloaded_files
+FOR EACH ROW EXECUTE FUNCTION downloaded_files_search_vector();
+
+-- Rows written before the trigger existed, in primary key order, committing after each batch so
+-- locks are short-lived. Rows inserted meanwhile are filled in by the trigger.
+DO $$
+DECLARE
+    last_id UUID;
+    batch_last UUID;
+BEGIN
+    LOOP
+        WITH batch AS (
+            SELECT id FROM downloaded_files
+            WHERE last_id IS NULL OR id > last_id
+            ORDER BY id
+            LIMIT 5000
+        ),
+        filled AS (
+            UPDATE downloaded_files f
+            SET search_vector = downloaded_files_search_document(f.video_title, f.original_filename, f.video_url)
+            FROM batch b
+            WHERE f.id = b.id AND f.search_vector IS NULL
+        )
+        SELECT id INTO batch_last FROM batch ORDER BY id DESC LIMIT 1;
+
+        EXIT WHEN batch_last IS NULL;
+        last_id := batch_last;
+        COMMIT;
+    END LOOP;
+END $$;
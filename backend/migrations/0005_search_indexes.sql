@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_downloaded_files_search ON downloaded_files USING GIN (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_downloaded_files_title_trgm ON downloaded_files USING GIN (video_title gin_trgm_ops);
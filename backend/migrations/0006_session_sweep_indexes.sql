@@ -0,0 +1,4 @@
+-- Lets the session sweeper find expired and logged-out rows without a full scan.
+-- Not concurrent: sessions may be a partitioned table, which doesn't support CONCURRENTLY.
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_inactive ON sessions(id) WHERE is_active = FALSE;
@@ -0,0 +1,52 @@
+-- Shared rate limiter state (see ratelimit.py). UNLOGGED: losing counters on a crash is fine
+-- and skipping the WAL keeps each check cheap. Times are epoch seconds from the database clock,
+-- so every worker and node agrees on window boundaries.
+
+-- Moving window: timestamps of the hits inside the current window, oldest first
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_windows (
+    key TEXT PRIMARY KEY,
+    hits DOUBLE PRECISION[] NOT NULL DEFAULT '{}',
+    expires_at DOUBLE PRECISION NOT NULL
+);
+
+-- Fixed window counters
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_counters (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    expires_at DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_windows_expires_at ON rate_limit_windows(expires_at);
+CREATE INDEX IF NOT EXISTS idx_rate_limit_counters_expires_at ON rate_limit_counters(expires_at);
+
+-- Records `p_amount` hits for `p_key` if that keeps the last `p_expiry` seconds within `p_limit`.
+-- The upsert locks the key's row, so concurrent callers are serialised per key.
+CREATE OR REPLACE FUNCTION rate_limit_acquire(p_key TEXT, p_limit INTEGER, p_expiry INTEGER, p_amount INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_now DOUBLE PRECISION := extract(epoch FROM clock_timestamp());
+    v_hits DOUBLE PRECISION[];
+BEGIN
+    IF p_amount > p_limit THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO rate_limit_windows (key, hits, expires_at)
+    VALUES (p_key, '{}', v_now + p_expiry)
+    ON CONFLICT (key) DO UPDATE SET key = EXCLUDED.key
+    RETURNING hits INTO v_hits;
+
+    v_hits := ARRAY(SELECT h FROM unnest(v_hits) AS h WHERE h > v_now - p_expiry ORDER BY h);
+
+    IF coalesce(array_length(v_hits, 1), 0) + p_amount > p_limit THEN
+        UPDATE rate_limit_windows SET hits = v_hits WHERE key = p_key;
+        RETURN FALSE;
+    END IF;
+
+    UPDATE rate_limit_windows
+    SET hits = v_hits || array_fill(v_now, ARRAY[p_amount]),
+        expires_at = v_now + p_expiry
+    WHERE key = p_key;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,30 @@
+-- Per-user quota overrides. NULL columns fall back to the QUOTA_* defaults; 0 means unlimited.
+CREATE TABLE IF NOT EXISTS user_quotas (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    requests_per_minute INTEGER,
+    max_concurrent_jobs INTEGER,
+    daily_jobs INTEGER,
+    daily_download_bytes BIGINT,
+    daily_served_bytes BIGINT,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Usage per user per UTC day
+CREATE TABLE IF NOT EXISTS quota_usage (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    jobs INTEGER NOT NULL DEFAULT 0,
+    bytes_downloaded BIGINT NOT NULL DEFAULT 0,
+    bytes_served BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+-- Downloads currently running, for the concurrent job limit
+CREATE TABLE IF NOT EXISTS active_jobs (
+    id SERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_active_jobs_user_id ON active_jobs(user_id);
+CREATE INDEX IF NOT EXISTS idx_quota_usage_day ON quota_usage(day);
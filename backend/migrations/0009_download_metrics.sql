@@ -0,0 +1,19 @@
+-- One row per download attempt with its phase timing breakdown (see traces.py)
+CREATE TABLE IF NOT EXISTS download_metrics (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    file_id UUID REFERENCES downloaded_files(id) ON DELETE SET NULL,
+    extractor VARCHAR(100),
+    format_id VARCHAR(100),
+    success BOOLEAN NOT NULL,
+    bytes BIGINT,
+    postprocessors VARCHAR(255),
+    total_seconds DOUBLE PRECISION NOT NULL,
+    -- phase name -> seconds: info, extract, transfer, merge, postprocess, db_insert
+    phases JSONB NOT NULL DEFAULT '{}',
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_download_metrics_created_at ON download_metrics(created_at);
+CREATE INDEX IF NOT EXISTS idx_download_metrics_extractor_created ON download_metrics(extractor, created_at);
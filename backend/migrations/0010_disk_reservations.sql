@@ -0,0 +1,11 @@
+-- Disk space claimed by running downloads (see reservations.py)
+CREATE TABLE IF NOT EXISTS disk_reservations (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    bytes BIGINT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Reservations of workers that died are ignored after this and purged
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_disk_reservations_expires_at ON disk_reservations(expires_at);
@@ -0,0 +1,11 @@
+-- Content-addressed blobs backing downloaded files (see blobs.py). Files with the same
+-- content_sha256 are hardlinks to one blob on disk.
+CREATE TABLE IF NOT EXISTS file_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS content_sha256 CHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_downloaded_files_content_sha256 ON downloaded_files(content_sha256);
@@ -0,0 +1,4 @@
+-- What each file is a download of, so repeat requests can be answered without yt-dlp (see urls.py)
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS extractor_key VARCHAR(100);
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS video_id VARCHAR(255);
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS format_selector VARCHAR(255);
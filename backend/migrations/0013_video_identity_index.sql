@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_downloaded_files_video_identity
+    ON downloaded_files(extractor_key, video_id, format_selector);
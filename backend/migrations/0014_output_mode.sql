@@ -0,0 +1,2 @@
+-- Output mode a file was produced with (see outputs.py); part of the reuse key with format_selector
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS output_mode VARCHAR(20) NOT NULL DEFAULT 'video';
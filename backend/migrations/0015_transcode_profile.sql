@@ -0,0 +1,2 @@
+-- Transcode profile a video-mode file was encoded with (see transcode.py); part of the reuse key
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS profile VARCHAR(50);
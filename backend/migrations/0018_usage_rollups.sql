@@ -0,0 +1,95 @@
+-- Daily usage rollups for the admin dashboard (see analytics.py), kept in step with download_metrics
+-- so analytics never scan the raw tables.
+ALTER TABLE download_metrics ADD COLUMN IF NOT EXISTS domain VARCHAR(255);
+
+CREATE TABLE IF NOT EXISTS usage_daily (
+    day DATE PRIMARY KEY,
+    downloads BIGINT NOT NULL DEFAULT 0,
+    failures BIGINT NOT NULL DEFAULT 0,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    total_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS usage_user_daily (
+    day DATE NOT NULL,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    downloads BIGINT NOT NULL DEFAULT 0,
+    failures BIGINT NOT NULL DEFAULT 0,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS usage_domain_daily (
+    day DATE NOT NULL,
+    domain VARCHAR(255) NOT NULL,
+    downloads BIGINT NOT NULL DEFAULT 0,
+    failures BIGINT NOT NULL DEFAULT 0,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, domain)
+);
+
+CREATE OR REPLACE FUNCTION download_metrics_rollup() RETURNS trigger AS $$
+DECLARE
+    failed INTEGER := CASE WHEN NEW.success THEN 0 ELSE 1 END;
+    added BIGINT := COALESCE(NEW.bytes, 0);
+BEGIN
+    INSERT INTO usage_daily (day, downloads, failures, bytes, total_seconds)
+    VALUES (NEW.created_at::date, 1, failed, added, NEW.total_seconds)
+    ON CONFLICT (day) DO UPDATE
+    SET downloads = usage_daily.downloads + 1,
+        failures = usage_daily.failures + EXCLUDED.failures,
+        bytes = usage_daily.bytes + EXCLUDED.bytes,
+        total_seconds = usage_daily.total_seconds + EXCLUDED.total_seconds,
+        updated_at = CURRENT_TIMESTAMP;
+
+    IF NEW.user_id IS NOT NULL THEN
+        INSERT INTO usage_user_daily (day, user_id, downloads, failures, bytes)
+        VALUES (NEW.created_at::date, NEW.user_id, 1, failed, added)
+        ON CONFLICT (day, user_id) DO UPDATE
+        SET downloads = usage_user_daily.downloads + 1,
+            failures = usage_user_daily.failures + EXCLUDED.failures,
+            bytes = usage_user_daily.bytes + EXCLUDED.bytes;
+    END IF;
+
+    INSERT INTO usage_domain_daily (day, domain, downloads, failures, bytes)
+    VALUES (NEW.created_at::date, COALESCE(NEW.domain, 'unknown'), 1, failed, added)
+    ON CONFLICT (day, domain) DO UPDATE
+    SET downloads = usage_domain_daily.downloads + 1,
+        failures = usage_domain_daily.failures + EXCLUDED.failures,
+        bytes = usage_domain_daily.bytes + EXCLUDED.bytes;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_download_metrics_rollup
+AFTER INSERT ON download_metrics
+FOR EACH ROW EXECUTE FUNCTION download_metrics_rollup();
+
+-- Seed from the history recorded before the rollups existed. Older rows have no domain, so it is
+-- taken from the stored file's URL where there is one.
+UPDATE download_metrics m
+SET domain = lower(substring(f.video_url FROM '^[a-zA-Z]+://(?:www\.)?([^/:?#]+)'))
+FROM downloaded_files f
+WHERE m.file_id = f.id AND m.domain IS NULL;
+
+INSERT INTO usage_daily (day, downloads, failures, bytes, total_seconds)
+SELECT created_at::date, COUNT(*), COUNT(*) FILTER (WHERE NOT success), COALESCE(SUM(bytes), 0), SUM(total_seconds)
+FROM download_metrics
+GROUP BY 1
+ON CONFLICT (day) DO NOTHING;
+
+INSERT INTO usage_user_daily (day, user_id, downloads, failures, bytes)
+SELECT created_at::date, user_id, COUNT(*), COUNT(*) FILTER (WHERE NOT success), COALESCE(SUM(bytes), 0)
+FROM download_metrics
+WHERE user_id IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (day, user_id) DO NOTHING;
+
+INSERT INTO usage_domain_daily (day, domain, downloads, failures, bytes)
+SELECT created_at::date, COALESCE(domain, 'unknown'), COUNT(*), COUNT(*) FILTER (WHERE NOT success),
+       COALESCE(SUM(bytes), 0)
+FROM download_metrics
+GROUP BY 1, 2
+ON CONFLICT (day, domain) DO NOTHING;
@@ -0,0 +1,3 @@
+-- When blob backfill last failed to hash a file (missing or unreadable); such rows go to the back of
+-- the queue so they can't hold up the rest (see blobs.py)
+ALTER TABLE downloaded_files ADD COLUMN IF NOT EXISTS hash_attempted_at TIMESTAMP;
@@ -0,0 +1,27 @@
+-- Per-user counters only. The global row made every insert and delete across all users update the
+-- same tuple, and the two trigger branches locked it in opposite orders, so writers could deadlock.
+-- Global totals are now the sum of the per-user rows (see storage.py).
+CREATE OR REPLACE FUNCTION downloaded_files_usage() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO storage_usage (user_id, file_count, total_bytes)
+        VALUES (NEW.user_id, 1, NEW.file_size)
+        ON CONFLICT (user_id) DO UPDATE
+        SET file_count = storage_usage.file_count + 1,
+            total_bytes = storage_usage.total_bytes + EXCLUDED.total_bytes,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE storage_usage
+        SET file_count = file_count - 1,
+            total_bytes = total_bytes - OLD.file_size,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = OLD.user_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DELETE FROM storage_usage WHERE user_id = '00000000-0000-0000-0000-000000000000';
@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- download_metrics.file_id references downloaded_files ON DELETE SET NULL; without this index every
+-- deleted file scans the whole metrics table. A separate file from 0009 so it can be built concurrently.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_download_metrics_file_id ON download_metrics(file_id);
@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- Blob backfill queue (see BlobStore.backfill): only rows still waiting to be hashed, in the order
+-- they are picked, so each run reads one batch instead of scanning downloaded_files
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_downloaded_files_hash_backfill
+    ON downloaded_files(hash_attempted_at NULLS FIRST, created_at) WHERE content_sha256 IS NULL;
@@ -0,0 +1,87 @@
+"""Output modes for /download: which formats yt-dlp selects and how they are post-processed."""
+
+import os
+import glob
+import mimetypes
+from typing import Dict, List, Optional
+
+FAST_MAX_HEIGHT = 480
+
+# Extensions mimetypes doesn't know or gets wrong for media
+MIME_TYPES = {
+    ".mp4": "video/mp4",
+    ".m4a": "audio/mp4",
+    ".mkv": "video/x-matroska",
+    ".webm": "video/webm",
+    ".opus": "audio/ogg",
+    ".ogg": "audio/ogg",
+    ".mp3": "audio/mpeg",
+}
+# Left behind by yt-dlp while (or after failing at) writing the real output
+PARTIAL_SUFFIXES = (".part", ".ytdl", ".temp", ".link")
+
+
+class OutputMode:
+    """`transcodes` modes take their encoder settings from a transcode profile (see transcode.py)."""
+
+    def __init__(
+        self, name: str, format_selector: str, ytdlp_args: List[str], description: str, transcodes: bool = False
+    ):
+        self.name = name
+        self.format_selector = format_selector
+        self.ytdlp_args = ytdlp_args
+        self.description = description
+        self.transcodes = transcodes
+
+
+OUTPUT_MODES: Dict[str, OutputMode] = {
+    "video": OutputMode(
+        "video",
+        "bestvideo+bestaudio/best",
+        [],
+        "Best quality, re-encoded with a transcode profile",
+        transcodes=True,
+    ),
+    "audio": OutputMode(
+        "audio",
+        "bestaudio[ext=m4a]/bestaudio",
+        # AAC sources are copied as is; anything else is encoded to AAC once
+        ["-x", "--audio-format", "m4a", "--audio-quality", "0"],
+        "Audio only, M4A",
+    ),
+    "fast": OutputMode(
+        "fast",
+        f"best[height<={FAST_MAX_HEIGHT}][ext=mp4]/"
+        f"bestvideo[height<={FAST_MAX_HEIGHT}][ext=mp4]+bestaudio[ext=m4a]/"
+        f"best[height<={FAST_MAX_HEIGHT}]/worst",
+        # Streams are copied into MP4, never re-encoded
+        ["--merge-output-format", "mp4", "--remux-video", "mp4"],
+        f"Up to {FAST_MAX_HEIGHT}p MP4 without re-encoding",
+    ),
+    "original": OutputMode(
+        "original",
+        "bestvideo+bestaudio/best",
+        [],
+        "Best quality in the source's own codecs and container",
+    ),
+}
+DEFAULT_OUTPUT_MODE = "video"
+
+
+def find_output_file(directory: str, stem: str) -> Optional[str]:
+    """The finished file yt-dlp wrote for output template `<directory>/<stem>.%(ext)s`, if any."""
+    candidates = [
+        path
+        for path in glob.glob(os.path.join(glob.escape(directory), glob.escape(stem) + ".*"))
+        if not path.endswith(PARTIAL_SUFFIXES) and os.path.isfile(path)
+    ]
+    if not candidates:
+        return None
+    # Intermediate streams (<stem>.f137.mp4) are removed after merging; prefer the plain name
+    candidates.sort(key=lambda path: (os.path.basename(path).count("."), path))
+    return candidates[0]
+
+
+def mime_type_for(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return MIME_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
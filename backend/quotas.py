@@ -0,0 +1,231 @@
+import threading
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, Dict
+
+from psycopg2.extras import RealDictCursor
+
+from cache import TTLCache
+from utils import is_valid_uuid
+
+logger = logging.getLogger("yt-dlp-api.quotas")
+
+QUOTA_FIELDS = (
+    "requests_per_minute",
+    "max_concurrent_jobs",
+    "daily_jobs",
+    "daily_download_bytes",
+    "daily_served_bytes",
+)
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, quota: str, limit: int, used: int):
+        super().__init__(f"{quota} quota exceeded ({used}/{limit})")
+        self.quota = quota
+        self.limit = limit
+        self.used = used
+
+
+class QuotaManager:
+    """Per-user request, job and bandwidth quotas.
+
+    Limits come from the user's user_quotas row, falling back to `defaults` for NULL columns;
+    0 means unlimited. Byte counters are buffered in memory and written by `flush`, so serving
+    a file doesn't cost a database write. Job counts are written immediately because the
+    concurrent and daily job checks must hold across workers.
+    """
+
+    def __init__(self, auth_manager, defaults: Dict[str, int], cache_ttl: float = 60.0, stale_job_seconds: int = 3600):
+        self.auth_manager = auth_manager
+        self.defaults = {field: defaults.get(field, 0) for field in QUOTA_FIELDS}
+        self.stale_job_seconds = stale_job_seconds
+        self._limits_cache = TTLCache(maxsize=10000, ttl=cache_ttl)
+        self._pending = defaultdict(lambda: [0, 0])
+        self._pending_lock = threading.Lock()
+
+    @staticmethod
+    def applies_to(principal: Optional[Dict]) -> bool:
+        """Admins and the legacy shared key are not subject to quotas."""
+        return bool(principal) and principal.get("role") != "admin" and is_valid_uuid(str(principal.get("id")))
+
+    def get_limits(self, user_id: str) -> Dict[str, int]:
+        user_id = str(user_id)
+        cached = self._limits_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(f"SELECT {', '.join(QUOTA_FIELDS)} FROM user_quotas WHERE user_id = %s", (user_id,))
+            row = cursor.fetchone() or {}
+
+        limits = {field: row[field] if row.get(field) is not None else self.defaults[field] for field in QUOTA_FIELDS}
+        self._limits_cache.set(user_id, limits)
+        return limits
+
+    def get_overrides(self, user_id: str) -> Dict[str, Optional[int]]:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(f"SELECT {', '.join(QUOTA_FIELDS)} FROM user_quotas WHERE user_id = %s", (str(user_id),))
+            row = cursor.fetchone() or {}
+        return {field: row.get(field) for field in QUOTA_FIELDS}
+
+    def set_limits(self, user_id: str, overrides: Dict[str, Optional[int]]):
+        """Store per-user overrides. Only the given fields change; None restores the default."""
+        fields = [field for field in QUOTA_FIELDS if field in overrides]
+        if not fields:
+            return
+
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""INSERT INTO user_quotas (user_id, {', '.join(fields)})
+                    VALUES (%s, {', '.join(['%s'] * len(fields))})
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        {', '.join(f'{field} = EXCLUDED.{field}' for field in fields)},
+                        updated_at = CURRENT_TIMESTAMP""",
+                (str(user_id), *[overrides[field] for field in fields]),
+            )
+            conn.commit()
+        # Other workers pick up the change when their cached copy expires
+        self._limits_cache.delete(str(user_id))
+
+    def get_usage(self, user_id: str) -> Dict:
+        user_id = str(user_id)
+        day = _today()
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT jobs, bytes_downloaded, bytes_served FROM quota_usage WHERE user_id = %s AND day = %s",
+                (user_id, day),
+            )
+            jobs, bytes_downloaded, bytes_served = cursor.fetchone() or (0, 0, 0)
+            cursor.execute(
+                "SELECT COUNT(*) FROM active_jobs WHERE user_id = %s AND started_at > %s",
+                (user_id, self._stale_cutoff()),
+            )
+            active_jobs = cursor.fetchone()[0]
+
+        with self._pending_lock:
+            pending = self._pending.get((user_id, day), (0, 0))
+
+        return {
+            "day": day.isoformat(),
+            "jobs": jobs,
+            "active_jobs": active_jobs,
+            "bytes_downloaded": bytes_downloaded + pending[0],
+            "bytes_served": bytes_served + pending[1],
+        }
+
+    def check_bytes(self, user_id: str, quota: str):
+        """Raise QuotaExceeded if today's downloaded or served bytes have reached the limit."""
+        field = {"daily_download_bytes": "bytes_downloaded", "daily_served_bytes": "bytes_served"}[quota]
+        limit = self.get_limits(user_id)[quota]
+        if not limit:
+            return
+        used = self.get_usage(user_id)[field]
+        if used >= limit:
+            raise QuotaExceeded(quota, limit, used)
+
+    def record_bytes(self, user_id: str, downloaded: int = 0, served: int = 0):
+        if not downloaded and not served:
+            return
+        with self._pending_lock:
+            counters = self._pending[(str(user_id), _today())]
+            counters[0] += downloaded
+            counters[1] += served
+
+    def flush(self):
+        with self._pending_lock:
+            pending = dict(self._pending)
+            self._pending.clear()
+        if not pending:
+            return
+
+        try:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                for (user_id, day), (downloaded, served) in pending.items():
+                    cursor.execute(
+                        """INSERT INTO quota_usage (user_id, day, bytes_downloaded, bytes_served)
+                           VALUES (%s, %s, %s, %s)
+                           ON CONFLICT (user_id, day) DO UPDATE SET
+                               bytes_downloaded = quota_usage.bytes_downloaded + EXCLUDED.bytes_downloaded,
+                               bytes_served = quota_usage.bytes_served + EXCLUDED.bytes_served""",
+                        (user_id, day, downloaded, served),
+                    )
+                conn.commit()
+        except Exception:
+            # Put the counts back so the next flush retries them
+            with self._pending_lock:
+                for key, (downloaded, served) in pending.items():
+                    self._pending[key][0] += downloaded
+                    self._pending[key][1] += served
+            raise
+
+    def start_job(self, user_id: str) -> int:
+        """Register a running download, enforcing the concurrent and daily job limits. Returns the job id."""
+        user_id = str(user_id)
+        limits = self.get_limits(user_id)
+        day = _today()
+
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            # Serialise job starts per user so two workers can't both take the last slot
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"quota:{user_id}",))
+
+            if limits["max_concurrent_jobs"]:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM active_jobs WHERE user_id = %s AND started_at > %s",
+                    (user_id, self._stale_cutoff()),
+                )
+                active = cursor.fetchone()[0]
+                if active >= limits["max_concurrent_jobs"]:
+                    raise QuotaExceeded("max_concurrent_jobs", limits["max_concurrent_jobs"], active)
+
+            if limits["daily_jobs"]:
+                cursor.execute("SELECT jobs FROM quota_usage WHERE user_id = %s AND day = %s", (user_id, day))
+                row = cursor.fetchone()
+                jobs = row[0] if row else 0
+                if jobs >= limits["daily_jobs"]:
+                    raise QuotaExceeded("daily_jobs", limits["daily_jobs"], jobs)
+
+            cursor.execute(
+                """INSERT INTO quota_usage (user_id, day, jobs) VALUES (%s, %s, 1)
+                   ON CONFLICT (user_id, day) DO UPDATE SET jobs = quota_usage.jobs + 1""",
+                (user_id, day),
+            )
+            cursor.execute("INSERT INTO active_jobs (user_id) VALUES (%s) RETURNING id", (user_id,))
+            job_id = cursor.fetchone()[0]
+            conn.commit()
+        return job_id
+
+    def finish_job(self, job_id: int):
+        try:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM active_jobs WHERE id = %s", (job_id,))
+                conn.commit()
+        except Exception as e:
+            # The row is ignored once it is older than stale_job_seconds and removed by purge_stale_jobs
+            logger.error(f"Failed to release job {job_id}: {e}")
+
+    def purge_stale_jobs(self) -> int:
+        """Remove job rows left behind by workers that died mid-download."""
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM active_jobs WHERE started_at <= %s", (self._stale_cutoff(),))
+            removed = cursor.rowcount
+            conn.commit()
+        if removed:
+            logger.info(f"Removed {removed} stale active job(s)")
+        return removed
+
+    def _stale_cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.stale_job_seconds)
+
+
+def _today():
+    return datetime.utcnow().date()
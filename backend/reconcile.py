@@ -0,0 +1,208 @@
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Optional, Dict, List
+
+logger = logging.getLogger("yt-dlp-api.reconcile")
+
+# Cap on the number of sample entries kept per category in a report
+MAX_REPORT_SAMPLES = 100
+
+
+class FileReconciler:
+    """Compares downloaded_files against DOWNLOAD_DIR in small batches and optionally repairs differences.
+
+    Rows are walked with keyset iteration on the primary key and the directory with os.scandir,
+    pausing between batches so a scan can run against a live system without saturating disk or DB.
+    """
+
+    def __init__(
+        self, auth_manager, download_dir: str, batch_size: int = 500, batch_pause: float = 0.1, orphan_grace: int = 3600
+    ):
+        self.auth_manager = auth_manager
+        self.download_dir = download_dir
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.orphan_grace = orphan_grace
+        self._lock = threading.Lock()
+        self._last_report = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._lock.locked()
+
+    @property
+    def last_report(self) -> Optional[Dict]:
+        return self._last_report
+
+    def run(self, repair: bool = False) -> Optional[Dict]:
+        """Run a full scan. Returns None if a scan is already in progress."""
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            started = time.time()
+            report = {
+                "started_at": datetime.utcnow().isoformat(),
+                "repair": repair,
+                "rows_scanned": 0,
+                "files_scanned": 0,
+                "missing_files": {"count": 0, "samples": []},
+                "size_mismatches": {"count": 0, "samples": []},
+                "orphan_files": {"count": 0, "bytes": 0, "samples": []},
+                "repaired": {"rows_deleted": 0, "rows_resized": 0, "files_deleted": 0},
+            }
+
+            self._scan_rows(report, repair)
+            self._scan_files(report, repair)
+
+            report["duration_seconds"] = round(time.time() - started, 3)
+            self._last_report = report
+
+            logger.info(
+                f"Reconciliation finished: {report['missing_files']['count']} missing file(s), "
+                f"{report['orphan_files']['count']} orphan file(s), "
+                f"{report['size_mismatches']['count']} size mismatch(es), repair={repair}"
+            )
+            return report
+        finally:
+            self._lock.release()
+
+    def _scan_rows(self, report: Dict, repair: bool):
+        last_id = None
+
+        while True:
+            rows = self._fetch_row_batch(last_id)
+            if not rows:
+                break
+
+            missing_ids = []
+            resized = []
+            for file_id, user_id, stored_filename, file_path, file_size in rows:
+                try:
+                    actual_size = os.stat(file_path).st_size
+                except FileNotFoundError:
+                    missing_ids.append(file_id)
+                    _add_sample(
+                        report["missing_files"],
+                        {"id": str(file_id), "user_id": str(user_id), "stored_filename": stored_filename},
+                    )
+                    continue
+
+                if actual_size != file_size:
+                    resized.append((actual_size, file_id))
+                    _add_sample(
+                        report["size_mismatches"],
+                        {
+                            "id": str(file_id),
+                            "stored_filename": stored_filename,
+                            "recorded": file_size,
+                            "actual": actual_size,
+                        },
+                    )
+
+            report["rows_scanned"] += len(rows)
+            if repair and (missing_ids or resized):
+                self._repair_rows(report, missing_ids, resized)
+
+            last_id = rows[-1][0]
+            if len(rows) < self.batch_size:
+                break
+            time.sleep(self.batch_pause)
+
+    def _fetch_row_batch(self, last_id) -> List[tuple]:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            if last_id is None:
+                cursor.execute(
+                    """SELECT id, user_id, stored_filename, file_path, file_size
+                       FROM downloaded_files ORDER BY id LIMIT %s""",
+                    (self.batch_size,),
+                )
+            else:
+                cursor.execute(
+                    """SELECT id, user_id, stored_filename, file_path, file_size
+                       FROM downloaded_files WHERE id > %s ORDER BY id LIMIT %s""",
+                    (last_id, self.batch_size),
+                )
+            rows = cursor.fetchall()
+            conn.commit()
+            return rows
+
+    def _repair_rows(self, report: Dict, missing_ids: List, resized: List[tuple]):
+        try:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                if missing_ids:
+                    cursor.execute(
+                        "DELETE FROM downloaded_files WHERE id = ANY(%s::uuid[])", ([str(i) for i in missing_ids],)
+                    )
+                    report["repaired"]["rows_deleted"] += cursor.rowcount
+                for actual_size, file_id in resized:
+                    cursor.execute("UPDATE downloaded_files SET file_size = %s WHERE id = %s", (actual_size, file_id))
+                    report["repaired"]["rows_resized"] += cursor.rowcount
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error repairing downloaded_files rows: {e}")
+
+    def _scan_files(self, report: Dict, repair: bool):
+        cutoff = time.time() - self.orphan_grace
+        batch = []
+
+        with os.scandir(self.download_dir) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+
+                # Skip recent files so in-flight downloads and their intermediates are left alone
+                if stat.st_mtime > cutoff:
+                    continue
+
+                batch.append((entry.name, entry.path, stat.st_size))
+                if len(batch) >= self.batch_size:
+                    self._check_file_batch(report, batch, repair)
+                    batch = []
+                    time.sleep(self.batch_pause)
+
+        if batch:
+            self._check_file_batch(report, batch, repair)
+
+    def _check_file_batch(self, report: Dict, batch: List[tuple], repair: bool):
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT stored_filename FROM downloaded_files WHERE stored_filename = ANY(%s)",
+                ([name for name, _, _ in batch],),
+            )
+            known = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+
+        report["files_scanned"] += len(batch)
+        for name, path, size in batch:
+            if name in known:
+                continue
+
+            report["orphan_files"]["bytes"] += size
+            _add_sample(report["orphan_files"], {"name": name, "size": size})
+
+            if repair:
+                try:
+                    os.remove(path)
+                    report["repaired"]["files_deleted"] += 1
+                    logger.info(f"Removed orphan file: {path}")
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"Failed to remove orphan file {path}: {e}")
+
+
+def _add_sample(category: Dict, sample: Dict):
+    category["count"] += 1
+    if len(category["samples"]) < MAX_REPORT_SAMPLES:
+        category["samples"].append(sample)
@@ -0,0 +1,164 @@
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger("yt-dlp-api.reservations")
+
+ADMISSION_LOCK = "disk_reservations"
+# Suggested wait before retrying a download turned away for lack of space
+RETRY_AFTER_SECONDS = 30
+
+
+class InsufficientStorage(Exception):
+    """`retry_after` is set when space may come free later, and None when the job can never fit."""
+
+    def __init__(self, needed: int, available: int, message: Optional[str] = None, retry_after: Optional[int] = None):
+        super().__init__(message or f"Not enough disk space: {needed} bytes needed, {available} available")
+        self.needed = needed
+        self.available = available
+        self.retry_after = retry_after
+
+
+class DiskReservations:
+    """Admission control for downloads against free space on the download volume.
+
+    A job reserves its estimated size before yt-dlp starts and releases it when it ends. A job is
+    admitted only if free space, minus the safety margin and every outstanding reservation, covers
+    its estimate; otherwise it waits for running jobs to finish. Each waiter holds a request thread,
+    so at most `max_waiters` per process wait at once and later jobs are turned away straight
+    away with a Retry-After hint. Reservations live in PostgreSQL so
+    all workers sharing the volume see them. Bytes a running job has already written count against
+    both free space and its reservation, so admission errs on the side of waiting.
+    """
+
+    def __init__(
+        self,
+        auth_manager,
+        download_dir: str,
+        margin: int,
+        size_factor: float = 2.0,
+        wait_timeout: float = 300.0,
+        poll_interval: float = 1.0,
+        stale_seconds: int = 3600,
+        max_waiters: int = 2,
+    ):
+        self.auth_manager = auth_manager
+        self.download_dir = download_dir
+        self.margin = margin
+        self.size_factor = size_factor
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.max_waiters = max_waiters
+        self._waiters = 0
+        self._waiters_lock = threading.Lock()
+
+    def estimate(self, probed_size: Optional[int], max_size: int) -> int:
+        """Bytes to reserve for a download whose probe reported `probed_size` (None if unknown).
+
+        The factor covers separate video and audio streams plus the merged output existing at once.
+        """
+        return int((probed_size or max_size) * self.size_factor)
+
+    def reserve(self, user_id, size: int) -> int:
+        """Reserve `size` bytes, waiting up to `wait_timeout` for space. Returns the reservation id.
+
+        Raises InsufficientStorage if the volume could never hold the job or no space came free in time.
+        """
+        capacity = shutil.disk_usage(self.download_dir).total - self.margin
+        if size > capacity:
+            raise InsufficientStorage(size, max(capacity, 0), "Download is larger than the storage volume allows")
+
+        reservation_id, available = self._try_reserve(user_id, size)
+        if reservation_id is not None:
+            return reservation_id
+
+        with self._waiters_lock:
+            if self._waiters >= self.max_waiters or self.wait_timeout <= 0:
+                raise InsufficientStorage(size, available, retry_after=RETRY_AFTER_SECONDS)
+            self._waiters += 1
+
+        try:
+            logger.info(f"Waiting for {size} bytes of disk space ({available} available)")
+            deadline = time.monotonic() + self.wait_timeout
+            while True:
+                if time.monotonic() >= deadline:
+                    raise InsufficientStorage(size, available, retry_after=RETRY_AFTER_SECONDS)
+                time.sleep(self.poll_interval)
+                reservation_id, available = self._try_reserve(user_id, size)
+                if reservation_id is not None:
+                    logger.info(f"Reservation {reservation_id} of {size} bytes admitted after waiting")
+                    return reservation_id
+        finally:
+            with self._waiters_lock:
+                self._waiters -= 1
+
+    def release(self, reservation_id: int):
+        try:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM disk_reservations WHERE id = %s", (reservation_id,))
+                conn.commit()
+        except Exception as e:
+            # The row stops counting once it expires and is removed by purge_expired
+            logger.error(f"Failed to release disk reservation {reservation_id}: {e}")
+
+    def purge_expired(self) -> int:
+        """Remove reservations left behind by workers that died mid-download."""
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM disk_reservations WHERE expires_at <= %s", (datetime.utcnow(),))
+            removed = cursor.rowcount
+            conn.commit()
+        if removed:
+            logger.info(f"Removed {removed} expired disk reservation(s)")
+        return removed
+
+    def stats(self) -> Dict:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(
+                """SELECT COUNT(*) AS reservations, COALESCE(SUM(bytes), 0) AS reserved_bytes
+                   FROM disk_reservations WHERE expires_at > %s""",
+                (datetime.utcnow(),),
+            )
+            row = cursor.fetchone()
+        free = shutil.disk_usage(self.download_dir).free
+        return {
+            "reservations": row["reservations"],
+            "reserved_bytes": row["reserved_bytes"],
+            "free_bytes": free,
+            "margin_bytes": self.margin,
+            "admittable_bytes": max(free - self.margin - row["reserved_bytes"], 0),
+            # Waiters are counted per worker process
+            "waiting_in_worker": self._waiters,
+            "max_waiters_per_worker": self.max_waiters,
+        }
+
+    def _try_reserve(self, user_id, size: int):
+        """Returns (reservation id, available bytes); the id is None if the job doesn't fit yet."""
+        now = datetime.utcnow()
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            # One admission decision at a time across workers, or two could claim the same space
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (ADMISSION_LOCK,))
+            cursor.execute("SELECT COALESCE(SUM(bytes), 0) FROM disk_reservations WHERE expires_at > %s", (now,))
+            reserved = cursor.fetchone()[0]
+            available = shutil.disk_usage(self.download_dir).free - self.margin - reserved
+
+            if size > available:
+                conn.rollback()
+                return None, max(available, 0)
+
+            cursor.execute(
+                "INSERT INTO disk_reservations (user_id, bytes, expires_at) VALUES (%s, %s, %s) RETURNING id",
+                (user_id, size, now + timedelta(seconds=self.stale_seconds)),
+            )
+            reservation_id = cursor.fetchone()[0]
+            conn.commit()
+        return reservation_id, available - size
@@ -0,0 +1,229 @@
+import re
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List
+
+logger = logging.getLogger("yt-dlp-api.sessions")
+
+PARTITION_NAME_RE = re.compile(r"^sessions_p(\d{4})(\d{2})$")
+
+# Monthly partitions created ahead of the current month
+PARTITIONS_AHEAD = 2
+
+# A unique constraint on a partitioned table must include the partition key, so session_token alone
+# can't be declared unique: this one only rules out duplicate (token, expiry) pairs and serves as the
+# token lookup index. AuthManager.create_session checks that a new token is unused, under a per-token
+# advisory lock, which is what keeps tokens unique.
+TOKEN_CONSTRAINT = "sessions_token_expires_key"
+
+# Lets the sweep find logged-out sessions without a full scan (see migrations/0006)
+SWEEP_INDEX = "CREATE INDEX IF NOT EXISTS idx_sessions_inactive ON sessions(id) WHERE is_active = FALSE"
+
+
+class SessionLifecycle:
+    """Removes expired and logged-out sessions so the sessions table and its token index stay small.
+
+    On a plain table, dead sessions are deleted in bounded batches. When the table is range-partitioned
+    by expires_at (see `partition_table`), whole monthly partitions past the retention window are dropped
+    instead and upcoming partitions are created ahead of time.
+    """
+
+    def __init__(self, auth_manager, retention_hours: int = 24, batch_size: int = 1000, max_batches: int = 100):
+        self.auth_manager = auth_manager
+        self.retention = timedelta(hours=retention_hours)
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._last_sweep = None
+
+    @property
+    def last_sweep(self) -> Optional[Dict]:
+        return self._last_sweep
+
+    def is_partitioned(self) -> bool:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'sessions'::regclass)")
+            return cursor.fetchone()[0]
+
+    def sweep(self) -> Dict:
+        started = time.time()
+        cutoff = datetime.utcnow() - self.retention
+        partitioned = self.is_partitioned()
+
+        dropped = []
+        if partitioned:
+            self._create_upcoming_partitions()
+            dropped = self._drop_expired_partitions(cutoff)
+
+        deleted = 0
+        for _ in range(self.max_batches):
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """DELETE FROM sessions WHERE id IN (
+                           SELECT id FROM sessions
+                           WHERE expires_at < %s OR is_active = FALSE
+                           LIMIT %s
+                       )""",
+                    (cutoff, self.batch_size),
+                )
+                batch_deleted = cursor.rowcount
+                conn.commit()
+
+            deleted += batch_deleted
+            if batch_deleted < self.batch_size:
+                break
+            time.sleep(0.05)
+
+        self._last_sweep = {
+            "at": datetime.utcnow().isoformat(),
+            "deleted_sessions": deleted,
+            "dropped_partitions": dropped,
+            "duration_seconds": round(time.time() - started, 3),
+        }
+        if deleted or dropped:
+            logger.info(f"Session sweep removed {deleted} session(s) and {len(dropped)} partition(s)")
+        return self._last_sweep
+
+    def stats(self) -> Dict:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT COALESCE(SUM(pg_total_relation_size(c.oid)), 0),
+                          COALESCE(SUM(pg_indexes_size(c.oid)), 0),
+                          COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint,
+                          COUNT(*) - 1
+                   FROM pg_class c
+                   WHERE c.oid = 'sessions'::regclass
+                   OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = 'sessions'::regclass)"""
+            )
+            total_bytes, index_bytes, estimated_rows, partitions = cursor.fetchone()
+
+            cursor.execute(
+                "SELECT COUNT(*) FROM sessions WHERE is_active = TRUE AND expires_at > %s", (datetime.utcnow(),)
+            )
+            active_sessions = cursor.fetchone()[0]
+
+        return {
+            "total_bytes": total_bytes,
+            "index_bytes": index_bytes,
+            "estimated_rows": estimated_rows,
+            "active_sessions": active_sessions,
+            "partitioned": partitions > 0,
+            "partitions": partitions,
+            "last_sweep": self._last_sweep,
+        }
+
+    def partition_table(self):
+        """Convert sessions into a table range-partitioned by month of expires_at.
+
+        Only sessions that are still valid are carried over. Runs in one transaction holding an
+        exclusive lock on sessions, so logins and session checks pause for its duration.
+        """
+        if self.is_partitioned():
+            # Tables partitioned before the token constraint and sweep index were carried over
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT 1 FROM pg_constraint WHERE conrelid = 'sessions'::regclass AND conname = %s",
+                    (TOKEN_CONSTRAINT,),
+                )
+                if cursor.fetchone() is None:
+                    cursor.execute(
+                        f"ALTER TABLE sessions ADD CONSTRAINT {TOKEN_CONSTRAINT} UNIQUE (session_token, expires_at)"
+                    )
+                    cursor.execute("DROP INDEX IF EXISTS idx_sessions_token")
+                cursor.execute(SWEEP_INDEX)
+                conn.commit()
+            return
+
+        now = datetime.utcnow()
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("LOCK TABLE sessions IN ACCESS EXCLUSIVE MODE")
+            cursor.execute(
+                f"""CREATE TABLE sessions_partitioned (
+                       id INTEGER NOT NULL DEFAULT nextval('sessions_id_seq'),
+                       user_id UUID NOT NULL,
+                       session_token VARCHAR(255) NOT NULL,
+                       created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                       expires_at TIMESTAMP NOT NULL,
+                       is_active BOOLEAN NOT NULL DEFAULT TRUE,
+                       PRIMARY KEY (id, expires_at),
+                       CONSTRAINT {TOKEN_CONSTRAINT} UNIQUE (session_token, expires_at),
+                       FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+                   ) PARTITION BY RANGE (expires_at)"""
+            )
+
+            cursor.execute("SELECT MAX(expires_at) FROM sessions WHERE is_active = TRUE")
+            latest = cursor.fetchone()[0] or now
+            for month_start in _month_range(now, max(latest, _add_months(now, PARTITIONS_AHEAD))):
+                _create_partition(cursor, month_start, parent="sessions_partitioned")
+
+            cursor.execute(
+                """INSERT INTO sessions_partitioned (id, user_id, session_token, created_at, expires_at, is_active)
+                   SELECT id, user_id, session_token, created_at, expires_at, is_active
+                   FROM sessions WHERE is_active = TRUE AND expires_at > %s""",
+                (now,),
+            )
+            carried = cursor.rowcount
+
+            cursor.execute("ALTER SEQUENCE sessions_id_seq OWNED BY NONE")
+            cursor.execute("DROP TABLE sessions")
+            cursor.execute("ALTER TABLE sessions_partitioned RENAME TO sessions")
+            cursor.execute("ALTER SEQUENCE sessions_id_seq OWNED BY sessions.id")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)")
+            cursor.execute(SWEEP_INDEX)
+            conn.commit()
+
+        logger.info(f"Converted sessions to a partitioned table, carried over {carried} active session(s)")
+
+    def _create_upcoming_partitions(self):
+        now = datetime.utcnow()
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            for month_start in _month_range(now, _add_months(now, PARTITIONS_AHEAD)):
+                _create_partition(cursor, month_start)
+            conn.commit()
+
+    def _drop_expired_partitions(self, cutoff: datetime) -> List[str]:
+        dropped = []
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                   WHERE i.inhparent = 'sessions'::regclass"""
+            )
+            for (name,) in cursor.fetchall():
+                match = PARTITION_NAME_RE.match(name)
+                if not match:
+                    continue
+                month_start = datetime(int(match.group(1)), int(match.group(2)), 1)
+                if _add_months(month_start, 1) <= cutoff:
+                    cursor.execute(f"DROP TABLE {name}")
+                    dropped.append(name)
+            conn.commit()
+        return dropped
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _month_range(start: datetime, end: datetime):
+    month = datetime(start.year, start.month, 1)
+    while month <= end:
+        yield month
+        month = _add_months(month, 1)
+
+
+def _create_partition(cursor, month_start: datetime, parent: str = "sessions"):
+    name = f"sessions_p{month_start:%Y%m}"
+    cursor.execute(
+        f"""CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent}
+            FOR VALUES FROM (%s) TO (%s)""",
+        (month_start, _add_months(month_start, 1)),
+    )
@@ -0,0 +1,67 @@
+import logging
+from typing import Optional, Dict
+
+from utils import is_valid_uuid
+
+logger = logging.getLogger("yt-dlp-api.storage")
+
+
+class StorageAccounting:
+    """Reads the usage counters maintained by the downloaded_files trigger and corrects drift."""
+
+    def __init__(self, auth_manager):
+        self.auth_manager = auth_manager
+
+    def get_usage(self, user_id=None) -> Dict:
+        usage = {"global": None, "user": None}
+
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            # Totals across users are summed from the per-user rows; there is no shared global row
+            cursor.execute(
+                "SELECT COALESCE(SUM(file_count), 0)::bigint, COALESCE(SUM(total_bytes), 0)::bigint FROM storage_usage"
+            )
+            file_count, total_bytes = cursor.fetchone()
+            usage["global"] = {"file_count": file_count, "total_bytes": total_bytes}
+
+            if user_id is not None and is_valid_uuid(user_id):
+                cursor.execute("SELECT file_count, total_bytes FROM storage_usage WHERE user_id = %s", (str(user_id),))
+                file_count, total_bytes = cursor.fetchone() or (0, 0)
+                usage["user"] = {"file_count": file_count, "total_bytes": total_bytes}
+
+        return usage
+
+    def reconcile(self) -> Optional[int]:
+        """Recompute counters from downloaded_files and return the number of rows corrected."""
+        try:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+
+                # Block writers (not readers) so the recount can't race the trigger
+                cursor.execute("LOCK TABLE downloaded_files IN SHARE MODE")
+                cursor.execute(
+                    """INSERT INTO storage_usage (user_id, file_count, total_bytes, updated_at)
+                       SELECT user_id, COUNT(*), COALESCE(SUM(file_size), 0), CURRENT_TIMESTAMP
+                       FROM downloaded_files GROUP BY user_id
+                       ON CONFLICT (user_id) DO UPDATE
+                       SET file_count = EXCLUDED.file_count,
+                           total_bytes = EXCLUDED.total_bytes,
+                           updated_at = EXCLUDED.updated_at
+                       WHERE storage_usage.file_count <> EXCLUDED.file_count
+                          OR storage_usage.total_bytes <> EXCLUDED.total_bytes"""
+                )
+                corrected = cursor.rowcount
+
+                cursor.execute(
+                    """DELETE FROM storage_usage s
+                       WHERE NOT EXISTS (SELECT 1 FROM downloaded_files f WHERE f.user_id = s.user_id)"""
+                )
+                corrected += cursor.rowcount
+                conn.commit()
+
+                if corrected:
+                    logger.info(f"Storage usage reconciled, corrected {corrected} counter row(s)")
+                return corrected
+        except Exception as e:
+            logger.error(f"Error reconciling storage usage: {e}")
+            return None
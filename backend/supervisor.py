@@ -0,0 +1,198 @@
+"""Supervised subprocess execution for yt-dlp and the ffmpeg processes it starts.
+
+Each command runs in its own process group so that a timeout kills the whole tree, not just
+yt-dlp. Output is streamed line by line into bounded buffers that keep only the most recent
+bytes, and resource usage of the finished tree is read from wait4().
+"""
+
+import os
+import time
+import signal
+import logging
+import threading
+import subprocess
+from collections import deque
+from typing import Callable, List, Optional
+
+logger = logging.getLogger("yt-dlp-api.supervisor")
+
+# Longest single line handed to on_line; longer lines are split
+MAX_LINE_BYTES = 64 * 1024
+POLL_INTERVAL = 0.1
+KILL_GRACE_SECONDS = 5
+
+
+class OutputBuffer:
+    """Keeps the last `max_bytes` of a stream, dropping the oldest lines first."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.dropped_bytes = 0
+        self._lines = deque()
+        self._size = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped_bytes > 0
+
+    def append(self, line: str):
+        self._lines.append(line)
+        self._size += len(line)
+        while self._size > self.max_bytes and self._lines:
+            dropped = self._lines.popleft()
+            self._size -= len(dropped)
+            self.dropped_bytes += len(dropped)
+
+    def getvalue(self) -> str:
+        return "".join(self._lines)
+
+
+class ProcessResult:
+    """Outcome of a supervised run.
+
+    `returncode` is None when the process was killed for a timeout; `timed_out` is then "total"
+    or "idle". CPU times and `max_rss` (bytes) cover the process and every descendant it waited for.
+    """
+
+    def __init__(
+        self,
+        returncode: Optional[int],
+        stdout: OutputBuffer,
+        stderr: OutputBuffer,
+        duration: float,
+        timed_out: Optional[str] = None,
+        rusage=None,
+    ):
+        self.returncode = returncode
+        self.stdout = stdout.getvalue()
+        self.stderr = stderr.getvalue()
+        self.stdout_truncated = stdout.truncated
+        self.stderr_truncated = stderr.truncated
+        self.duration = duration
+        self.timed_out = timed_out
+        self.cpu_user = rusage.ru_utime if rusage else 0.0
+        self.cpu_system = rusage.ru_stime if rusage else 0.0
+        # ru_maxrss is in kilobytes on Linux
+        self.max_rss = rusage.ru_maxrss * 1024 if rusage else 0
+
+    def as_dict(self):
+        return {
+            "returncode": self.returncode,
+            "timed_out": self.timed_out,
+            "duration": round(self.duration, 3),
+            "cpu_user": round(self.cpu_user, 3),
+            "cpu_system": round(self.cpu_system, 3),
+            "max_rss": self.max_rss,
+            "stdout_truncated": self.stdout_truncated,
+            "stderr_truncated": self.stderr_truncated,
+        }
+
+
+def run(
+    cmd: List[str],
+    timeout: float,
+    idle_timeout: Optional[float] = None,
+    output_limit: int = 8 * 1024 * 1024,
+    on_line: Optional[Callable[[str], None]] = None,
+    progress_file: Optional[str] = None,
+) -> ProcessResult:
+    """Run `cmd` to completion under a total and an optional idle (no output) timeout.
+
+    `on_line` is called with each stdout line as it arrives, from a reader thread. `progress_file`
+    is a file a process in the tree writes progress to (ffmpeg's -progress, whose output yt-dlp
+    swallows); it growing counts as output for the idle timeout.
+    """
+    started = time.monotonic()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    stdout = OutputBuffer(output_limit)
+    stderr = OutputBuffer(output_limit)
+    last_output = [started]
+    progress_size = 0
+
+    def pump(stream, buffer: OutputBuffer, callback):
+        for raw in iter(lambda: stream.readline(MAX_LINE_BYTES), b""):
+            last_output[0] = time.monotonic()
+            line = raw.decode("utf-8", errors="replace")
+            buffer.append(line)
+            if callback is not None:
+                try:
+                    callback(line)
+                except Exception as e:
+                    logger.error(f"Output callback failed: {e}")
+        stream.close()
+
+    readers = [
+        threading.Thread(target=pump, args=(process.stdout, stdout, on_line), daemon=True),
+        threading.Thread(target=pump, args=(process.stderr, stderr, None), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = None
+    status, rusage = None, None
+    try:
+        while True:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+
+            now = time.monotonic()
+            if progress_file and idle_timeout:
+                size = _file_size(progress_file)
+                if size != progress_size:
+                    progress_size = size
+                    last_output[0] = now
+            if now - started > timeout:
+                timed_out = "total"
+            elif idle_timeout and now - last_output[0] > idle_timeout:
+                timed_out = "idle"
+            if timed_out:
+                logger.warning(f"Killing process group {process.pid} ({timed_out} timeout): {cmd[0]}")
+                status, rusage = _kill_group(process.pid)
+                break
+
+            time.sleep(POLL_INTERVAL)
+    except BaseException:
+        # Never leave a process tree behind, whatever interrupted us
+        status, rusage = _kill_group(process.pid)
+        raise
+    finally:
+        process.returncode = os.waitstatus_to_exitcode(status) if status is not None else -signal.SIGKILL
+        for reader in readers:
+            reader.join(5)
+
+    returncode = None if timed_out else process.returncode
+    return ProcessResult(returncode, stdout, stderr, time.monotonic() - started, timed_out, rusage)
+
+
+def _kill_group(pgid: int):
+    """SIGTERM the process group, SIGKILL it after a grace period, and reap the leader.
+
+    The leader is reaped last so its pid, and with it the group id, cannot be reused meanwhile.
+    """
+    _signal_group(pgid, signal.SIGTERM)
+    deadline = time.monotonic() + KILL_GRACE_SECONDS
+    while time.monotonic() < deadline:
+        # WNOWAIT leaves the exited leader unreaped
+        if os.waitid(os.P_PID, pgid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None:
+            break
+        time.sleep(POLL_INTERVAL)
+
+    # ffmpeg children may outlive yt-dlp, so the group is killed even if the leader exited
+    _signal_group(pgid, signal.SIGKILL)
+    _, status, rusage = os.wait4(pgid, 0)
+    return status, rusage
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def _signal_group(pgid: int, sig: int):
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        pass
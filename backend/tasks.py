@@ -0,0 +1,43 @@
+import threading
+import logging
+from typing import Callable
+
+logger = logging.getLogger("yt-dlp-api.tasks")
+
+
+class PeriodicTask:
+    """Runs a callable on a daemon thread every `interval` seconds until stopped."""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], None], run_immediately: bool = False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_immediately = run_immediately
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"Started periodic task {self.name} (every {self.interval}s)")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        if not self.run_immediately and self._stop_event.wait(self.interval):
+            return
+
+        while not self._stop_event.is_set():
+            try:
+                self.func()
+            except Exception as e:
+                logger.exception(f"Periodic task {self.name} failed: {e}")
+
+            if self._stop_event.wait(self.interval):
+                return
@@ -0,0 +1,214 @@
+import re
+import time
+import json
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger("yt-dlp-api.traces")
+
+# yt-dlp prefixes its output lines with the component that produced them
+YTDLP_TAG_RE = re.compile(r"^\[(\w+)\]")
+POSTPROCESSOR_PHASES = {"Merger": "merge"}
+POSTPROCESSOR_TAGS = {
+    "Merger",
+    "ExtractAudio",
+    "VideoConvertor",
+    "VideoRemuxer",
+    "Metadata",
+    "EmbedThumbnail",
+    "EmbedSubtitle",
+    "FixupM3u8",
+    "FixupM4a",
+    "FixupStretched",
+    "FixupDuplicateMoov",
+    "FixupTimestamp",
+    "FixupDuration",
+}
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class PhaseTimer:
+    """Accumulates wall time per named phase. Only one phase runs at a time."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._started = time.monotonic()
+        self._current = None
+        self._current_started = None
+
+    @property
+    def current(self) -> Optional[str]:
+        return self._current
+
+    def start(self, phase: str):
+        if phase == self._current:
+            return
+        self.stop()
+        self._current = phase
+        self._current_started = time.monotonic()
+
+    def stop(self):
+        if self._current is not None:
+            elapsed = time.monotonic() - self._current_started
+            self.phases[self._current] = self.phases.get(self._current, 0.0) + elapsed
+            self._current = None
+
+    @contextmanager
+    def phase(self, name: str):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def total(self) -> float:
+        return time.monotonic() - self._started
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(seconds, 3) for name, seconds in self.phases.items()}
+
+
+class YtdlpPhaseTracker:
+    """Moves a PhaseTimer between extract, transfer, merge and postprocess as yt-dlp output arrives."""
+
+    def __init__(self, timer: PhaseTimer):
+        self.timer = timer
+        self.postprocessors: List[str] = []
+
+    def begin(self):
+        self.timer.start("extract")
+
+    def feed(self, line: str):
+        match = YTDLP_TAG_RE.match(line)
+        if not match:
+            return
+
+        tag = match.group(1)
+        if tag == "download":
+            # Later [download] lines (e.g. "has already been downloaded") don't pull a postprocessor phase back
+            if self.timer.current in (None, "extract", "transfer"):
+                self.timer.start("transfer")
+        elif tag in POSTPROCESSOR_TAGS:
+            if tag not in self.postprocessors:
+                self.postprocessors.append(tag)
+            self.timer.start(POSTPROCESSOR_PHASES.get(tag, "postprocess"))
+
+
+def record_download(
+    auth_manager,
+    user_id,
+    timer: PhaseTimer,
+    success: bool,
+    extractor: Optional[str] = None,
+    format_id: Optional[str] = None,
+    file_id: Optional[str] = None,
+    file_bytes: Optional[int] = None,
+    postprocessors: Optional[List[str]] = None,
+    error: Optional[str] = None,
+    domain: Optional[str] = None,
+    reused: Optional[str] = None,
+):
+    """Persist one download's phase breakdown. Failures are logged, never raised.
+
+    `reused` is set ('own' or 'linked') when the download was answered from a stored copy.
+
+    The insert also updates the usage rollups (trigger in migrations/0018_usage_rollups.sql).
+    """
+    try:
+        with auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO download_metrics
+                   (user_id, file_id, extractor, format_id, success, bytes, postprocessors,
+                    total_seconds, phases, error, domain, reused)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (
+                    user_id,
+                    file_id,
+                    extractor,
+                    format_id,
+                    success,
+                    file_bytes,
+                    ",".join(postprocessors) if postprocessors else None,
+                    round(timer.total(), 3),
+                    json.dumps(timer.as_dict()),
+                    error[:1000] if error else None,
+                    domain[:255] if domain else None,
+                    reused,
+                ),
+            )
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Failed to record download metrics: {e}")
+
+
+def summarize(auth_manager, hours: int) -> Dict:
+    """Percentiles of total and per-phase download time over the last `hours`, overall and per extractor.
+
+    Downloads answered from a stored copy are counted under `reused` but left out of the timings.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    percentiles = list(PERCENTILES)
+
+    with auth_manager.connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """SELECT COALESCE(extractor, 'unknown') AS extractor,
+                      COUNT(*) AS downloads,
+                      COUNT(*) FILTER (WHERE NOT success) AS failures,
+                      COUNT(*) FILTER (WHERE reused IS NOT NULL) AS reused,
+                      COALESCE(SUM(bytes), 0) AS bytes,
+                      percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY total_seconds)
+                          FILTER (WHERE reused IS NULL) AS total
+               FROM download_metrics
+               WHERE created_at >= %s
+               GROUP BY GROUPING SETS ((COALESCE(extractor, 'unknown')), ())""",
+            (percentiles, since),
+        )
+        totals = cursor.fetchall()
+
+        cursor.execute(
+            """SELECT COALESCE(m.extractor, 'unknown') AS extractor,
+                      p.key AS phase,
+                      COUNT(*) AS samples,
+                      percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY p.value::float8) AS seconds
+               FROM download_metrics m, jsonb_each_text(m.phases) p
+               WHERE m.created_at >= %s AND m.success AND m.reused IS NULL
+               GROUP BY GROUPING SETS ((COALESCE(m.extractor, 'unknown'), p.key), (p.key))""",
+            (percentiles, since),
+        )
+        phases = cursor.fetchall()
+
+    # GROUPING SETS leaves the extractor NULL on the overall rows
+    summary = {"window_hours": hours, "since": since.isoformat(), "overall": None, "extractors": {}}
+    for row in totals:
+        entry = {
+            "downloads": row["downloads"],
+            "failures": row["failures"],
+            "reused": row["reused"],
+            "bytes": row["bytes"],
+            "total_seconds": _percentile_dict(row["total"]),
+            "phases": {},
+        }
+        if row["extractor"] is None:
+            summary["overall"] = entry
+        else:
+            summary["extractors"][row["extractor"]] = entry
+
+    for row in phases:
+        target = summary["overall"] if row["extractor"] is None else summary["extractors"].get(row["extractor"])
+        if target is not None:
+            target["phases"][row["phase"]] = {"samples": row["samples"], **_percentile_dict(row["seconds"])}
+
+    return summary
+
+
+def _percentile_dict(values) -> Dict[str, Optional[float]]:
+    values = values or [None] * len(PERCENTILES)
+    return {
+        f"p{int(pct * 100)}": round(value, 3) if value is not None else None for pct, value in zip(PERCENTILES, values)
+    }
@@ -0,0 +1,136 @@
+"""Named transcode profiles and single-pass multi-rendition encoding.
+
+A profile fixes codec, speed preset, quality (CRF), maximum height and audio bitrate. Profiles are
+applied after the download by `ladder_command`, which decodes the source once and encodes every
+requested rendition (one for a single profile) from that single decode.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# Codec name -> (ffmpeg video encoder, ffmpeg audio encoder, container extension)
+CODECS = {
+    "h264": ("libx264", "aac", "mp4"),
+    "h265": ("libx265", "aac", "mp4"),
+    "vp9": ("libvpx-vp9", "libopus", "webm"),
+}
+
+# Built-in profiles; TRANSCODE_PROFILES can override fields of these or add new ones.
+# "compat" reproduces the encode every video download used to get.
+DEFAULT_PROFILES = {
+    "compat": {
+        "codec": "h264",
+        "preset": "ultrafast",
+        "crf": 23,
+        "max_height": None,
+        "audio_bitrate": "128k",
+        "h264_profile": "baseline",
+        "level": "3.0",
+    },
+    "mobile": {"codec": "h264", "preset": "veryfast", "crf": 28, "max_height": 480, "audio_bitrate": "96k"},
+    "balanced": {"codec": "h264", "preset": "medium", "crf": 23, "max_height": 1080, "audio_bitrate": "128k"},
+    "archive": {"codec": "h264", "preset": "slow", "crf": 18, "max_height": None, "audio_bitrate": "192k"},
+}
+PROFILE_FIELDS = ("codec", "preset", "crf", "max_height", "audio_bitrate", "h264_profile", "level")
+
+
+class TranscodeProfile:
+    def __init__(
+        self,
+        name: str,
+        codec: str,
+        preset: str,
+        crf: int,
+        max_height: Optional[int] = None,
+        audio_bitrate: str = "128k",
+        h264_profile: Optional[str] = None,
+        level: Optional[str] = None,
+    ):
+        if codec not in CODECS:
+            raise ValueError(f"profile {name}: codec must be one of {', '.join(CODECS)}, got {codec}")
+        self.name = name
+        self.codec = codec
+        self.preset = preset
+        self.crf = int(crf)
+        self.max_height = int(max_height) if max_height else None
+        self.audio_bitrate = audio_bitrate
+        self.h264_profile = h264_profile
+        self.level = level
+
+    @property
+    def extension(self) -> str:
+        return CODECS[self.codec][2]
+
+    def scale_filter(self) -> Optional[str]:
+        """Downscale to max_height keeping the aspect ratio (even width); smaller sources are left alone."""
+        if not self.max_height:
+            return None
+        return f"scale=-2:'min({self.max_height},ih)'"
+
+    def encoder_args(self, threads: int = 0) -> List[str]:
+        video_encoder, audio_encoder, extension = CODECS[self.codec]
+        args = ["-c:v", video_encoder, "-crf", str(self.crf)]
+        if self.codec == "vp9":
+            # libvpx-vp9 needs a zero bitrate for CRF mode and takes speed via -deadline/-cpu-used
+            args += ["-b:v", "0", "-deadline", "good", "-cpu-used", "4"]
+        else:
+            args += ["-preset", self.preset]
+        if self.codec == "h264" and self.h264_profile:
+            args += ["-profile:v", self.h264_profile]
+        if self.level:
+            args += ["-level", self.level]
+        args += ["-c:a", audio_encoder, "-b:a", self.audio_bitrate]
+        if extension == "mp4":
+            args += ["-movflags", "+faststart"]
+        if threads:
+            args += ["-threads", str(threads)]
+        return args
+
+    def as_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in PROFILE_FIELDS}
+
+
+def load_profiles(overrides: Optional[Dict[str, Dict]] = None) -> Dict[str, TranscodeProfile]:
+    """Build the profile registry from the built-ins plus `overrides` (name -> fields). Raises ValueError."""
+    merged = {name: dict(fields) for name, fields in DEFAULT_PROFILES.items()}
+    for name, fields in (overrides or {}).items():
+        if not isinstance(fields, dict):
+            raise ValueError(f"profile {name} must be an object")
+        unknown = set(fields) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"profile {name}: unknown field(s) {', '.join(sorted(unknown))}")
+        merged.setdefault(name, {}).update(fields)
+
+    profiles = {}
+    for name, fields in merged.items():
+        missing = {"codec", "preset", "crf"} - set(fields)
+        if missing:
+            raise ValueError(f"profile {name}: missing field(s) {', '.join(sorted(missing))}")
+        profiles[name] = TranscodeProfile(name, **fields)
+    return profiles
+
+
+def ladder_command(
+    source: str, outputs: List[Tuple[TranscodeProfile, str]], threads: int = 0, progress_file: Optional[str] = None
+) -> List[str]:
+    """ffmpeg command that decodes `source` once and encodes one output per (profile, path).
+
+    The decoded video is split in a filter graph and scaled per rendition; audio is decoded once
+    and fed to every encoder. With `progress_file`, ffmpeg writes its encoding progress there (see
+    supervisor.run).
+    """
+    count = len(outputs)
+    labels = [f"v{index}" for index in range(count)]
+    graph = [f"[0:v]split={count}" + "".join(f"[s{index}]" for index in range(count))]
+    for index, (profile, _) in enumerate(outputs):
+        scale = profile.scale_filter() or "null"
+        graph.append(f"[s{index}]{scale}[{labels[index]}]")
+
+    cmd = ["ffmpeg", "-hide_banner", "-nostdin", "-y"]
+    if progress_file:
+        cmd += ["-progress", progress_file]
+    cmd += ["-i", source, "-filter_complex", ";".join(graph)]
+    for index, (profile, path) in enumerate(outputs):
+        # "?" keeps video-only sources working
+        cmd += ["-map", f"[{labels[index]}]", "-map", "0:a:0?"]
+        cmd += profile.encoder_args(threads) + [path]
+    return cmd
@@ -0,0 +1,159 @@
+"""URL canonicalization for the major video platforms.
+
+Maps the many URL shapes a platform uses for one video (short links, mobile hosts, share
+parameters) to a single canonical URL plus the (extractor_key, video_id) pair yt-dlp reports
+for it, so repeat requests can be matched without running yt-dlp. Extractor keys follow
+yt-dlp's names. URLs on other hosts are returned unchanged with no key.
+"""
+
+import re
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Matches yt-dlp's own YouTube ID check
+YOUTUBE_ID_RE = re.compile(r"^[0-9A-Za-z_-]{11}$")
+
+
+class CanonicalURL:
+    def __init__(self, url: str, extractor_key: Optional[str] = None, video_id: Optional[str] = None):
+        self.url = url
+        self.extractor_key = extractor_key
+        self.video_id = video_id
+
+    @property
+    def is_known(self) -> bool:
+        return self.extractor_key is not None and self.video_id is not None
+
+    def __repr__(self):
+        return f"CanonicalURL({self.url!r}, {self.extractor_key!r}, {self.video_id!r})"
+
+
+def _youtube(host: str, path: str, query: Dict) -> Optional[Tuple[str, str, str]]:
+    video_id = None
+    if host == "youtu.be":
+        video_id = path.strip("/").split("/")[0]
+    elif path == "/watch":
+        video_id = query.get("v", [None])[0]
+    else:
+        match = re.match(r"^/(?:shorts|embed|live|v)/([^/?]+)", path)
+        if match:
+            video_id = match.group(1)
+
+    if not video_id or not YOUTUBE_ID_RE.match(video_id):
+        return None
+    return f"https://www.youtube.com/watch?v={video_id}", "Youtube", video_id
+
+
+def _tiktok(host: str, path: str, query: Dict) -> Optional[Tuple[str, str, str]]:
+    # vm.tiktok.com short links need a redirect to resolve, so they stay unknown
+    match = re.match(r"^/@([^/]+)/video/(\d+)", path)
+    if not match:
+        return None
+    user, video_id = match.groups()
+    return f"https://www.tiktok.com/@{user}/video/{video_id}", "TikTok", video_id
+
+
+def _instagram(host: str, path: str, query: Dict) -> Optional[Tuple[str, str, str]]:
+    match = re.match(r"^/(?:[^/]+/)?(?:p|reels?|tv)/([A-Za-z0-9_-]+)", path)
+    if not match:
+        return None
+    video_id = match.group(1)
+    return f"https://www.instagram.com/p/{video_id}/", "Instagram", video_id
+
+
+def _twitter(host: str, path: str, query: Dict) -> Optional[Tuple[str, str, str]]:
+    match = re.match(r"^/(?:[^/]+|i/web)/status(?:es)?/(\d+)", path)
+    if not match:
+        return None
+    video_id = match.group(1)
+    return f"https://twitter.com/i/web/status/{video_id}", "Twitter", video_id
+
+
+def _facebook(host: str, path: str, query: Dict) -> Optional[Tuple[str, str, str]]:
+    video_id = None
+    if path.rstrip("/") == "/watch":
+        video_id = query.get("v", [None])[0]
+    else:
+        match = re.match(r"^/(?:[^/]+/videos/(?:[^/]+/)?|reel/)(\d+)", path)
+        if match:
+            video_id = match.group(1)
+
+    if not video_id or not video_id.isdigit():
+        return None
+    return f"https://www.facebook.com/watch/?v={video_id}", "Facebook", video_id
+
+
+def _vimeo(host: str, path: str, query: Dict) -> Optional[Tuple[str, str, str]]:
+    match = re.match(r"^/(?:video/)?(\d+)(?:/([0-9a-f]+))?/?$", path)
+    if not match:
+        return None
+    video_id, unlisted_hash = match.group(1), match.group(2) or query.get("h", [None])[0]
+    if unlisted_hash:
+        # Unlisted videos can't be fetched without their hash, and a copy must not be handed to
+        # someone who only knows the id, so the hash is part of both the URL and the id
+        if not re.match(r"^[0-9a-f]+$", unlisted_hash):
+            return None
+        return f"https://vimeo.com/{video_id}/{unlisted_hash}", "Vimeo", f"{video_id}/{unlisted_hash}"
+    return f"https://vimeo.com/{video_id}", "Vimeo", video_id
+
+
+def _dailymotion(host: str, path: str, query: Dict) -> Optional[Tuple[str, str, str]]:
+    match = re.match(r"^/video/([a-zA-Z0-9]+)", path) if host != "dai.ly" else re.match(r"^/([a-zA-Z0-9]+)", path)
+    if not match:
+        return None
+    video_id = match.group(1)
+    return f"https://www.dailymotion.com/video/{video_id}", "DailyMotion", video_id
+
+
+# Host (without "www.") -> parser
+PLATFORMS: Dict[str, Callable] = {
+    "youtube.com": _youtube,
+    "m.youtube.com": _youtube,
+    "music.youtube.com": _youtube,
+    "youtube-nocookie.com": _youtube,
+    "youtu.be": _youtube,
+    "tiktok.com": _tiktok,
+    "m.tiktok.com": _tiktok,
+    "instagram.com": _instagram,
+    "twitter.com": _twitter,
+    "mobile.twitter.com": _twitter,
+    "x.com": _twitter,
+    "facebook.com": _facebook,
+    "m.facebook.com": _facebook,
+    "web.facebook.com": _facebook,
+    "vimeo.com": _vimeo,
+    "player.vimeo.com": _vimeo,
+    "dailymotion.com": _dailymotion,
+    "dai.ly": _dailymotion,
+}
+
+
+def domain_of(url: str) -> Optional[str]:
+    """Lower-cased host of `url` without "www.", for grouping usage by site."""
+    try:
+        host = (urlsplit(url.strip()).hostname or "").lower()
+    except ValueError:
+        return None
+    return (host[4:] if host.startswith("www.") else host) or None
+
+
+def canonicalize(url: str) -> CanonicalURL:
+    """Canonical form of `url`. Unrecognised URLs come back as given, with no extractor key or video id."""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return CanonicalURL(url)
+
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    parser = PLATFORMS.get(host)
+    if parser is None:
+        return CanonicalURL(url)
+
+    # The canonical URL is rebuilt from the id alone, so share and tracking parameters never survive
+    result = parser(host, parts.path, parse_qs(parts.query))
+    if result is None:
+        return CanonicalURL(url)
+    return CanonicalURL(*result)
@@ -1,11 +1,17 @@
 import os
 import re
+import json
+import uuid
+import base64
 import unicodedata
-from typing import Tuple, Optional
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple
 
 
 MAX_FILE_SIZE = 300 * 1024 * 1024
 MAX_FILENAME_LENGTH = 100
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
 
 
 def sanitize_user_id(user_id: str) -> str:
@@ -71,3 +77,43 @@ def validate_url(url: str) -> Tuple[bool, Optional[str]]:
         return False, "URL too long"
 
     return True, None
+
+
+def is_valid_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+def parse_page_size(value: Optional[str], default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    if value is None or value == "":
+        return default
+
+    page_size = int(value)
+    if page_size < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(page_size, maximum)
+
+
+def encode_cursor(created_at: datetime, row_id: Any) -> str:
+    payload = json.dumps([created_at.isoformat(), str(row_id)]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, id_type: Callable[[Any], Any] = str) -> Tuple[datetime, Any]:
+    """Reverse `encode_cursor`. `id_type` converts the row id and must reject ids of another table's type."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(created_at, str) or not isinstance(row_id, str):
+            raise ValueError("Invalid cursor")
+        return datetime.fromisoformat(created_at), id_type(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def uuid_id(value: str) -> str:
+    """Cursor id type for tables keyed by UUID."""
+    return str(uuid.UUID(value))
@@ -0,0 +1,343 @@
+import hmac
+import json
+import time
+import random
+import socket
+import secrets
+import hashlib
+import logging
+import ipaddress
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from psycopg2.extras import RealDictCursor
+
+import metrics
+
+logger = logging.getLogger("yt-dlp-api.webhooks")
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+# Response bodies from receivers are only kept for troubleshooting
+MAX_ERROR_LENGTH = 500
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    """HMAC-SHA256 over "<timestamp>.<body>", so a captured delivery can't be replayed with a new timestamp."""
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def validate_callback_url(url: str, allow_private: bool = False) -> Tuple[bool, Optional[str]]:
+    if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+        return False, "callback_url must start with http:// or https://"
+    if len(url) > 2048:
+        return False, "callback_url too long"
+    if not urlsplit(url).hostname:
+        return False, "callback_url has no host"
+    if not allow_private and _resolves_to_private(url):
+        return False, "callback_url must not point at a private or local address"
+    return True, None
+
+
+def _resolves_to_private(url: str) -> bool:
+    """Whether any address the URL's host resolves to is loopback, private, link-local or reserved."""
+    parts = urlsplit(url)
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    except (socket.gaierror, UnicodeError):
+        # Unresolvable hosts fail at delivery time and end up in the dead-letter table
+        return False
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global:
+            return True
+    return False
+
+
+class _PublicAddressOnly:
+    """Checks the address a connection actually reached, before anything is sent on it.
+
+    Checking the URL's host when it is accepted isn't enough: the name can resolve elsewhere by the
+    time of delivery (DNS rebinding).
+    """
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        address = ipaddress.ip_address(sock.getpeername()[0].split("%")[0])
+        if not address.is_global:
+            sock.close()
+            raise NewConnectionError(self, f"Refusing to deliver to non-public address {address}")
+        return sock
+
+
+class _PublicHTTPConnection(_PublicAddressOnly, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicAddressOnly, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class PublicAddressAdapter(HTTPAdapter):
+    """requests adapter that only connects to public addresses."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _PublicHTTPConnectionPool,
+            "https": _PublicHTTPSConnectionPool,
+        }
+
+
+class WebhookDispatcher:
+    """Signed completion callbacks, delivered from a PostgreSQL queue with retries.
+
+    `enqueue` stores a delivery; `dispatch`, run periodically in every worker, claims due rows one at
+    a time with SKIP LOCKED so each is sent by one process. A non-2xx response or network error schedules
+    another attempt with exponential backoff; after `max_attempts` the delivery moves to
+    webhook_dead_letters, from where an admin can requeue it. Each user signs with their own
+    secret, read at send time so rotation applies to queued deliveries too.
+    """
+
+    def __init__(
+        self,
+        auth_manager,
+        timeout: float = 10.0,
+        max_attempts: int = 8,
+        backoff_base: float = 10.0,
+        backoff_max: float = 3600.0,
+        allow_private: bool = False,
+    ):
+        self.auth_manager = auth_manager
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.allow_private = allow_private
+        self.session = requests.Session()
+        if not allow_private:
+            self.session.mount("http://", PublicAddressAdapter())
+            self.session.mount("https://", PublicAddressAdapter())
+
+    def enqueue(self, user_id, url: str, event: str, data: Dict) -> int:
+        """Queue `event` for delivery to `url`. Returns the delivery id."""
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            # Make sure the user has a secret to sign with before anything is queued
+            cursor.execute(
+                "UPDATE users SET webhook_secret = COALESCE(webhook_secret, %s) WHERE id = %s",
+                (self._new_secret(), user_id),
+            )
+            cursor.execute(
+                """INSERT INTO webhook_deliveries (user_id, url, event, payload, next_attempt_at)
+                   VALUES (%s, %s, %s, %s, %s) RETURNING id""",
+                (user_id, url, event, json.dumps(data, default=str), datetime.utcnow()),
+            )
+            delivery_id = cursor.fetchone()[0]
+            conn.commit()
+        logger.info(f"Queued {event} webhook {delivery_id} to {url}")
+        return delivery_id
+
+    def get_secret(self, user_id, rotate: bool = False) -> str:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            if rotate:
+                cursor.execute(
+                    "UPDATE users SET webhook_secret = %s WHERE id = %s RETURNING webhook_secret",
+                    (self._new_secret(), user_id),
+                )
+            else:
+                cursor.execute(
+                    """UPDATE users SET webhook_secret = COALESCE(webhook_secret, %s) WHERE id = %s
+                       RETURNING webhook_secret""",
+                    (self._new_secret(), user_id),
+                )
+            secret = cursor.fetchone()[0]
+            conn.commit()
+        return secret
+
+    def dispatch(self) -> int:
+        """Send every due delivery this process can claim. Returns the number delivered."""
+        delivered = 0
+        while True:
+            row = self._claim_next()
+            if row is None:
+                return delivered
+            if self._deliver(row):
+                delivered += 1
+
+    def stats(self) -> Dict:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(
+                """SELECT COUNT(*) AS queued,
+                          COUNT(*) FILTER (WHERE attempts > 0) AS retrying,
+                          MIN(created_at) AS oldest_queued_at
+                   FROM webhook_deliveries"""
+            )
+            row = dict(cursor.fetchone())
+            cursor.execute("SELECT COUNT(*) AS dead_letters FROM webhook_dead_letters")
+            row.update(cursor.fetchone())
+        if row["oldest_queued_at"]:
+            row["oldest_queued_at"] = row["oldest_queued_at"].isoformat()
+        return row
+
+    def list_dead_letters(self, limit: int = 50) -> List[Dict]:
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(
+                """SELECT d.id, d.url, d.event, d.attempts, d.last_status, d.last_error, d.created_at, d.failed_at,
+                          u.username
+                   FROM webhook_dead_letters d LEFT JOIN users u ON u.id = d.user_id
+                   ORDER BY d.failed_at DESC LIMIT %s""",
+                (limit,),
+            )
+            rows = cursor.fetchall()
+        return [
+            {**row, "created_at": row["created_at"].isoformat(), "failed_at": row["failed_at"].isoformat()}
+            for row in rows
+        ]
+
+    def requeue_dead_letter(self, dead_letter_id: int) -> bool:
+        """Move a dead letter back to the queue for a fresh set of attempts."""
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """WITH moved AS (DELETE FROM webhook_dead_letters WHERE id = %s
+                                  RETURNING user_id, url, event, payload, created_at)
+                   INSERT INTO webhook_deliveries (user_id, url, event, payload, created_at, next_attempt_at)
+                   SELECT user_id, url, event, payload, created_at, %s FROM moved
+                   RETURNING id""",
+                (dead_letter_id, datetime.utcnow()),
+            )
+            requeued = cursor.fetchone() is not None
+            conn.commit()
+        return requeued
+
+    def _claim_next(self) -> Optional[Dict]:
+        """Lock the next due delivery for long enough to send it, or return None if there is none.
+
+        Only the row about to be sent is claimed, so the lock never runs out while it waits its turn
+        behind other slow receivers. The lock covers a connect and a read timeout with room to spare.
+        """
+        now = datetime.utcnow()
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(
+                """UPDATE webhook_deliveries d
+                   SET locked_until = %s
+                   FROM users u
+                   WHERE u.id = d.user_id AND d.id = (
+                       SELECT id FROM webhook_deliveries
+                       WHERE next_attempt_at <= %s AND (locked_until IS NULL OR locked_until <= %s)
+                       ORDER BY next_attempt_at
+                       LIMIT 1
+                       FOR UPDATE SKIP LOCKED)
+                   RETURNING d.id, d.url, d.event, d.payload, d.attempts, d.created_at, d.locked_until,
+                             u.webhook_secret""",
+                (now + timedelta(seconds=self.timeout * 3), now, now),
+            )
+            row = cursor.fetchone()
+            conn.commit()
+        return row
+
+    def _deliver(self, row: Dict) -> bool:
+        body = json.dumps(
+            {
+                "id": row["id"],
+                "event": row["event"],
+                "created_at": row["created_at"].isoformat(),
+                "data": row["payload"],
+            }
+        ).encode()
+        timestamp = int(time.time())
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "social-video-download-webhooks",
+            "X-Webhook-Id": str(row["id"]),
+            "X-Webhook-Event": row["event"],
+            "X-Webhook-Timestamp": str(timestamp),
+            SIGNATURE_HEADER: sign(row["webhook_secret"], timestamp, body),
+        }
+
+        status, error = None, None
+        # Checked again at send time for a clear error; the adapter re-checks the address it connects to
+        valid, error = validate_callback_url(row["url"], self.allow_private)
+        if valid:
+            try:
+                response = self.session.post(
+                    row["url"], data=body, headers=headers, timeout=self.timeout, allow_redirects=False
+                )
+                status = response.status_code
+                if 200 <= status < 300:
+                    error = None
+                else:
+                    error = response.text[:MAX_ERROR_LENGTH] or f"HTTP {status}"
+            except requests.RequestException as e:
+                error = str(e)[:MAX_ERROR_LENGTH]
+
+        if error is None:
+            with self.auth_manager.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM webhook_deliveries WHERE id = %s", (row["id"],))
+                conn.commit()
+            metrics.WEBHOOK_DELIVERIES.labels("delivered").inc()
+            logger.info(f"Delivered {row['event']} webhook {row['id']} to {row['url']}")
+            return True
+
+        attempts = row["attempts"] + 1
+        with self.auth_manager.connection() as conn:
+            cursor = conn.cursor()
+            if attempts >= self.max_attempts:
+                # Both statements check the claim is still ours, in case the lock ran out after all
+                cursor.execute(
+                    """WITH moved AS (DELETE FROM webhook_deliveries WHERE id = %s AND locked_until = %s
+                                      RETURNING user_id, url, event, payload, created_at)
+                       INSERT INTO webhook_dead_letters
+                           (user_id, url, event, payload, attempts, last_status, last_error, created_at)
+                       SELECT user_id, url, event, payload, %s, %s, %s, created_at FROM moved""",
+                    (row["id"], row["locked_until"], attempts, status, error),
+                )
+                outcome = "dead_letter"
+                logger.warning(f"Webhook {row['id']} to {row['url']} failed {attempts} times, giving up: {error}")
+            else:
+                # Exponential backoff with jitter so receivers coming back up aren't hit all at once
+                delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max) * random.uniform(0.5, 1.0)
+                cursor.execute(
+                    """UPDATE webhook_deliveries
+                       SET attempts = %s, last_status = %s, last_error = %s, next_attempt_at = %s, locked_until = NULL
+                       WHERE id = %s AND locked_until = %s""",
+                    (
+                        attempts,
+                        status,
+                        error,
+                        datetime.utcnow() + timedelta(seconds=delay),
+                        row["id"],
+                        row["locked_until"],
+                    ),
+                )
+                outcome = "retry"
+                logger.info(
+                    f"Webhook {row['id']} to {row['url']} failed (attempt {attempts}), retrying in {delay:.0f}s"
+                )
+            conn.commit()
+        metrics.WEBHOOK_DELIVERIES.labels(outcome).inc()
+        return False
+
+    @staticmethod
+    def _new_secret() -> str:
+        return "whsec_" + secrets.token_urlsafe(32)
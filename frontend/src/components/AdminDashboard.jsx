@@ -1,11 +1,20 @@
 import React, { useState, useEffect } from 'react'
+import { formatFileSize } from '../utils/constants'
 import './AdminDashboard.css'
 
+const ANALYTICS_REFRESH_MS = 60000
+const ANALYTICS_WINDOWS = [7, 30, 90]
+
+const formatPercent = (rate) => `${(rate * 100).toFixed(1)}%`
+
 function AdminDashboard({ sessionToken, user, onLogout }) {
   const [activeTab, setActiveTab] = useState('api-keys')
   const [apiKeys, setApiKeys] = useState([])
+  const [apiKeysCursor, setApiKeysCursor] = useState(null)
   const [users, setUsers] = useState([])
+  const [usersCursor, setUsersCursor] = useState(null)
   const [loading, setLoading] = useState(false)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [error, setError] = useState('')
   const [success, setSuccess] = useState('')
   
@@ -18,6 +27,9 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
   const [newUserPassword, setNewUserPassword] = useState('')
   const [newUserRole, setNewUserRole] = useState('user')
 
+  const [analytics, setAnalytics] = useState(null)
+  const [analyticsDays, setAnalyticsDays] = useState(30)
+
   useEffect(() => {
     if (activeTab === 'api-keys') {
       loadApiKeys()
@@ -26,11 +38,23 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
     }
   }, [activeTab])
 
-  const loadApiKeys = async () => {
-    setLoading(true)
+  useEffect(() => {
+    if (activeTab !== 'analytics') {
+      return undefined
+    }
+    loadAnalytics()
+    // Served from precomputed rollups, so polling is cheap
+    const timer = setInterval(loadAnalytics, ANALYTICS_REFRESH_MS)
+    return () => clearInterval(timer)
+  }, [activeTab, analyticsDays])
+
+  const pageUrl = (path, cursor) => (cursor ? `${path}?cursor=${encodeURIComponent(cursor)}` : path)
+
+  const loadApiKeys = async (cursor = null) => {
+    cursor ? setLoadingMore(true) : setLoading(true)
     setError('')
     try {
-      const response = await fetch('/api/admin/api-keys', {
+      const response = await fetch(pageUrl('/api/admin/api-keys', cursor), {
         headers: {
           'X-Session-Token': sessionToken,
         },
@@ -38,7 +62,8 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
       const data = await response.json()
       
       if (data.success) {
-        setApiKeys(data.api_keys)
+        setApiKeys(prev => (cursor ? [...prev, ...data.api_keys] : data.api_keys))
+        setApiKeysCursor(data.next_cursor || null)
       } else {
         setError(data.error || 'Failed to load API keys')
       }
@@ -47,14 +72,15 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
       console.error('Load API keys error:', err)
     } finally {
       setLoading(false)
+      setLoadingMore(false)
     }
   }
 
-  const loadUsers = async () => {
-    setLoading(true)
+  const loadUsers = async (cursor = null) => {
+    cursor ? setLoadingMore(true) : setLoading(true)
     setError('')
     try {
-      const response = await fetch('/api/admin/users', {
+      const response = await fetch(pageUrl('/api/admin/users', cursor), {
         headers: {
           'X-Session-Token': sessionToken,
         },
@@ -62,7 +88,8 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
       const data = await response.json()
       
       if (data.success) {
-        setUsers(data.users)
+        setUsers(prev => (cursor ? [...prev, ...data.users] : data.users))
+        setUsersCursor(data.next_cursor || null)
       } else {
         setError(data.error || 'Failed to load users')
       }
@@ -71,6 +98,28 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
       console.error('Load users error:', err)
     } finally {
       setLoading(false)
+      setLoadingMore(false)
+    }
+  }
+
+  const loadAnalytics = async () => {
+    setError('')
+    try {
+      const response = await fetch(`/api/admin/analytics?days=${analyticsDays}`, {
+        headers: {
+          'X-Session-Token': sessionToken,
+        },
+      })
+      const data = await response.json()
+
+      if (data.success) {
+        setAnalytics(data)
+      } else {
+        setError(data.error || 'Failed to load analytics')
+      }
+    } catch (err) {
+      setError('Network error')
+      console.error('Load analytics error:', err)
     }
   }
 
@@ -242,6 +291,12 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
         >
           Users
         </button>
+        <button
+          className={`tab ${activeTab === 'analytics' ? 'active' : ''}`}
+          onClick={() => setActiveTab('analytics')}
+        >
+          Analytics
+        </button>
       </div>
 
       <div className="admin-content">
@@ -303,7 +358,7 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
             </div>
 
             <div className="section-card">
-              <h2>API Keys ({apiKeys.length})</h2>
+              <h2>API Keys ({apiKeys.length}{apiKeysCursor ? '+' : ''})</h2>
               {loading ? (
                 <p>Loading...</p>
               ) : (
@@ -357,6 +412,13 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
                   </table>
                 </div>
               )}
+              {!loading && apiKeysCursor && (
+                <div className="load-more">
+                  <button onClick={() => loadApiKeys(apiKeysCursor)} disabled={loadingMore} className="btn btn-secondary">
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </button>
+                </div>
+              )}
             </div>
           </div>
         )}
@@ -406,7 +468,7 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
             </div>
 
             <div className="section-card">
-              <h2>Users ({users.length})</h2>
+              <h2>Users ({users.length}{usersCursor ? '+' : ''})</h2>
               {loading ? (
                 <p>Loading...</p>
               ) : (
@@ -443,9 +505,144 @@ function AdminDashboard({ sessionToken, user, onLogout }) {
                   </table>
                 </div>
               )}
+              {!loading && usersCursor && (
+                <div className="load-more">
+                  <button onClick={() => loadUsers(usersCursor)} disabled={loadingMore} className="btn btn-secondary">
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </button>
+                </div>
+              )}
             </div>
           </div>
         )}
+
+        {activeTab === 'analytics' && (
+          <div className="analytics-section">
+            <div className="section-card">
+              <div className="analytics-header">
+                <h2>Usage</h2>
+                <select
+                  value={analyticsDays}
+                  onChange={(e) => setAnalyticsDays(parseInt(e.target.value))}
+                >
+                  {ANALYTICS_WINDOWS.map((days) => (
+                    <option key={days} value={days}>Last {days} days</option>
+                  ))}
+                </select>
+              </div>
+              {!analytics ? (
+                <p>Loading...</p>
+              ) : (
+                <div className="stat-grid">
+                  <div className="stat-card">
+                    <span className="stat-value">{analytics.totals.downloads}</span>
+                    <span className="stat-label">Downloads</span>
+                  </div>
+                  <div className="stat-card">
+                    <span className="stat-value">{formatPercent(analytics.totals.failure_rate)}</span>
+                    <span className="stat-label">Failure rate</span>
+                  </div>
+                  <div className="stat-card">
+                    <span className="stat-value">{formatFileSize(analytics.totals.bytes)}</span>
+                    <span className="stat-label">Downloaded</span>
+                  </div>
+                  <div className="stat-card">
+                    <span className="stat-value">{formatFileSize(analytics.totals.stored_bytes)}</span>
+                    <span className="stat-label">Stored ({analytics.totals.stored_files} files)</span>
+                  </div>
+                </div>
+              )}
+            </div>
+
+            {analytics && (
+              <>
+                <div className="section-card">
+                  <h2>Top Users</h2>
+                  <div className="table-container">
+                    <table className="data-table">
+                      <thead>
+                        <tr>
+                          <th>Username</th>
+                          <th>Downloads</th>
+                          <th>Failure rate</th>
+                          <th>Downloaded</th>
+                          <th>Stored</th>
+                        </tr>
+                      </thead>
+                      <tbody>
+                        {analytics.top_users.map((u) => (
+                          <tr key={u.user_id}>
+                            <td>{u.username}</td>
+                            <td>{u.downloads}</td>
+                            <td>{formatPercent(u.failure_rate)}</td>
+                            <td>{formatFileSize(u.bytes)}</td>
+                            <td>{formatFileSize(u.stored_bytes)}</td>
+                          </tr>
+                        ))}
+                      </tbody>
+                    </table>
+                  </div>
+                </div>
+
+                <div className="section-card">
+                  <h2>Top Sites</h2>
+                  <div className="table-container">
+                    <table className="data-table">
+                      <thead>
+                        <tr>
+                          <th>Domain</th>
+                          <th>Downloads</th>
+                          <th>Failure rate</th>
+                          <th>Downloaded</th>
+                        </tr>
+                      </thead>
+                      <tbody>
+                        {analytics.top_domains.map((d) => (
+                          <tr key={d.domain}>
+                            <td>{d.domain}</td>
+                            <td>{d.downloads}</td>
+                            <td>{formatPercent(d.failure_rate)}</td>
+                            <td>{formatFileSize(d.bytes)}</td>
+                          </tr>
+                        ))}
+                      </tbody>
+                    </table>
+                  </div>
+                </div>
+
+                <div className="section-card">
+                  <h2>Per Day</h2>
+                  <div className="table-container">
+                    <table className="data-table">
+                      <thead>
+                        <tr>
+                          <th>Day</th>
+                          <th>Downloads</th>
+                          <th>Failure rate</th>
+                          <th>Downloaded</th>
+                          <th>Avg time</th>
+                          <th>Active users</th>
+                        </tr>
+                      </thead>
+                      <tbody>
+                        {[...analytics.daily].reverse().map((day) => (
+                          <tr key={day.day}>
+                            <td>{day.day}</td>
+                            <td>{day.downloads}</td>
+                            <td>{formatPercent(day.failure_rate)}</td>
+                            <td>{formatFileSize(day.bytes)}</td>
+                            <td>{day.avg_seconds !== null ? `${day.avg_seconds.toFixed(1)}s` : '-'}</td>
+                            <td>{day.active_users}</td>
+                          </tr>
+                        ))}
+                      </tbody>
+                    </table>
+                  </div>
+                </div>
+              </>
+            )}
+          </div>
+        )}
       </div>
     </div>
   )
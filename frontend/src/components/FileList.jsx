@@ -10,16 +10,19 @@ function FileList() {
   const [error, setError] = useState(null)
   const [deleting, setDeleting] = useState(null)
   const [downloading, setDownloading] = useState(null)
+  const [nextCursor, setNextCursor] = useState(null)
 
-  const loadFiles = useCallback(async () => {
+  const loadFiles = useCallback(async (cursor = null) => {
     setLoading(true)
     setError(null)
 
     try {
-      const response = await listFiles()
+      const response = await listFiles(cursor)
 
       if (response.success && response.data.success) {
-        setFiles(response.data.files || [])
+        const page = response.data.files || []
+        setFiles(prev => (cursor ? [...prev, ...page] : page))
+        setNextCursor(response.data.next_cursor || null)
       } else {
         setError(response.error || 'Failed to load files')
       }
@@ -79,7 +82,7 @@ function FileList() {
     <div className="file-list">
       <div className="file-list-header">
         <h2>My Downloads</h2>
-        <button onClick={loadFiles} disabled={loading} className="refresh-btn">
+        <button onClick={() => loadFiles()} disabled={loading} className="refresh-btn">
           <FiRefreshCw className={loading ? 'spin' : ''} /> Refresh
         </button>
       </div>
@@ -146,6 +149,14 @@ function FileList() {
           ))}
         </div>
       )}
+
+      {nextCursor && (
+        <div className="load-more">
+          <button onClick={() => loadFiles(nextCursor)} disabled={loading} className="refresh-btn">
+            {loading ? <FiRefreshCw className="spin" /> : null} Load more
+          </button>
+        </div>
+      )}
     </div>
   )
 }
@@ -100,9 +100,11 @@ export const downloadVideo = async (url, format = 'bestvideo+bestaudio/best') =>
   }
 }
 
-export const listFiles = async () => {
+export const listFiles = async (cursor = null) => {
   try {
-    const response = await apiClient.get('/list-files')
+    const response = await apiClient.get('/list-files', {
+      params: cursor ? { cursor } : {}
+    })
     return { success: true, data: response.data }
   } catch (error) {
     return handleError(error)